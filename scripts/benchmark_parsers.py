@@ -0,0 +1,55 @@
+import argparse
+import json
+import os
+import sys
+import time
+from collections import Counter
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from services.tools.pdf_parser import PARSER_BACKENDS, parse_pdf
+
+def page_count(pdf_path):
+    import fitz
+
+    with fitz.open(pdf_path) as doc:
+        return len(doc)
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare PDF parser backends on pages per second")
+    parser.add_argument("pdfs", nargs="+", help="PDF files to parse")
+    parser.add_argument("--backends", nargs="+", default=list(PARSER_BACKENDS), choices=PARSER_BACKENDS)
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per document; the fastest is kept")
+    parser.add_argument("--no-tables", action="store_true", help="Skip table detection in the pymupdf backend")
+    args = parser.parse_args()
+
+    pages = sum(page_count(path) for path in args.pdfs)
+    results = {}
+    for backend in args.backends:
+        elapsed = 0.0
+        types = Counter()
+        blocks = 0
+        for path in args.pdfs:
+            best = None
+            for _ in range(args.repeat):
+                started = time.perf_counter()
+                parsed = parse_pdf(path, backend, detect_tables=not args.no_tables)
+                took = time.perf_counter() - started
+                best = took if best is None else min(best, took)
+            elapsed += best
+            blocks += len(parsed)
+            types.update(block["type"] for block in parsed)
+
+        results[backend] = {
+            "pages": pages,
+            "seconds": round(elapsed, 3),
+            "pages_per_s": round(pages / elapsed, 1) if elapsed else None,
+            "blocks": blocks,
+            "block_types": dict(types)
+        }
+
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -1,26 +1,30 @@
 from ..orchestrator.agent_base import BaseAgent, AgentResult
 from ..tools.llm_clients import LLMClient
-from ..tools.vector_store import VectorStore
-from ..tools.graph_store import GraphStore
+from ..tools.model_router import router
+from ..tools.ids import concept_id as make_concept_id, document_id
+from ..tools.executors import run_io
+from ..orchestrator.config import settings
 from typing import Dict, Any
-import json
+import asyncio
 
 class ConceptExtractionAgent(BaseAgent):
     name = "concept_agent"
 
     def __init__(self):
         self.llm = LLMClient()
-        # Lazy init stores to avoid connection issues during import if env vars aren't set
-        self.vector_store = None 
-        self.graph_store = None
 
     async def run(self, context: Dict[str, Any]) -> AgentResult:
         blocks = context.get("blocks")
         if not blocks:
             return AgentResult(success=False, payload={"error": "No blocks provided"})
-
-        if not self.vector_store: self.vector_store = VectorStore()
-        if not self.graph_store: self.graph_store = GraphStore()
+        # Concept IDs are namespaced by document; a shared default would make
+        # every document's concepts collide
+        doc_id = context.get("doc_id")
+        if not doc_id and context.get("pdf_path"):
+            doc_id = await run_io(document_id, context["pdf_path"])
+        if not doc_id:
+            return AgentResult(success=False, payload={"error": "No doc_id or pdf_path provided"})
+        course_id = context.get("course_id") or settings.DEFAULT_COURSE_ID
 
         # Combine all blocks into one text (limit to first 50 blocks to avoid context limits)
         max_blocks = min(50, len(blocks))
@@ -33,71 +37,77 @@ class ConceptExtractionAgent(BaseAgent):
         
         prompt = f"""
         Analyze the following document and extract ONLY the top 10 most important concepts.
-        Return a JSON list with exactly 10 objects, each with keys: 'name', 'definition', 'importance' (1-10).
+        Return a JSON object whose "concepts" key holds exactly 10 objects, each with keys: 'name', 'definition', 'importance' (1-10).
         Focus on the core concepts that are most central to understanding this document.
         
         Text:
         {text_content}
         
         Return format:
-        [
+        {{"concepts": [
           {{"name": "Concept Name", "definition": "Clear definition", "importance": 10}},
           ...
-        ]
+        ]}}
         """
         
         extracted_concepts = []
+        # Each concept is embedded as soon as its object closes in the stream,
+        # while the model is still writing the rest
+        pending = []
         
+        messages = [{"role": "user", "content": prompt}]
+        route = router.select("extraction", messages)
         try:
             print("Extracting top 10 concepts from document...")
-            response = await self.llm.generate(
-                messages=[{"role": "user", "content": prompt}],
-                provider="mistral",
-                model="mistral-large-latest",
-                temperature=0.3
-            )
-            
-            # Parse LLM response
-            clean_response = response.replace("```json", "").replace("```", "").strip()
-            
-            # Handle case where LLM adds text before/after JSON
-            if "[" in clean_response and "]" in clean_response:
-                start = clean_response.find("[")
-                end = clean_response.rfind("]") + 1
-                clean_response = clean_response[start:end]
-            
-            concepts = json.loads(clean_response)
+            async for concept in self.llm.generate_json_items(messages, temperature=0.3, route=route):
+                if not concept.get('name') or not concept.get('definition'):
+                    continue
+                embedding = asyncio.create_task(self.llm.embed(f"{concept['name']}: {concept['definition']}"))
+                pending.append((concept, embedding))
+        except Exception as e:
+            # Concepts that closed before the failure are still usable
+            print(f"Error extracting concepts: {e}")
+        
+        if pending:
+            embeddings = await asyncio.gather(*(task for _, task in pending), return_exceptions=True)
             
             # Limit to top 10 by importance
-            concepts = sorted(concepts, key=lambda x: x.get('importance', 0), reverse=True)[:10]
+            ranked = sorted(zip(pending, embeddings), key=lambda p: self._importance(p[0][0]), reverse=True)[:10]
+            print(f"Successfully extracted {len(ranked)} concepts")
             
-            print(f"Successfully extracted {len(concepts)} concepts")
-            
-            for idx, concept in enumerate(concepts):
-                # Generate real embedding
-                embedding_text = f"{concept['name']}: {concept['definition']}"
-                print(f"  Generating embedding for: {concept['name']}")
-                embedding = await self.llm.embed(embedding_text)
-                
-                concept_id = f"concept_{idx}"
-                
-                # Store in Vector DB
-                self.vector_store.upsert([(concept_id, embedding, concept)])
-                
-                # Store in Graph DB
-                self.graph_store.add_concept(
-                    concept['name'], 
-                    concept['definition'], 
-                    concept_id, 
-                    {"doc_id": "doc_1", "page": 1}
+            # Storing concepts is left to the entity resolution stage, which
+            # may merge them with existing ones
+            for (concept, _), embedding in ranked:
+                if isinstance(embedding, Exception):
+                    print(f"  Embedding failed for '{concept['name']}': {embedding}")
+                    embedding = None
+                concept.update(
+                    concept_id=make_concept_id(doc_id, concept['name']),
+                    doc_id=doc_id,
+                    course_id=course_id,
+                    embedding=embedding
                 )
+                page = self._find_page(concept['name'], blocks)
+                if page is not None:
+                    concept['page'] = page
                 
                 extracted_concepts.append(concept)
                 print(f"  - {concept['name']} (importance: {concept.get('importance', 'N/A')})")
-                
-        except Exception as e:
-            print(f"Error extracting concepts: {e}")
-            if 'response' in locals():
-                print(f"Raw response: {response[:500]}...")
 
-        return AgentResult(success=True, payload={"concepts": extracted_concepts})
+        return AgentResult(success=True, payload={"concepts": extracted_concepts}, meta={"route": route.info()})
+
+    @staticmethod
+    def _importance(concept):
+        try:
+            return float(concept.get('importance', 0))
+        except (TypeError, ValueError):
+            return 0.0
+
+    @staticmethod
+    def _find_page(name, blocks):
+        """First page whose text mentions the concept, as a cheap provenance hint"""
+        needle = name.lower()
+        for block in blocks:
+            if needle in block['content'].lower():
+                return block.get('page')
+        return None
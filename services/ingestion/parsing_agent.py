@@ -1,20 +1,36 @@
 from ..orchestrator.agent_base import BaseAgent, AgentResult
-from ..tools.pdf_parser import PDFParser
+from ..orchestrator.config import settings
+from ..tools.document_loader import load_document
+from ..tools.executors import run_cpu
 from typing import Dict, Any
 
 class ParsingAgent(BaseAgent):
     name = "parsing_agent"
 
-    def __init__(self):
-        self.parser = PDFParser()
-
     async def run(self, context: Dict[str, Any]) -> AgentResult:
+        """
+        Parse the PDF into typed blocks. With `image_dir` in the context, its
+        images are extracted there from the same open document and returned
+        under "images" for the vision agent.
+        """
         pdf_path = context.get("pdf_path")
         if not pdf_path:
             return AgentResult(success=False, payload={"error": "No PDF path provided"})
 
         try:
-            blocks = self.parser.parse(pdf_path)
-            return AgentResult(success=True, payload={"blocks": blocks})
+            # Parsing is CPU-bound; run it in a worker process so the event loop
+            # (and the GIL) stay free for tutoring requests
+            document = await run_cpu(
+                load_document,
+                pdf_path,
+                settings.PDF_PARSER_BACKEND,
+                settings.PDF_DETECT_TABLES,
+                context.get("image_dir")
+            )
+            return AgentResult(
+                success=True,
+                payload=document,
+                meta={"backend": settings.PDF_PARSER_BACKEND}
+            )
         except Exception as e:
             return AgentResult(success=False, payload={"error": str(e)})
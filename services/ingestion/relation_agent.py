@@ -1,10 +1,35 @@
 from ..orchestrator.agent_base import BaseAgent, AgentResult
+from ..orchestrator.config import settings
 from ..tools.llm_clients import LLMClient
-from ..tools.graph_store import GraphStore
+from ..tools.model_router import router
+from ..tools.rate_limiter import estimate_tokens
+from ..tools.graph_store import open_graph_store
+from ..tools.ids import normalize_name
+from ..tools.structured_output import parse_json_array
 from typing import Dict, Any
-import json
+from collections import Counter
+import asyncio
+import numpy as np
+
+RELATION_TYPES = ("Prerequisite", "IsA", "PartOf", "RelatedTo", "Uses", "Extends")
+_RELATION_KEYS = {t.lower(): t for t in RELATION_TYPES}
+
+def normalize_relation_type(value) -> str:
+    """The RELATION_TYPES entry the model meant ("is a", "part_of" ...), or "RelatedTo" if none"""
+    key = "".join(ch for ch in str(value or "").lower() if ch.isalnum())
+    return _RELATION_KEYS.get(key, "RelatedTo")
 
 class RelationshipMappingAgent(BaseAgent):
+    """
+    Maps relations between concepts in one of two modes (RELATION_MAPPING_MODE):
+
+    - "candidates" (default): a cheap local pass proposes candidate pairs from
+      embedding nearest neighbours, co-occurrence in the same text block, and the
+      related concepts the vision model named. Candidates are then verified in
+      batched, concurrent LLM calls that include definitions, so cost grows
+      with the number of candidates rather than being capped.
+    - "names": the original single call over the top 10 concept names.
+    """
     name = "relation_agent"
 
     def __init__(self):
@@ -16,61 +41,225 @@ class RelationshipMappingAgent(BaseAgent):
         if not concepts:
             return AgentResult(success=False, payload={"error": "No concepts provided"})
 
-        if not self.graph_store: self.graph_store = GraphStore()
+        if not self.graph_store: self.graph_store = open_graph_store()
+
+        # Merged concepts share an ID; relate each node once
+        unique = {}
+        for concept in concepts:
+            unique.setdefault(concept.get('concept_id', concept['name']), concept)
+        concepts = list(unique.values())
+
+        if settings.RELATION_MAPPING_MODE == "names":
+            return await self._map_by_names(concepts)
+        return await self._map_candidates(concepts, context.get("blocks") or [])
+
+    def _propose_candidates(self, concepts, blocks):
+        """Unordered index pairs worth asking the LLM about, with the reason each was proposed"""
+        candidates = {}
+
+        def propose(i, j, reason):
+            if i != j:
+                candidates.setdefault((min(i, j), max(i, j)), set()).add(reason)
+
+        # 1. Embedding kNN, a chunk of rows at a time
+        with_embeddings = [i for i, c in enumerate(concepts) if c.get('embedding')]
+        if len(with_embeddings) > 1:
+            matrix = np.asarray([concepts[i]['embedding'] for i in with_embeddings], dtype=np.float32)
+            matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+            k = min(settings.RELATION_KNN, len(with_embeddings) - 1)
+            for start in range(0, len(matrix), 1024):
+                scores = matrix[start:start + 1024] @ matrix.T
+                for row, row_scores in enumerate(scores):
+                    row_scores[start + row] = -1.0
+                    for col in np.argpartition(-row_scores, k - 1)[:k]:
+                        if row_scores[col] >= settings.RELATION_MIN_SIMILARITY:
+                            propose(with_embeddings[start + row], with_embeddings[col], "embedding")
+
+        # 2. Co-occurrence: concepts mentioned in the same block
+        names = [(i, c['name'].lower()) for i, c in enumerate(concepts) if c.get('type') != 'visual']
+        for block in blocks:
+            text = block['content'].lower()
+            mentioned = [i for i, name in names if name in text]
+            for a in range(len(mentioned)):
+                for b in range(a + 1, len(mentioned)):
+                    propose(mentioned[a], mentioned[b], "co-occurrence")
+
+        # 3. Concepts the vision model said a figure illustrates
+        by_name = {normalize_name(c['name']): i for i, c in enumerate(concepts)}
+        for i, concept in enumerate(concepts):
+            for related in concept.get('related_concepts') or []:
+                j = by_name.get(normalize_name(related))
+                if j is not None:
+                    propose(i, j, "visual")
+
+        return candidates
+
+    @staticmethod
+    def _pair_line(n, a, b):
+        return f"{n}. A = {a['name']}: {a.get('definition', '')}\n   B = {b['name']}: {b.get('definition', '')}"
+
+    @staticmethod
+    def _verify_prompt(lines):
+        return f"""
+        For each numbered pair of concepts below, decide whether there is a direct relationship.
+        Relation types: {', '.join(RELATION_TYPES)}.
+        Return a JSON object whose "relations" key lists one object per related pair, with keys:
+        'pair' (the number), 'direction' ("A->B" or "B->A"), 'relation_type', 'confidence' (0-1).
+        Omit pairs that are not directly related.
+
+        Pairs:
+        {chr(10).join(lines)}
+        """
+
+    def _batches(self, concepts, pairs):
+        """
+        Pairs split into verification batches of at most RELATION_BATCH_SIZE,
+        each small enough for the smallest model on the "relations" route, so
+        that model gets the work instead of seeing every prompt as oversized
+        """
+        limit = settings.RELATION_BATCH_SIZE
+        budget = router.prompt_budget("relations")
+        if budget is None:
+            return [pairs[k:k + limit] for k in range(0, len(pairs), limit)]
+        available = budget - estimate_tokens([self._verify_prompt([])])
 
+        batches, batch, used = [], [], 0
+        for i, j in pairs:
+            cost = estimate_tokens([self._pair_line(limit, concepts[i], concepts[j])])
+            if batch and (len(batch) >= limit or used + cost > available):
+                batches.append(batch)
+                batch, used = [], 0
+            batch.append((i, j))
+            used += cost
+        if batch:
+            batches.append(batch)
+        return batches
+
+    async def _verify_batch(self, concepts, pairs, semaphore, routes):
+        lines = [self._pair_line(n, concepts[i], concepts[j]) for n, (i, j) in enumerate(pairs)]
+        prompt = self._verify_prompt(lines)
+        messages = [{"role": "user", "content": prompt}]
+        # Small batches fit the small model's prompt limit and go there
+        route = router.select("relations", messages)
+        async with semaphore:
+            response = await self.llm.generate(messages, temperature=0.0, json_mode=True, route=route)
+        routes[f"{route.provider}/{route.model}"] += 1
+
+        relations = []
+        for item in parse_json_array(response):
+            try:
+                i, j = pairs[int(item['pair'])]
+                confidence = float(item.get('confidence', 0))
+            except (KeyError, ValueError, IndexError, TypeError):
+                continue
+            if str(item.get('direction', 'A->B')).replace(" ", "") == "B->A":
+                i, j = j, i
+            relations.append({
+                "source": concepts[i]['name'],
+                "target": concepts[j]['name'],
+                "source_id": concepts[i].get('concept_id', concepts[i]['name']),
+                "target_id": concepts[j].get('concept_id', concepts[j]['name']),
+                "relation_type": normalize_relation_type(item.get('relation_type')),
+                "confidence": confidence
+            })
+        return relations
+
+    async def _map_candidates(self, concepts, blocks):
+        candidates = self._propose_candidates(concepts, blocks)
+        pairs = sorted(candidates)
+        print(f"Verifying {len(pairs)} candidate relations between {len(concepts)} concepts...")
+        if not pairs:
+            return AgentResult(success=True, payload={"relations": []}, meta={"candidates": 0})
+
+        semaphore = asyncio.Semaphore(settings.RELATION_CONCURRENCY)
+        routes = Counter()
+        batches = await asyncio.gather(
+            *(self._verify_batch(concepts, batch, semaphore, routes) for batch in self._batches(concepts, pairs)),
+            return_exceptions=True
+        )
+
+        relations = []
+        failed_batches = 0
+        for batch in batches:
+            if isinstance(batch, Exception):
+                print(f"Error verifying relation batch: {batch}")
+                failed_batches += 1
+                continue
+            for rel in batch:
+                if rel['confidence'] <= 0.7:
+                    continue
+                self.graph_store.add_relation(
+                    rel['source_id'], rel['target_id'], rel['relation_type'], rel['confidence'], save=False
+                )
+                relations.append(rel)
+                print(f"  - {rel['source']} -> {rel['target']} ({rel['relation_type']})")
+        if relations:
+            await self.graph_store.asave()
+
+        if failed_batches and failed_batches == len(batches):
+            return AgentResult(success=False, payload={"error": "All relation batches failed", "relations": []})
+
+        print(f"Found {len(relations)} relationships")
+        return AgentResult(
+            success=True,
+            payload={"relations": relations},
+            meta={
+                "candidates": len(pairs),
+                "batches": len(batches),
+                "failed_batches": failed_batches,
+                "routes": dict(routes)
+            }
+        )
+
+    async def _map_by_names(self, concepts):
         # Limit to top 10 concepts to avoid overwhelming the LLM
         concepts = concepts[:10]
         concept_names = [c['name'] for c in concepts]
-        
+        # Relations come back by name; store them between concept IDs
+        concept_ids = {c['name']: c.get('concept_id', c['name']) for c in concepts}
+
         print(f"Mapping relationships between {len(concept_names)} concepts...")
-        
+
         prompt = f"""
         Identify the most important relationships between these concepts: {', '.join(concept_names)}.
-        Return a JSON list of relationship objects with keys: 'source', 'target', 'relation_type', 'confidence'.
-        Relation types: Prerequisite, IsA, PartOf, RelatedTo, Uses, Extends.
+        Return a JSON object whose "relations" key lists relationship objects with keys: 'source', 'target', 'relation_type', 'confidence'.
+        Relation types: {', '.join(RELATION_TYPES)}.
         Only include relationships where confidence > 0.7.
         Limit to maximum 15 relationships.
-        
+
         Example format:
-        [
+        {{"relations": [
           {{"source": "ConceptA", "target": "ConceptB", "relation_type": "Prerequisite", "confidence": 0.9}},
           ...
-        ]
+        ]}}
         """
-        
+
+        messages = [{"role": "user", "content": prompt}]
+        route = router.select("relations", messages)
         try:
             print("Calling LLM for relationship mapping...")
-            response = await self.llm.generate(
-                messages=[{"role": "user", "content": prompt}],
-                provider="mistral",
-                model="mistral-large-latest",
-                temperature=0.3
-            )
-            
-            clean_response = response.replace("```json", "").replace("```", "").strip()
-            
-            # Extract JSON array
-            if "[" in clean_response and "]" in clean_response:
-                start = clean_response.find("[")
-                end = clean_response.rfind("]") + 1
-                clean_response = clean_response[start:end]
-            
-            relations = json.loads(clean_response)
-            
+            response = await self.llm.generate(messages, temperature=0.3, json_mode=True, route=route)
+
+            # Small syntax slips are repaired locally rather than re-asking the model
+            relations = [rel for rel in parse_json_array(response) if isinstance(rel, dict)]
+
             print(f"Found {len(relations)} relationships")
-            
+
             for rel in relations:
-                if rel['source'] in concept_names and rel['target'] in concept_names:
+                if rel.get('source') in concept_names and rel.get('target') in concept_names:
+                    rel['relation_type'] = normalize_relation_type(rel.get('relation_type'))
                     self.graph_store.add_relation(
-                        rel['source'], 
-                        rel['target'], 
-                        rel['relation_type'], 
-                        rel['confidence']
+                        concept_ids[rel['source']],
+                        concept_ids[rel['target']],
+                        rel['relation_type'],
+                        rel.get('confidence', 0),
+                        save=False
                     )
                     print(f"  - {rel['source']} -> {rel['target']} ({rel['relation_type']})")
-            
-            return AgentResult(success=True, payload={"relations": relations})
-            
+            await self.graph_store.asave()
+
+            return AgentResult(success=True, payload={"relations": relations}, meta={"route": route.info()})
+
         except Exception as e:
             print(f"Error mapping relationships: {e}")
             if 'response' in locals():
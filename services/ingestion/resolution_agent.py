@@ -0,0 +1,166 @@
+from ..orchestrator.agent_base import BaseAgent, AgentResult
+from ..orchestrator.config import settings
+from ..tools.llm_clients import LLMClient
+from ..tools.vector_store import VectorStore
+from ..tools.graph_store import open_graph_store
+from ..tools.concept_index import ConceptIndex
+from ..tools.ids import normalize_name
+from ..tools.executors import run_io
+from typing import Dict, Any
+import asyncio
+
+class EntityResolutionAgent(BaseAgent):
+    """
+    Merges newly extracted concepts with equivalent ones already known to the
+    course (or earlier in the same batch) before anything is stored, so the
+    same idea defined by several documents becomes one node with provenance
+    from each of them.
+    """
+    name = "resolution_agent"
+
+    def __init__(self):
+        self.llm = LLMClient()
+        self.vector_store = None
+        self.graph_store = None
+        self.image_store = None  # set by the orchestrator; visual concepts reference images in it
+        self._indexes = {}  # course_id -> ConceptIndex
+        self._locks = {}  # course_id -> asyncio.Lock held from matching until the index has the new concepts
+
+    def _index(self, course_id):
+        if course_id not in self._indexes:
+            self._indexes[course_id] = ConceptIndex(course_id)
+        return self._indexes[course_id]
+
+    def _lock(self, course_id):
+        if course_id not in self._locks:
+            self._locks[course_id] = asyncio.Lock()
+        return self._locks[course_id]
+
+    async def run(self, context: Dict[str, Any]) -> AgentResult:
+        concepts = context.get("concepts")
+        if not concepts:
+            return AgentResult(success=False, payload={"error": "No concepts provided"})
+        doc_id = context.get("doc_id")
+        course_id = context.get("course_id") or settings.DEFAULT_COURSE_ID
+
+        if not self.vector_store: self.vector_store = VectorStore()
+        if not self.graph_store: self.graph_store = open_graph_store()
+
+        # Visual concepts arrive without embeddings; embed them in one request
+        missing = [c for c in concepts if not c.get('embedding')]
+        if missing:
+            embeddings = await self.llm.embed_batch([f"{c['name']}: {c['definition']}" for c in missing])
+            for concept, embedding in zip(missing, embeddings):
+                concept['embedding'] = embedding
+
+        index = self._index(course_id)
+        threshold = settings.ENTITY_MERGE_THRESHOLD
+        matrix = ConceptIndex.normalize([c['embedding'] for c in concepts])
+        batch_scores = matrix @ matrix.T
+
+        # Documents of the same course resolve one at a time: another document's
+        # concepts must be in the index before this one is matched against it
+        async with self._lock(course_id):
+            best_ids, best_scores = await run_io(index.best_matches, matrix)
+
+            batch_names = {}   # normalized name -> canonical ID of a concept new in this batch
+            batch_images = {}  # image ID -> canonical ID of a visual concept new in this batch
+            new_rows = []      # positions of concepts that become new nodes
+            resolved = []
+            merged = 0
+
+            for i, concept in enumerate(concepts):
+                visual = concept.get('type') == 'visual'
+                key = normalize_name(concept['name'])
+                if visual:
+                    # Visual names are generic ("Visual: diagram (Page 1)"); only
+                    # the image or the description can identify the same figure
+                    target = batch_images.get(concept.get('image_id'))
+                else:
+                    target = index.by_name.get(key) or batch_names.get(key)
+                if target is None and best_ids[i] is not None and best_scores[i] >= threshold:
+                    target = best_ids[i]
+                if target is None:
+                    for j in new_rows:
+                        if batch_scores[i, j] >= threshold:
+                            target = concepts[j]['concept_id']
+                            break
+
+                if target is None:
+                    new_rows.append(i)
+                    if visual:
+                        if concept.get('image_id'):
+                            batch_images[concept['image_id']] = concept['concept_id']
+                    else:
+                        batch_names[key] = concept['concept_id']
+                    resolved.append(concept)
+                    continue
+
+                merged += 1
+                resolved.append({**concept, "concept_id": target, "merged_from": concept['concept_id']})
+
+            # Persist new concepts: one vector upsert for the whole batch
+            vectors = []
+            for i in new_rows:
+                concept = concepts[i]
+                metadata = {k: v for k, v in concept.items() if k != 'embedding' and v is not None}
+                metadata['doc_ids'] = [doc_id]
+                vectors.append((concept['concept_id'], concept['embedding'], metadata))
+                self.graph_store.add_concept(
+                    concept['name'],
+                    concept['definition'],
+                    concept['concept_id'],
+                    {
+                        "doc_id": doc_id,
+                        "page": concept.get('page'),
+                        "node_type": concept.get('type', 'concept'),
+                        "image_id": concept.get('image_id')
+                    },
+                    save=False
+                )
+            if vectors:
+                await self.vector_store.aupsert(vectors, namespace=course_id)
+            index.add(
+                [concepts[i]['concept_id'] for i in new_rows],
+                # Visual concepts stay out of name blocking
+                [None if concepts[i].get('type') == 'visual' else concepts[i]['name'] for i in new_rows],
+                matrix[new_rows]
+            )
+
+        # Merged concepts keep the canonical node and vector; record provenance
+        for concept in resolved:
+            if "merged_from" not in concept:
+                continue
+            print(f"  Merged '{concept['name']}' into {concept['concept_id']}")
+            self.graph_store.merge_concept(
+                concept['concept_id'],
+                concept['name'],
+                concept['definition'],
+                {"doc_id": doc_id, "page": concept.get('page')},
+                save=False
+            )
+            if concept.get('type') != 'visual':
+                index.add_alias(concept['name'], concept['concept_id'])
+            node = self.graph_store.get_concept(concept['concept_id'])
+            doc_ids = sorted({s['doc_id'] for s in node.get('sources', []) if s.get('doc_id')})
+            await self.vector_store.aupdate_metadata(concept['concept_id'], {"doc_ids": doc_ids}, namespace=course_id)
+
+        await self.graph_store.asave()
+        await index.asave()
+
+        # A node references exactly the image it was built from; the image of a
+        # replaced node, or of a concept merged into one, becomes evictable
+        if self.image_store:
+            for concept in resolved:
+                merged_from = concept.get('merged_from')
+                if merged_from and self.graph_store.get_concept(merged_from) is None:
+                    self.image_store.release(merged_from)
+                node = self.graph_store.get_concept(concept['concept_id']) or {}
+                self.image_store.set_ref(concept['concept_id'], node.get('image_id'))
+            await self.image_store.asave()
+        print(f"Resolved {len(concepts)} concepts: {len(new_rows)} new, {merged} merged")
+
+        return AgentResult(
+            success=True,
+            payload={"concepts": resolved, "new": len(new_rows), "merged": merged}
+        )
@@ -1,92 +1,212 @@
 from ..orchestrator.agent_base import BaseAgent, AgentResult
-from ..tools.llm_clients import LLMClient
-from ..tools.image_extractor import ImageExtractor
-import asyncio
+from ..orchestrator.config import settings
+from ..tools.llm_clients import LLMClient, VisionBatchTooLarge
+from ..tools.image_extractor import ImageExtractor, extract_images
+from ..tools.structured_output import parse_json_array, parse_json_object
+from ..tools.executors import run_cpu
+from ..tools.model_router import router
+from ..tools.rate_limiter import IMAGE_TOKENS, estimate_tokens
+from collections import Counter
+
+SINGLE_IMAGE_PROMPT = """Analyze this image and provide:
+1. What type of visual is this? (diagram, chart, graph, screenshot, photo, equation, etc.)
+2. A detailed description of what it shows
+3. Key concepts or information it conveys
+4. How it relates to the document's content
+
+Format your response as JSON:
+{
+  "type": "diagram/chart/graph/etc",
+  "description": "detailed description",
+  "concepts": ["concept1", "concept2"],
+  "relevance": "how it relates to the document"
+}
+"""
+
+BATCH_PROMPT = """You are given {count} images from the same document, numbered 1 to {count} in the order they are attached.
+For each image provide:
+1. What type of visual it is (diagram, chart, graph, screenshot, photo, equation, etc.)
+2. A detailed description of what it shows
+3. Key concepts or information it conveys
+4. How it relates to the document's content
+
+Format your response as JSON, with exactly one entry per image:
+{{
+  "images": [
+    {{
+      "image": 1,
+      "type": "diagram/chart/graph/etc",
+      "description": "detailed description",
+      "concepts": ["concept1", "concept2"],
+      "relevance": "how it relates to the document"
+    }}
+  ]
+}}
+"""
 
 class VisionConceptAgent(BaseAgent):
-    """Extract concepts from images using vision models"""
+    """
+    Extract concepts from images using vision models.
+
+    Images close together in the document (same page, or within
+    VISION_BATCH_PAGE_SPAN pages) are packed up to VISION_BATCH_SIZE per
+    request. When a model rejects a batch as too large it is split in half,
+    and later batches of the same document sent to that model start from the
+    smaller size. Each document starts again from VISION_BATCH_SIZE.
+    """
     
     def __init__(self):
         self.llm = LLMClient()
         self.image_extractor = ImageExtractor()
+        self.image_store = None  # set by the orchestrator; tracks usage of stored images
     
     async def run(self, context):
         """
         Process images from PDF and extract visual concepts
         
         Args:
-            context: {'pdf_path': str}
+            context: {'pdf_path': str, 'images': optional list already extracted by the parser}
         
         Returns:
             AgentResult with visual concepts
         """
         pdf_path = context['pdf_path']
         
-        # Extract images
-        print(f"\nExtracting images from PDF...")
-        images = self.image_extractor.extract_images(pdf_path)
+        images = context.get('images')
+        if images is None:
+            print(f"\nExtracting images from PDF...")
+            images = await run_cpu(extract_images, pdf_path, str(self.image_extractor.output_dir))
         
         if not images:
             print("No images found in PDF")
             return AgentResult(success=True, payload={"visual_concepts": []})
         
         print(f"Found {len(images)} images")
+        if self.image_store:
+            # Images were written by the parser's worker process; record them here
+            self.image_store.register(images)
         
-        visual_concepts = []
+        # Limit the number of images per document to bound cost
+        images = images[:settings.VISION_MAX_IMAGES]
+        batches = self._group(images)
         
-        # Process each image (limit to first 5 to avoid rate limits)
-        max_images = min(5, len(images))
+        visual_concepts = []
+        calls = 0
+        routes = Counter()  # provider/model -> vision calls that succeeded with it
+        max_batch = {}  # provider/model -> largest batch it accepts, learned during this run
         
-        for i, img_info in enumerate(images[:max_images]):
-            print(f"\nProcessing image {i+1}/{max_images} (Page {img_info['page']})...")
+        for i, batch in enumerate(batches):
+            pages = sorted({img['page'] for img in batch})
+            print(f"\nProcessing {len(batch)} image(s), batch {i+1}/{len(batches)} (Pages {', '.join(map(str, pages))})...")
             
-            try:
-                prompt = """Analyze this image and provide:
-1. What type of visual is this? (diagram, chart, graph, screenshot, photo, equation, etc.)
-2. A detailed description of what it shows
-3. Key concepts or information it conveys
-4. How it relates to the document's content
-
-Format your response as JSON:
-{
-  "type": "diagram/chart/graph/etc",
-  "description": "detailed description",
-  "concepts": ["concept1", "concept2"],
-  "relevance": "how it relates to the document"
-}
-"""
-                
-                response = await self.llm.process_vision(
-                    img_info['path'],
-                    prompt
-                )
-                
-                # Parse response
-                import json
-                clean_response = response.replace("```json", "").replace("```", "").strip()
-                
-                if "{" in clean_response and "}" in clean_response:
-                    start = clean_response.find("{")
-                    end = clean_response.rfind("}") + 1
-                    clean_response = clean_response[start:end]
-                
-                visual_data = json.loads(clean_response)
-                visual_data['page'] = img_info['page']
-                visual_data['image_path']  = img_info['path']
-                
+            results, batch_calls = await self._analyze(batch, routes, max_batch)
+            calls += batch_calls
+            for visual_data in results:
                 visual_concepts.append(visual_data)
                 print(f"  Type: {visual_data.get('type', 'unknown')}")
-                print(f"  Concepts: {', '.join(visual_data.get('concepts', []))}")
-                
-                # Rate limit delay
-                if i < max_images - 1:
-                    await asyncio.sleep(5)
-            
-            except Exception as e:
-                print(f"  Error processing image: {e}")
-                continue
+                print(f"  Concepts: {', '.join(map(str, visual_data.get('concepts') or []))}")
         
+        if self.image_store:
+            await self.image_store.asave()
+        print(f"Analyzed {len(visual_concepts)}/{len(images)} images in {calls} vision calls")
         return AgentResult(
             success=True,
-            payload={"visual_concepts": visual_concepts}
+            payload={"visual_concepts": visual_concepts},
+            meta={"images": len(images), "vision_calls": calls, "routes": dict(routes)}
         )
+    
+    def _group(self, images):
+        """Consecutive images in page order, at most VISION_BATCH_SIZE per group and close together"""
+        size = max(1, settings.VISION_BATCH_SIZE)
+        groups = []
+        for img in sorted(images, key=lambda img: (img['page'], img.get('index', 0))):
+            group = groups[-1] if groups else None
+            if (group is None or len(group) >= size
+                    or img['page'] - group[0]['page'] > settings.VISION_BATCH_PAGE_SPAN):
+                groups.append([img])
+            else:
+                group.append(img)
+        return groups
+    
+    async def _analyze(self, batch, routes, max_batch):
+        """
+        Returns (visual concept dicts, number of vision calls made); counts the
+        models used in `routes` and records batch sizes they reject in `max_batch`
+        """
+        if len(batch) > 1:
+            prompt = BATCH_PROMPT.format(count=len(batch))
+            route = router.select("vision", prompt_tokens=estimate_tokens([prompt]) + len(batch) * IMAGE_TOKENS)
+            model = f"{route.provider}/{route.model}"  # the chain the batch is sent to starts here
+            limit = max_batch.get(model)
+            if limit is not None and len(batch) > limit:
+                # This model rejected a batch this large earlier; send smaller pieces
+                results, calls = [], 0
+                for start in range(0, len(batch), limit):
+                    part_results, part_calls = await self._analyze(batch[start:start + limit], routes, max_batch)
+                    results.extend(part_results)
+                    calls += part_calls
+                return results, calls
+
+        if self.image_store:
+            # The blobs are read for this request
+            for img in batch:
+                self.image_store.touch(img.get('image_id'))
+
+        if len(batch) == 1:
+            img_info = batch[0]
+            try:
+                route = router.select("vision", prompt_tokens=estimate_tokens([SINGLE_IMAGE_PROMPT]) + IMAGE_TOKENS)
+                response = await self.llm.process_vision(img_info['path'], SINGLE_IMAGE_PROMPT, route)
+                routes[f"{route.provider}/{route.model}"] += 1
+                # Parse response, repairing small syntax slips locally
+                visual_data = parse_json_object(response)
+                return [self._with_source(visual_data, img_info)], 1
+            except Exception as e:
+                print(f"  Error processing image (Page {img_info['page']}): {e}")
+                return [], 1
+        
+        try:
+            response = await self.llm.process_vision_batch([img['path'] for img in batch], prompt, route)
+            routes[f"{route.provider}/{route.model}"] += 1
+        except VisionBatchTooLarge:
+            max_batch[model] = max(1, len(batch) // 2)
+            print(f"  Batch of {len(batch)} images rejected by {model} as too large, splitting into batches of {max_batch[model]}")
+            results, calls = await self._analyze(batch, routes, max_batch)
+            return results, calls + 1
+        except Exception as e:
+            print(f"  Error processing image batch: {e}")
+            return [], 1
+        
+        by_image = {}
+        try:
+            entries = [e for e in parse_json_array(response) if isinstance(e, dict)]
+        except ValueError as e:
+            print(f"  Could not parse batch response: {e}")
+            entries = []
+        for position, entry in enumerate(entries):
+            try:
+                n = int(entry.pop('image', position + 1)) - 1
+            except (TypeError, ValueError):
+                n = position
+            if 0 <= n < len(batch) and n not in by_image:
+                by_image[n] = self._with_source(entry, batch[n])
+        
+        calls = 1
+        missing = [n for n in range(len(batch)) if n not in by_image]
+        if missing:
+            # The model skipped some images; ask again for just those, one at a time
+            print(f"  {len(missing)} image(s) missing from the batch response, retrying individually")
+            for n in missing:
+                retry_results, retry_calls = await self._analyze([batch[n]], routes, max_batch)
+                calls += retry_calls
+                if retry_results:
+                    by_image[n] = retry_results[0]
+        
+        return [by_image[n] for n in sorted(by_image)], calls
+    
+    @staticmethod
+    def _with_source(visual_data, img_info):
+        visual_data['page'] = img_info['page']
+        visual_data['image_path'] = img_info['path']
+        visual_data['image_id'] = img_info.get('image_id')
+        return visual_data
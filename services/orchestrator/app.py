@@ -1,45 +1,109 @@
+import time
+
+_import_started = time.perf_counter()
+
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel, Field
+from typing import Optional
 from .orchestrator import FlowMindOrchestrator
+from .config import settings
+from .bulk_ingest import BulkIngestJobs
+from .scheduler import QueueFullError
 from ..pedagogy.feedback_service import FeedbackService, FeedbackRequest
-import uvicorn
+from ..tools import executors
+import asyncio
 import logging
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="FlowMind Orchestrator")
 orchestrator = FlowMindOrchestrator()
 feedback_service = FeedbackService()
+bulk_jobs = BulkIngestJobs(orchestrator)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm up in the background so the server starts accepting health checks immediately
+    warmup_task = asyncio.create_task(orchestrator.warm_up())
+    yield
+    if not warmup_task.done():
+        warmup_task.cancel()
+    executors.shutdown()
+
+app = FastAPI(title="FlowMind Orchestrator", lifespan=lifespan)
 
 class IngestRequest(BaseModel):
     pdf_path: str
+    course_id: Optional[str] = None
+    doc_id: Optional[str] = None  # defaults to a hash of the PDF's content
+
+class BulkIngestRequest(BaseModel):
+    source: str  # directory, glob pattern, or manifest file
+    resume: bool = True
+    concurrency: Optional[int] = None
+    course_id: Optional[str] = None
 
 class QueryRequest(BaseModel):
     query: str
+    deadline_s: Optional[float] = Field(default=None, gt=0, le=settings.ASK_MAX_DEADLINE_S)
+    course_id: Optional[str] = None
+    doc_id: Optional[str] = None  # restrict retrieval to one document
+    session_id: Optional[str] = None  # continue a tutoring conversation
+
+def _require_ready():
+    """503 until warm-up has built the stores, so handlers never build or write them alongside it"""
+    if not orchestrator.ready:
+        detail = f"Warm-up failed: {orchestrator.warmup_error}" if orchestrator.warmup_error else "Still warming up"
+        raise HTTPException(status_code=503, detail=detail, headers={"Retry-After": str(settings.WARMUP_RETRY_AFTER_S)})
 
 @app.post("/ingest")
 async def ingest(request: IngestRequest):
+    _require_ready()
     try:
-        result = await orchestrator.ingest_pdf(request.pdf_path)
+        result = await orchestrator.ingest_pdf(request.pdf_path, request.course_id, request.doc_id)
         if not result.success:
             raise HTTPException(status_code=500, detail=result.payload.get("error"))
         return result.payload
     except HTTPException:
         raise
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
     except Exception as e:
         logger.error(f"Error in /ingest: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/ingest/bulk", status_code=202)
+async def ingest_bulk(request: BulkIngestRequest):
+    _require_ready()
+    running = bulk_jobs.running()
+    if running:
+        raise HTTPException(status_code=409, detail=f"Bulk ingestion job {running} is still running")
+    job_id = bulk_jobs.start(request.source, request.resume, request.concurrency, request.course_id)
+    return {"job_id": job_id, "status": "running"}
+
+@app.get("/ingest/bulk/{job_id}")
+async def ingest_bulk_status(job_id: str):
+    job = bulk_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown bulk ingestion job: {job_id}")
+    return job
+
 @app.post("/ask")
 async def ask(request: QueryRequest):
+    _require_ready()
     try:
-        result = await orchestrator.ask_tutor(request.query)
+        result = await orchestrator.ask_tutor(
+            request.query, request.deadline_s, request.course_id, request.doc_id, request.session_id
+        )
         if not result.success:
             raise HTTPException(status_code=500, detail=result.payload.get("error"))
         return result.payload
     except HTTPException:
         raise
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
     except Exception as e:
         logger.error(f"Error in /ask: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
@@ -48,14 +112,73 @@ async def ask(request: QueryRequest):
 async def submit_feedback(request: FeedbackRequest):
     try:
         logger.info(f"Received feedback for query: {request.query[:30]}...")
-        return feedback_service.submit_feedback(request)
+        return await executors.run_io(feedback_service.submit_feedback, request)
     except Exception as e:
         logger.error(f"Error in /feedback: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/learning-path")
+async def learning_path(concept: str):
+    _require_ready()
+    try:
+        result = await orchestrator.learning_path(concept)
+    except Exception as e:
+        logger.error(f"Error in /learning-path: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+    if result is None:
+        raise HTTPException(status_code=404, detail=f"Unknown concept: {concept}")
+    return result
+
+def _graph_store():
+    _require_ready()
+    return orchestrator.graph_store
+
+@app.get("/graph/nodes")
+async def list_nodes(cursor: Optional[str] = None, limit: int = 100):
+    try:
+        nodes, next_cursor = _graph_store().list_nodes(cursor, max(1, min(limit, settings.GRAPH_PAGE_MAX)))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"nodes": nodes, "next_cursor": next_cursor}
+
+@app.get("/graph/edges")
+async def list_edges(cursor: Optional[str] = None, limit: int = 100):
+    try:
+        edges, next_cursor = _graph_store().list_edges(cursor, max(1, min(limit, settings.GRAPH_PAGE_MAX)))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"edges": edges, "next_cursor": next_cursor}
+
+@app.get("/graph/subgraph")
+async def subgraph(concept: str, radius: int = 1, limit: int = 200):
+    result = _graph_store().subgraph(concept, max(0, radius), max(1, min(limit, settings.GRAPH_PAGE_MAX)))
+    if result is None:
+        raise HTTPException(status_code=404, detail=f"Unknown concept: {concept}")
+    return result
+
+@app.get("/graph/export")
+async def export_graph():
+    graph_store = _graph_store()
+
+    async def chunks():
+        # Serialise on the event loop (where the graph is mutated), one chunk
+        # at a time, yielding between chunks so /ask isn't starved
+        for chunk in graph_store.iter_ndjson(settings.GRAPH_EXPORT_BATCH):
+            yield chunk
+            await asyncio.sleep(0)
+
+    return StreamingResponse(chunks(), media_type="application/x-ndjson")
+
 @app.get("/health")
 async def health():
-    return {"status": "healthy"}
+    status = orchestrator.status()
+    if not status["ready"]:
+        return JSONResponse(status_code=503, content={"status": "failed" if status["error"] else "warming_up", **status})
+    return {"status": "healthy", **status}
+
+orchestrator.startup_metrics["import_s"] = round(time.perf_counter() - _import_started, 3)
 
 if __name__ == "__main__":
+    import uvicorn
+
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,202 @@
+from .config import settings
+from .scheduler import QueueFullError
+from ..tools.executors import run_io
+from pathlib import Path
+from typing import List
+import asyncio
+import glob
+import json
+import logging
+import os
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_SUFFIXES = (".txt", ".json")
+
+def resolve_sources(source: str) -> List[str]:
+    """
+    Expand a bulk ingestion source into PDF paths. Accepts a directory
+    (searched recursively), a glob pattern, a single PDF, or a manifest: a
+    .txt file with one path per line or a .json list of paths. Relative paths
+    in a manifest are resolved against the manifest's directory.
+    """
+    path = Path(source)
+
+    if path.is_dir():
+        paths = sorted(path.rglob("*.pdf"))
+    elif path.is_file() and path.suffix.lower() in MANIFEST_SUFFIXES:
+        with open(path, 'r') as f:
+            if path.suffix.lower() == ".json":
+                entries = json.load(f)
+            else:
+                entries = [line.strip() for line in f if line.strip() and not line.startswith("#")]
+        paths = [p if Path(p).is_absolute() else path.parent / p for p in map(str, entries)]
+    elif path.is_file():
+        paths = [path]
+    else:
+        paths = sorted(glob.glob(source, recursive=True))
+
+    resolved = []
+    for p in paths:
+        p = Path(p)
+        if p.suffix.lower() == ".pdf" and p.is_file():
+            resolved.append(str(p.resolve()))
+    return list(dict.fromkeys(resolved))
+
+class BulkIngestor:
+    """
+    Ingests many PDFs concurrently through one orchestrator. Provider and stage
+    limits apply globally on top of the per-run document concurrency, and
+    progress is checkpointed after every document so an interrupted run resumes
+    where it stopped.
+    """
+
+    def __init__(self, orchestrator, checkpoint_path: str = None, concurrency: int = None):
+        self.orchestrator = orchestrator
+        self.checkpoint_path = checkpoint_path or settings.BULK_CHECKPOINT_PATH
+        self.concurrency = concurrency or settings.BULK_INGEST_CONCURRENCY
+        self._lock = asyncio.Lock()
+        self.checkpoint = {"documents": {}}
+        self.documents = self.skipped = self.finished = self.failed = 0
+
+    def _load_checkpoint(self):
+        if os.path.exists(self.checkpoint_path):
+            with open(self.checkpoint_path, 'r') as f:
+                self.checkpoint = json.load(f)
+
+    def _save_checkpoint(self):
+        Path(self.checkpoint_path).parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = f"{self.checkpoint_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.checkpoint, f, indent=2)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def _is_done(self, pdf_path: str) -> bool:
+        entry = self.checkpoint["documents"].get(pdf_path)
+        # A document modified since it was ingested is ingested again
+        return bool(entry) and entry["status"] == "done" and entry.get("mtime") == os.path.getmtime(pdf_path)
+
+    async def _ingest_one(self, pdf_path: str, semaphore: asyncio.Semaphore, course_id: str = None):
+        async with semaphore:
+            started = time.perf_counter()
+            entry = {"mtime": os.path.getmtime(pdf_path)}
+            try:
+                while True:
+                    try:
+                        result = await self.orchestrator.ingest_pdf(pdf_path, course_id)
+                        break
+                    except QueueFullError as e:
+                        # Back off instead of failing the document
+                        await asyncio.sleep(e.retry_after)
+                if result.success:
+                    entry.update(
+                        status="done",
+                        doc_id=result.payload.get("doc_id"),
+                        pages=result.payload.get("pages", 0),
+                        concepts=result.payload.get("concepts_count", 0),
+                        relations=result.payload.get("relations_count", 0)
+                    )
+                else:
+                    entry.update(status="failed", error=result.payload.get("error"))
+            except Exception as e:
+                logger.error(f"Bulk ingestion of {pdf_path} failed: {e}", exc_info=True)
+                entry.update(status="failed", error=str(e))
+            entry["seconds"] = round(time.perf_counter() - started, 3)
+
+            async with self._lock:
+                self.finished += 1
+                self.failed += entry["status"] != "done"
+                self.checkpoint["documents"][pdf_path] = entry
+                # The checkpoint only changes under the lock, so it can be written off the loop
+                await run_io(self._save_checkpoint)
+            logger.info(f"[{entry['status']}] {pdf_path} ({entry['seconds']}s)")
+            return entry
+
+    async def run(self, source: str, resume: bool = True, course_id: str = None):
+        """Ingest every PDF in `source` and return aggregate throughput"""
+        # Globbing a large tree and reading the checkpoint would stall the event loop
+        paths = await run_io(resolve_sources, source)
+        if resume:
+            await run_io(self._load_checkpoint)
+        else:
+            self.checkpoint = {"documents": {}}
+
+        pending = [p for p in paths if not self._is_done(p)]
+        self.documents, self.skipped = len(paths), len(paths) - len(pending)
+        logger.info(f"Bulk ingestion: {len(paths)} documents, {len(paths) - len(pending)} already done")
+
+        started = time.perf_counter()
+        semaphore = asyncio.Semaphore(self.concurrency)
+        entries = await asyncio.gather(*(self._ingest_one(p, semaphore, course_id) for p in pending))
+        elapsed = time.perf_counter() - started
+
+        done = [e for e in entries if e["status"] == "done"]
+        pages = sum(e["pages"] for e in done)
+        concepts = sum(e["concepts"] for e in done)
+        minutes = elapsed / 60 if elapsed > 0 else 0
+
+        return {
+            "documents": len(paths),
+            "skipped": len(paths) - len(pending),
+            "ingested": len(done),
+            "failed": [p for p, e in zip(pending, entries) if e["status"] != "done"],
+            "pages": pages,
+            "concepts": concepts,
+            "elapsed_s": round(elapsed, 3),
+            "docs_per_min": round(len(done) / minutes, 2) if minutes else 0,
+            "pages_per_min": round(pages / minutes, 2) if minutes else 0,
+            "concepts_per_min": round(concepts / minutes, 2) if minutes else 0
+        }
+
+    def progress(self):
+        return {
+            "documents": self.documents,
+            "skipped": self.skipped,
+            "finished": self.finished,
+            "failed": self.failed
+        }
+
+class BulkIngestJobs:
+    """
+    Bulk ingestion runs in the background; callers poll the job for progress
+    and the final summary. One job runs at a time, since every run resumes
+    from the same checkpoint. The last BULK_JOB_HISTORY jobs are kept.
+    """
+
+    def __init__(self, orchestrator):
+        self.orchestrator = orchestrator
+        self._jobs = {}  # job ID -> job, oldest first
+
+    def running(self):
+        return next((job_id for job_id, job in self._jobs.items() if job["status"] == "running"), None)
+
+    def start(self, source: str, resume: bool = True, concurrency: int = None, course_id: str = None) -> str:
+        job_id = uuid.uuid4().hex
+        ingestor = BulkIngestor(self.orchestrator, concurrency=concurrency)
+        job = {"source": source, "status": "running", "started_at": time.time(), "ingestor": ingestor}
+        self._jobs[job_id] = job
+
+        async def execute():
+            try:
+                job["result"] = await ingestor.run(source, resume=resume, course_id=course_id)
+                job["status"] = "done"
+            except Exception as e:
+                logger.error(f"Bulk ingestion job {job_id} failed: {e}", exc_info=True)
+                job.update(status="failed", error=str(e))
+            job["finished_at"] = time.time()
+
+        job["task"] = asyncio.create_task(execute())
+        finished = [i for i, j in self._jobs.items() if j["status"] != "running"]
+        for old_id in finished[:max(0, len(self._jobs) - settings.BULK_JOB_HISTORY)]:
+            del self._jobs[old_id]
+        return job_id
+
+    def get(self, job_id: str):
+        """Status, progress and (once finished) the summary of a job; None if unknown"""
+        job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        status = {k: v for k, v in job.items() if k not in ("ingestor", "task")}
+        return {"job_id": job_id, **status, "progress": job["ingestor"].progress()}
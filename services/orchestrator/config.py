@@ -1,4 +1,5 @@
 import os
+from typing import Any, Dict, List
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
@@ -8,6 +9,170 @@ class Settings(BaseSettings):
     PINECONE_ENV: str = "us-east-1"
     REDIS_URL: str = "redis://localhost:6379"
     GRAPH_STORAGE_PATH: str = "data/knowledge_graph.json"
+    # "networkx" keeps the graph in a DiGraph saved to GRAPH_STORAGE_PATH; "compact"
+    # uses typed arrays and a lazily read definition table under GRAPH_COMPACT_DIR
+    # (importing GRAPH_STORAGE_PATH the first time)
+    GRAPH_BACKEND: str = "networkx"
+    GRAPH_COMPACT_DIR: str = "data/knowledge_graph_compact"
+    # Vector namespace used when a document is ingested without a course
+    DEFAULT_COURSE_ID: str = "default"
+
+    # Local grounding check: answers scoring at least GROUNDING_SKIP_THRESHOLD
+    # skip the LLM critic; everything else is escalated to it.
+    GROUNDING_SKIP_THRESHOLD: float = 0.85
+    GROUNDING_LEXICAL_THRESHOLD: float = 0.6
+    GROUNDING_EMBEDDING_THRESHOLD: float = 0.85
+
+    # Per-request latency budget for /ask (callers may ask for up to
+    # ASK_MAX_DEADLINE_S) and the number of critique-driven revisions
+    ASK_DEADLINE_S: float = 30.0
+    ASK_MAX_DEADLINE_S: float = 120.0
+    ASK_MAX_REVISIONS: int = 2
+
+    # Global concurrency caps shared by every ingestion (JSON objects in .env)
+    PROVIDER_CONCURRENCY: Dict[str, int] = {"mistral": 8, "openrouter": 4}
+    STAGE_CONCURRENCY: Dict[str, int] = {"parse": 4, "text_concepts": 4, "vision": 2, "relations": 4}
+
+    # Rate limits per provider and per model (requests and tokens per minute; JSON
+    # in .env). Limits reported in response headers override these. Buckets hold
+    # RATE_LIMIT_BURST_S seconds of traffic. A 429 pauses the model for its
+    # Retry-After, or a jittered exponential backoff, and is retried up to
+    # RATE_LIMIT_MAX_RETRIES times; vision falls back to the next model instead of
+    # waiting longer than RATE_LIMIT_MAX_WAIT_S.
+    PROVIDER_RATE_LIMITS: Dict[str, Dict[str, int]] = {"mistral": {"rpm": 60, "tpm": 500000}, "openrouter": {"rpm": 60}}
+    MODEL_RATE_LIMITS: Dict[str, Dict[str, int]] = {
+        "google/gemma-3-27b-it:free": {"rpm": 20},
+        "mistralai/mistral-small-3.1-24b-instruct:free": {"rpm": 20}
+    }
+    RATE_LIMIT_BURST_S: float = 10.0
+    RATE_LIMIT_MAX_RETRIES: int = 4
+    RATE_LIMIT_BACKOFF_BASE_S: float = 1.0
+    RATE_LIMIT_BACKOFF_MAX_S: float = 60.0
+    RATE_LIMIT_MAX_WAIT_S: float = 20.0
+
+    # Model routing: ranked candidates per task (JSON in .env). A candidate with
+    # max_prompt_tokens only takes prompts up to that size. Candidates are ordered
+    # by moving-average latency, recent errors (ROUTER_ERROR_PENALTY_S at a 100%
+    # error rate, forgotten over ROUTER_STATS_HALFLIFE_S), rate-limit wait, and
+    # ROUTER_RANK_PENALTY_S per rank; a failed call falls back to the next
+    # candidate, up to ROUTER_MAX_ATTEMPTS models per text request.
+    MODEL_ROUTES: Dict[str, List[Dict[str, Any]]] = {
+        "general": [
+            {"provider": "mistral", "model": "mistral-large-latest"},
+            {"provider": "mistral", "model": "mistral-small-latest"}
+        ],
+        "extraction": [
+            {"provider": "mistral", "model": "mistral-large-latest"},
+            {"provider": "mistral", "model": "mistral-small-latest"}
+        ],
+        "relations": [
+            {"provider": "mistral", "model": "mistral-small-latest", "max_prompt_tokens": 1200},
+            {"provider": "mistral", "model": "mistral-large-latest"}
+        ],
+        "critique": [
+            {"provider": "mistral", "model": "mistral-small-latest", "max_prompt_tokens": 2500},
+            {"provider": "mistral", "model": "mistral-large-latest"}
+        ],
+        "tutoring": [
+            {"provider": "openrouter", "model": "google/gemma-3-27b-it:free"},
+            {"provider": "mistral", "model": "mistral-small-latest"}
+        ],
+        "summary": [
+            {"provider": "mistral", "model": "mistral-small-latest"},
+            {"provider": "mistral", "model": "mistral-large-latest"}
+        ],
+        "vision": [
+            {"provider": "openrouter", "model": "google/gemma-3-27b-it:free"},
+            {"provider": "openrouter", "model": "mistralai/mistral-small-3.1-24b-instruct:free"},
+            {"provider": "mistral", "model": "pixtral-12b-2409"}
+        ]
+    }
+    ROUTER_MAX_ATTEMPTS: int = 2
+    ROUTER_RANK_PENALTY_S: float = 2.0
+    ROUTER_ERROR_PENALTY_S: float = 30.0
+    ROUTER_EWMA_ALPHA: float = 0.2
+    ROUTER_STATS_HALFLIFE_S: float = 300.0
+
+    # Entity resolution: concepts whose embeddings are at least this similar are merged.
+    # The local concept index is scanned in chunks of ENTITY_RESOLUTION_CHUNK rows.
+    ENTITY_MERGE_THRESHOLD: float = 0.92
+    ENTITY_RESOLUTION_CHUNK: int = 16384
+    CONCEPT_INDEX_DIR: str = "data/concept_index"
+
+    # Relation mapping: "candidates" proposes pairs locally (embedding kNN,
+    # co-occurrence, vision hints) and verifies them in batched LLM calls;
+    # "names" is the single-call mapping over the top 10 concept names.
+    # Batches hold at most RELATION_BATCH_SIZE pairs and are cut to fit the
+    # smallest max_prompt_tokens on the "relations" route.
+    RELATION_MAPPING_MODE: str = "candidates"
+    RELATION_KNN: int = 5
+    RELATION_MIN_SIMILARITY: float = 0.5
+    RELATION_BATCH_SIZE: int = 20
+    RELATION_CONCURRENCY: int = 4
+
+    # Tutoring sessions: "memory" keeps an LRU of SESSION_MAX_SESSIONS sessions,
+    # "redis" stores them at REDIS_URL. Turns beyond SESSION_MAX_TURNS are folded
+    # into a rolling summary, keeping the last SESSION_KEEP_TURNS verbatim.
+    SESSION_BACKEND: str = "memory"
+    SESSION_MAX_SESSIONS: int = 10000
+    SESSION_TTL_S: int = 86400
+    SESSION_MAX_TURNS: int = 6
+    SESSION_KEEP_TURNS: int = 2
+    SESSION_SUMMARY_CHARS: int = 1200
+    SESSION_TURN_CHARS: int = 1500
+
+    # Admission control: concurrent requests and queue depth per work class.
+    # Requests beyond the queue limit get 429 with Retry-After.
+    INTERACTIVE_CONCURRENCY: int = 32
+    INTERACTIVE_QUEUE: int = 128
+    BATCH_CONCURRENCY: int = 2
+    BATCH_QUEUE: int = 16
+    # Requests to stateful endpoints during warm-up get 503 with this Retry-After
+    WARMUP_RETRY_AFTER_S: int = 5
+
+    # Graph analytics: PageRank damping and how many learning paths stay cached
+    PAGERANK_DAMPING: float = 0.85
+    LEARNING_PATH_CACHE_SIZE: int = 10000
+
+    # Graph browsing API: largest page or subgraph served, and lines per export chunk
+    GRAPH_PAGE_MAX: int = 1000
+    GRAPH_EXPORT_BATCH: int = 500
+
+    # PDF parsing: "pymupdf" (layout-aware: headings, paragraphs, tables and
+    # captions with bounding boxes) or "pdfminer" (plain text blocks)
+    PDF_PARSER_BACKEND: str = "pymupdf"
+    PDF_DETECT_TABLES: bool = True
+
+    # Vision: at most VISION_MAX_IMAGES images per document, packed up to
+    # VISION_BATCH_SIZE per request when they are within VISION_BATCH_PAGE_SPAN
+    # pages of each other (1 sends one image per request)
+    VISION_MAX_IMAGES: int = 20
+    VISION_BATCH_SIZE: int = 4
+    VISION_BATCH_PAGE_SPAN: int = 2
+
+    # Extracted images: content-addressed store, capped at IMAGE_STORE_QUOTA_MB by
+    # evicting unreferenced images (least recently used first, none younger than
+    # IMAGE_STORE_GRACE_S seconds)
+    IMAGE_STORE_DIR: str = "data/extracted_images"
+    IMAGE_STORE_QUOTA_MB: int = 1024
+    IMAGE_STORE_GRACE_S: int = 600
+
+    # Per-concept tutor context (definition, strongest relations, linked figures,
+    # source pages), rebuilt after each ingestion and trimmed to CONTEXT_PACK_TOKENS
+    CONTEXT_PACK_PATH: str = "data/context_packs.sqlite"
+    CONTEXT_PACK_TOKENS: int = 350
+    CONTEXT_PACK_MAX_RELATIONS: int = 6
+    CONTEXT_PACK_MAX_VISUALS: int = 2
+
+    # Blocking work: threads for I/O (Pinecone, file writes), worker processes
+    # for CPU-bound parsing and image extraction (0 runs it on the I/O threads)
+    IO_WORKERS: int = 16
+    CPU_WORKERS: int = 2
+
+    # Bulk corpus ingestion
+    BULK_INGEST_CONCURRENCY: int = 4
+    BULK_CHECKPOINT_PATH: str = "data/bulk_ingest_checkpoint.json"
+    BULK_JOB_HISTORY: int = 20
 
     class Config:
         env_file = ".env"
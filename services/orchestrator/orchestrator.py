@@ -3,9 +3,27 @@ from ..ingestion.parsing_agent import ParsingAgent
 from ..ingestion.concept_agent import ConceptExtractionAgent
 from ..ingestion.vision_agent import VisionConceptAgent
 from ..ingestion.relation_agent import RelationshipMappingAgent
+from ..ingestion.resolution_agent import EntityResolutionAgent
 from ..pedagogy.teaching_agent import TeachingAgent
 from ..pedagogy.critic_agent import CriticAgent
+from ..pedagogy.grounding import GroundingScorer
+from ..pedagogy.session_memory import SessionMemory
+from .config import settings
+from .pipeline import Stage, StageGraph
+from .scheduler import Scheduler
+from ..tools.ids import document_id, concept_id
+from ..tools.vector_store import VectorStore
+from ..tools.graph_store import open_graph_store
+from ..tools.graph_analytics import GraphAnalytics
+from ..tools.image_store import ImageStore
+from ..tools.model_router import router
+from ..tools.rate_limiter import governor
+from ..tools.context_packs import ContextPacks, ContextPackStore
+from ..tools.single_flight import flight_key, ask_flight
+from ..tools import executors
+import asyncio
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
@@ -15,93 +33,426 @@ class FlowMindOrchestrator:
         self.concept_agent = ConceptExtractionAgent()
         self.vision_agent = VisionConceptAgent()
         self.relation_agent = RelationshipMappingAgent()
+        self.resolution_agent = EntityResolutionAgent()
         self.teaching_agent = TeachingAgent()
         self.critic_agent = CriticAgent()
+        self.grounding_scorer = GroundingScorer()
+        self.session_memory = SessionMemory()
+        # Interactive (/ask) and batch (/ingest) work get separate pools; /ask has priority
+        self.scheduler = Scheduler.from_settings()
+        # Running estimates (seconds) used to decide whether a revision fits the deadline
+        self._latency = {"generate": 10.0, "check": 3.0}
+
+        # Stores are built by warm_up() rather than here so that constructing
+        # the orchestrator (and importing the app) stays cheap.
+        self.vector_store = None
+        self.graph_store = None
+        self.graph_analytics = None
+        self.image_store = None
+        self.context_packs = None
+        self._analytics_task = None
+        self.ready = False
+        self.warmup_error = None
+        self.startup_metrics = {}
+
+    async def warm_up(self):
+        """
+        Connect to Pinecone and load the knowledge graph in a worker thread,
+        then share the stores with every agent that needs them.
+        """
+        started = time.perf_counter()
+        try:
+            self.graph_store = await executors.run_io(open_graph_store)
+            self.vector_store = await executors.run_io(VectorStore)
+
+            for agent in (self.resolution_agent, self.teaching_agent):
+                agent.vector_store = self.vector_store
+            for agent in (self.resolution_agent, self.relation_agent, self.teaching_agent):
+                agent.graph_store = self.graph_store
+
+            self.image_store = await executors.run_io(ImageStore(self.vision_agent.image_extractor.output_dir).load)
+            for agent in (self.vision_agent, self.resolution_agent):
+                agent.image_store = self.image_store
+
+            self.graph_analytics = GraphAnalytics(self.graph_store)
+            await self.graph_analytics.refresh()
+
+            self.context_packs = ContextPacks(self.graph_store, await executors.run_io(ContextPackStore), self.image_store)
+            await self.context_packs.backfill()
+            await self.context_packs.rebuild()
+            self.teaching_agent.context_packs = self.context_packs
+
+            self.ready = True
+            logger.info("Warm-up complete")
+        except Exception as e:
+            self.warmup_error = str(e)
+            logger.error(f"Warm-up failed: {e}", exc_info=True)
+        finally:
+            self.startup_metrics["warmup_s"] = round(time.perf_counter() - started, 3)
+
+    def status(self):
+        """Readiness and startup timings, as reported by /health"""
+        return {
+            "ready": self.ready,
+            "error": self.warmup_error,
+            "startup": self.startup_metrics,
+            "scheduler": self.scheduler.stats(),
+            "executors": executors.stats(),
+            "rate_limits": governor.headroom(),
+            "model_router": router.stats(),
+            "graph_analytics": self.graph_analytics.stats() if self.graph_analytics else None,
+            "image_store": self.image_store.stats() if self.image_store else None,
+            "context_packs": self.context_packs.stats() if self.context_packs else None
+        }
+
+    async def ingest_pdf(self, pdf_path: str, course_id: str = None, doc_id: str = None):
+        """Ingest a PDF as batch work; raises QueueFullError when the batch queue is full"""
+        async with self.scheduler.admit("batch") as waited:
+            result = await self._ingest_pdf(pdf_path, course_id, doc_id)
+        result.payload["queue_wait_s"] = round(waited, 3)
+        if result.success:
+            self._refresh_analytics()
+            if self.image_store:
+                try:
+                    await self.image_store.enforce_quota()
+                except Exception as e:
+                    logger.warning(f"Image store eviction failed: {e}")
+            if self.context_packs:
+                try:
+                    await self.context_packs.rebuild()
+                except Exception as e:
+                    # Stale packs are still served; the next ingestion retries
+                    logger.warning(f"Context pack rebuild failed: {e}")
+        return result
+
+    def _refresh_analytics(self):
+        """Recompute graph analytics in the background so /learning-path doesn't pay for it"""
+        if self.graph_analytics and (self._analytics_task is None or self._analytics_task.done()):
+            self._analytics_task = asyncio.create_task(self.graph_analytics.refresh())
+
+    async def learning_path(self, concept: str):
+        """
+        Prerequisites of a concept (by ID or name) in teaching order, ending with
+        the concept itself. Returns None for an unknown concept.
+
+        Served from the last analytics snapshot; a stale one is refreshed in the
+        background. Only the first request, or one for a concept added since
+        the snapshot, waits for the computation.
+        """
+        analytics = self.graph_analytics
+        concept_id = self.graph_store.resolve(concept)
+        if analytics.version < 0 or (concept_id is not None and concept_id not in analytics.position):
+            await analytics.refresh()
+        elif analytics.version != self.graph_store.version:
+            self._refresh_analytics()
+        path = analytics.learning_path(concept_id) if concept_id is not None else None
+        if path is None:
+            return None
+        return {
+            "concept_id": concept_id,
+            "path": path,
+            "length": len(path),
+            "has_cycles": any(step["in_cycle"] for step in path),
+            "graph_version": analytics.version,
+            "stale": analytics.version != self.graph_store.version
+        }
+
+    async def _ingest_pdf(self, pdf_path: str, course_id: str = None, doc_id: str = None):
+        """
+        Multimodal ingestion as a stage graph. The vision branch extracts the
+        images in its own worker process, so image extraction and the vision
+        calls overlap with text parsing and concept extraction. Entity
+        resolution merges both branches' concepts with those already in the
+        course and stores them, then relations are mapped.
+
+        Documents are identified by a hash of their content unless `doc_id` is
+        given, and their vectors go into the course's namespace.
+        """
+        course_id = course_id or settings.DEFAULT_COURSE_ID
+        doc_id = doc_id or await executors.run_io(document_id, pdf_path)
+        logger.info(f"Starting multimodal ingestion for {pdf_path} ({doc_id}, course {course_id})")
+
+        graph = StageGraph([
+            Stage(
+                "parse",
+                lambda results: self.parsing_agent.run({"pdf_path": pdf_path})
+            ),
+            Stage(
+                "text_concepts",
+                lambda results: self.concept_agent.run({
+                    "blocks": results["parse"].payload["blocks"],
+                    "doc_id": doc_id,
+                    "course_id": course_id
+                }),
+                depends_on=("parse",)
+            ),
+            Stage(
+                "vision",
+                lambda results: self.vision_agent.run({"pdf_path": pdf_path}),
+                required=False
+            ),
+            Stage(
+                "resolve",
+                lambda results: self._resolve_concepts(results, doc_id, course_id),
+                depends_on=("text_concepts", "vision")
+            ),
+            Stage(
+                "relations",
+                lambda results: self.relation_agent.run({
+                    "concepts": results["resolve"].payload["concepts"],
+                    "blocks": results["parse"].payload["blocks"]
+                }),
+                depends_on=("parse", "resolve"),
+                required=False
+            ),
+        ])
+        results, timings = await graph.run()
+        logger.info(f"Ingestion timings: {timings}")
+
+        for name in ("parse", "text_concepts", "resolve"):
+            if not results[name].success:
+                results[name].payload["timings"] = timings
+                return results[name]
+
+        resolve_result = results["resolve"]
+        relation_result = results["relations"]
+        text_count = len(results["text_concepts"].payload["concepts"])
+        visual_count = resolve_result.meta.get("visual_concepts", 0)
 
-    async def ingest_pdf(self, pdf_path: str):
-        logger.info(f"Starting multimodal ingestion for {pdf_path}")
-        
-        # 1. Parse text
-        parse_result = await self.parsing_agent.run({"pdf_path": pdf_path})
-        if not parse_result.success:
-            return parse_result
-            
-        blocks = parse_result.payload["blocks"]
-        
-        # 2. Extract text concepts
-        concept_result = await self.concept_agent.run({"blocks": blocks})
-        if not concept_result.success:
-            return concept_result
-            
-        text_concepts = concept_result.payload["concepts"]
-        logger.info(f"Extracted {len(text_concepts)} text concepts")
-        
-        # 3. Extract visual concepts from images
-        vision_result = await self.vision_agent.run({"pdf_path": pdf_path})
-        visual_concepts = []
-        
-        if vision_result.success:
-            visual_data = vision_result.payload.get("visual_concepts", [])
-            
-            # Convert visual concepts to standard concept format
-            for vc in visual_data:
-                visual_concept = {
-                    "name": f"Visual: {vc.get('type', 'Image')} (Page {vc.get('page')})",
-                    "definition": vc.get('description', ''),
-                    "importance": 8,  # Visual concepts are important
-                    "type": "visual",
-                    "page": vc.get('page'),
-                    "related_concepts": vc.get('concepts', [])
-                }
-                visual_concepts.append(visual_concept)
-            
-            logger.info(f"Extracted {len(visual_concepts)} visual concepts")
-        else:
-            logger.warning("Visual concept extraction failed, continuing with text only")
-        
-        # 4. Combine text and visual concepts
-        all_concepts = text_concepts + visual_concepts
-        logger.info(f"Total concepts: {len(all_concepts)} ({len(text_concepts)} text + {len(visual_concepts)} visual)")
-        
-        # 5. Map Relationships
-        relation_result = await self.relation_agent.run({"concepts": all_concepts})
-        
         return AgentResult(
             success=True, 
             payload={
-                "concepts_count": len(all_concepts),
-                "text_concepts": len(text_concepts),
-                "visual_concepts": len(visual_concepts),
-                "relations_count": len(relation_result.payload.get("relations", []))
-            }
+                "doc_id": doc_id,
+                "course_id": course_id,
+                "pages": results["parse"].payload.get("pages", 0),
+                "concepts_count": text_count + visual_count,
+                "text_concepts": text_count,
+                "visual_concepts": visual_count,
+                "merged_concepts": resolve_result.payload.get("merged", 0),
+                "relations_count": len(relation_result.payload.get("relations", [])),
+                "timings": timings
+            },
+            meta={"routes": {
+                name: results[name].meta.get("route") or results[name].meta.get("routes")
+                for name in ("text_concepts", "vision", "relations")
+            }}
         )
 
+    def _visual_concepts(self, vision_result: AgentResult, doc_id: str, course_id: str):
+        """Convert vision agent output to the standard concept format"""
+        if not vision_result.success:
+            logger.warning("Visual concept extraction failed, continuing with text only")
+            return []
+
+        visual_concepts = []
+        for vc in vision_result.payload.get("visual_concepts", []):
+            name = f"Visual: {vc.get('type', 'Image')} (Page {vc.get('page')})"
+            visual_concepts.append({
+                "name": name,
+                # Several images on one page share a name, so the ID also covers the image
+                "concept_id": concept_id(doc_id, f"{name} {vc.get('image_id') or vc.get('image_path', '')}"),
+                "doc_id": doc_id,
+                "course_id": course_id,
+                "definition": vc.get('description', ''),
+                "importance": 8,  # Visual concepts are important
+                "type": "visual",
+                "page": vc.get('page'),
+                "related_concepts": vc.get('concepts', []),
+                "image_id": vc.get('image_id'),
+                "image_path": vc.get('image_path')
+            })
+        logger.info(f"Extracted {len(visual_concepts)} visual concepts")
+        return visual_concepts
 
-    async def ask_tutor(self, query: str):
-        # 1. Get initial answer
-        teach_result = await self.teaching_agent.run({"query": query})
-        if not teach_result.success:
-            return teach_result
-            
-        response = teach_result.payload["response"]
-        context_used = teach_result.payload["context_used"]
-        
-        # 2. Critique
-        critic_result = await self.critic_agent.run({
-            "proposed_response": response,
-            "source_context": str(context_used)
-        })
-        
-        if critic_result.payload.get("approved"):
-            return teach_result
+    async def _resolve_concepts(self, results, doc_id: str, course_id: str):
+        text_concepts = results["text_concepts"].payload["concepts"]
+        visual_concepts = self._visual_concepts(results["vision"], doc_id, course_id)
+
+        all_concepts = text_concepts + visual_concepts
+        logger.info(f"Total concepts: {len(all_concepts)} ({len(text_concepts)} text + {len(visual_concepts)} visual)")
+        if not all_concepts:
+            resolve_result = AgentResult(success=True, payload={"concepts": [], "new": 0, "merged": 0})
         else:
-            # Simple retry logic or return with warning
-            # For now, just append the critique
+            resolve_result = await self.resolution_agent.run({
+                "concepts": all_concepts,
+                "doc_id": doc_id,
+                "course_id": course_id
+            })
+        resolve_result.meta["visual_concepts"] = len(visual_concepts)
+        return resolve_result
+
+
+    async def ask_tutor(self, query: str, deadline_s: float = None, course_id: str = None, doc_id: str = None,
+                        session_id: str = None):
+        """Answer as interactive work; raises QueueFullError when the interactive queue is full"""
+        started = time.perf_counter()
+        deadline_s = deadline_s or settings.ASK_DEADLINE_S
+        try:
+            async with self.scheduler.admit("interactive") as waited:
+                if session_id:
+                    # Session turns depend on the conversation, so they are never shared
+                    result = await self._ask_tutor(query, deadline_s, course_id, doc_id, session_id)
+                else:
+                    # The same question asked concurrently (e.g. by a whole class) is answered once
+                    key = flight_key("ask", " ".join(query.lower().split()), deadline_s, course_id, doc_id)
+                    result = await ask_flight.do(key, lambda: self._ask_tutor(query, deadline_s, course_id, doc_id))
+            # Coalesced callers share the result object, so don't mutate it
             return AgentResult(
-                success=True, 
-                payload={
-                    "response": response,
-                    "critique": critic_result.payload["critique"],
-                    "warning": "Response may need improvement."
-                }
+                success=result.success,
+                payload={**result.payload, "queue_wait_s": round(waited, 3)},
+                meta=result.meta
+            )
+        finally:
+            self.startup_metrics.setdefault("first_ask_s", round(time.perf_counter() - started, 3))
+
+    def _observe(self, kind: str, seconds: float):
+        """Track a moving average of how long generation and checking take"""
+        self._latency[kind] = 0.8 * self._latency[kind] + 0.2 * seconds
+
+    async def _check_answer(self, response: str, context_used, context_text: str):
+        """
+        Grounding check for an answer: the local scorer first, and the LLM critic
+        only when the local score is inconclusive.
+        """
+        started = time.perf_counter()
+        check = {"approved": False, "score": 0.0, "critique": None, "grounding": None}
+        try:
+            if context_used:
+                grounding = await self.grounding_scorer.score(response, context_text)
+                check["grounding"] = grounding.to_dict()
+                check["score"] = grounding.score
+                if grounding.score >= settings.GROUNDING_SKIP_THRESHOLD:
+                    check.update(approved=True, checked_by="local")
+                    return check
+
+            critic_result = await self.critic_agent.run({
+                "proposed_response": response,
+                "source_context": context_text
+            })
+            check["checked_by"] = "critic"
+            check["route"] = critic_result.meta.get("route")
+            check["critique"] = critic_result.payload.get("critique")
+            if critic_result.payload.get("approved"):
+                check.update(approved=True, score=1.0)
+            return check
+        finally:
+            self._observe("check", time.perf_counter() - started)
+
+    async def _attempt(self, query, context_used, context_text, state, history=None, previous_response=None, critique=None):
+        """
+        Generate one answer and check it. The check starts on the explanation as
+        soon as it has streamed in, overlapping with the follow-up question.
+        """
+        early_check = None
+
+        def on_explanation(explanation):
+            nonlocal early_check
+            early_check = asyncio.create_task(self._check_answer(explanation, context_used, context_text))
+
+        started = time.perf_counter()
+        try:
+            teach_result = await self.teaching_agent.run({
+                "query": query,
+                "context_used": context_used,
+                "context_text": context_text,
+                "history": history,
+                "previous_response": previous_response,
+                "critique": critique,
+                "on_explanation": on_explanation
+            })
+            if not teach_result.success:
+                return teach_result, None
+            self._observe("generate", time.perf_counter() - started)
+
+            response = teach_result.payload["response"]
+            # Keep the unchecked answer in case the deadline expires during the check
+            state["unchecked"] = response
+            check = await (early_check or self._check_answer(response, context_used, context_text))
+            return teach_result, check
+        finally:
+            if early_check and not early_check.done():
+                early_check.cancel()
+
+    async def _ask_tutor(self, query: str, deadline_s: float, course_id: str = None, doc_id: str = None,
+                         session_id: str = None):
+        """
+        Answer, check, and revise with the critique until the answer is approved,
+        the revision limit is hit, or the remaining budget can no longer fit
+        another generate-and-check round. On timeout the best answer so far wins.
+        """
+        started = time.monotonic()
+        deadline = started + deadline_s
+
+        history, last_query = None, None
+        if session_id:
+            history, last_query = await self.session_memory.history(session_id)
+
+        # 1. Retrieve once; revisions reuse the same context. Short replies to a
+        # follow-up question are searched together with the previous question.
+        search_text = f"{last_query}\n{query}" if last_query else query
+        context_used, context_text = await self.teaching_agent.retrieve(search_text, course_id, doc_id)
+
+        best = None
+        best_route = None  # model that wrote the best answer
+        state = {}
+        revisions = 0
+        deadline_exceeded = False
+        previous_response = critique = None
+
+        while True:
+            state.pop("unchecked", None)
+            try:
+                teach_result, check = await asyncio.wait_for(
+                    self._attempt(query, context_used, context_text, state, history, previous_response, critique),
+                    timeout=max(deadline - time.monotonic(), 0)
+                )
+            except asyncio.TimeoutError:
+                deadline_exceeded = True
+                if best is None and state.get("unchecked"):
+                    best = ({"response": state["unchecked"], "warning": "Response could not be verified in time."}, None)
+                break
+
+            if not teach_result.success:
+                if best is None:
+                    return teach_result
+                break
+
+            if best is None or check["score"] > best[1]["score"]:
+                best = (dict(teach_result.payload), check)
+                best_route = teach_result.meta.get("route")
+
+            # Revising cannot help when nothing was retrieved to ground the answer in
+            if check["approved"] or not context_used or revisions >= settings.ASK_MAX_REVISIONS:
+                break
+            # 2. Only revise if another round is expected to finish in time
+            if deadline - time.monotonic() < self._latency["generate"] + self._latency["check"]:
+                break
+
+            revisions += 1
+            previous_response = teach_result.payload["response"]
+            critique = check["critique"] or (
+                "These statements are not supported by the context: "
+                + "; ".join((check["grounding"] or {}).get("unsupported", []))
             )
+            logger.info(f"Revising answer (round {revisions}), {deadline - time.monotonic():.1f}s left")
+
+        if best is None:
+            return AgentResult(success=False, payload={"error": "No answer within the deadline"})
+
+        payload, check = best
+        payload.setdefault("context_used", context_used)
+        payload.setdefault("context_text", context_text)
+        if check is not None:
+            payload["grounding"] = check["grounding"]
+            payload["checked_by"] = check.get("checked_by")
+            if not check["approved"]:
+                payload["critique"] = check["critique"]
+                payload["warning"] = "Response may need improvement."
+        payload["revisions"] = revisions
+        payload["deadline_exceeded"] = deadline_exceeded
+        payload["elapsed_s"] = round(time.monotonic() - started, 3)
+        if session_id:
+            payload["session_id"] = session_id
+            await self.session_memory.record(session_id, query, payload["response"])
+        routes = {"tutoring": best_route, "critique": check.get("route") if check else None}
+        return AgentResult(success=True, payload=payload, meta={"routes": routes})
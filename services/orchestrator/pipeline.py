@@ -0,0 +1,98 @@
+from .agent_base import AgentResult
+from ..tools.concurrency import limits
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, Tuple
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class Stage:
+    """
+    One step of a pipeline. `run` receives the results of the stages it depends
+    on, keyed by stage name.
+    """
+    name: str
+    run: Callable[[Dict[str, AgentResult]], Awaitable[AgentResult]]
+    depends_on: Tuple[str, ...] = ()
+    # When a required stage fails its dependents are skipped; optional stages
+    # may fail without stopping the stages after them.
+    required: bool = True
+
+class StageGraph:
+    """
+    Runs a small DAG of stages, starting each one as soon as everything it
+    depends on has finished, so independent branches run concurrently.
+    """
+
+    def __init__(self, stages):
+        self.stages = {stage.name: stage for stage in stages}
+        for stage in stages:
+            missing = [d for d in stage.depends_on if d not in self.stages]
+            if missing:
+                raise ValueError(f"Stage '{stage.name}' depends on unknown stages: {missing}")
+        self._check_acyclic()
+
+    def _check_acyclic(self):
+        visiting, done = set(), set()
+
+        def visit(name):
+            if name in done:
+                return
+            if name in visiting:
+                raise ValueError(f"Cycle in stage graph at '{name}'")
+            visiting.add(name)
+            for dep in self.stages[name].depends_on:
+                visit(dep)
+            visiting.discard(name)
+            done.add(name)
+
+        for name in self.stages:
+            visit(name)
+
+    async def run(self):
+        """
+        Returns (results, timings): an AgentResult per stage and the wall-clock
+        seconds each stage took, plus the end-to-end 'total'.
+        """
+        results: Dict[str, AgentResult] = {}
+        timings: Dict[str, float] = {}
+        tasks: Dict[str, asyncio.Task] = {}
+        started = time.perf_counter()
+
+        async def execute(stage: Stage):
+            if stage.depends_on:
+                await asyncio.gather(*(tasks[d] for d in stage.depends_on))
+
+            failed = [d for d in stage.depends_on if self.stages[d].required and not results[d].success]
+            if failed:
+                results[stage.name] = AgentResult(
+                    success=False,
+                    payload={"error": f"Skipped: dependency {', '.join(failed)} failed"}
+                )
+                return
+
+            stage_started = time.perf_counter()
+            try:
+                # Stage limits are shared by every pipeline running in the process
+                async with limits.slot(f"stage:{stage.name}"):
+                    results[stage.name] = await stage.run(results)
+            except Exception as e:
+                logger.error(f"Stage '{stage.name}' failed: {e}", exc_info=True)
+                results[stage.name] = AgentResult(success=False, payload={"error": str(e)})
+            finally:
+                timings[stage.name] = round(time.perf_counter() - stage_started, 3)
+
+        for name, stage in self.stages.items():
+            tasks[name] = asyncio.create_task(execute(stage))
+
+        try:
+            await asyncio.gather(*tasks.values())
+        finally:
+            for task in tasks.values():
+                task.cancel()
+
+        timings["total"] = round(time.perf_counter() - started, 3)
+        return results, timings
@@ -0,0 +1,120 @@
+from .config import settings
+from collections import deque
+from contextlib import asynccontextmanager
+import asyncio
+import math
+import time
+
+class QueueFullError(Exception):
+    """Raised when a work class's queue is at its limit; retry after `retry_after` seconds"""
+
+    def __init__(self, work_class: str, retry_after: int):
+        super().__init__(f"The {work_class} queue is full, retry in {retry_after}s")
+        self.work_class = work_class
+        self.retry_after = retry_after
+
+class WorkPool:
+    def __init__(self, name: str, max_concurrency: int, max_queue: int, priority: int):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.priority = priority  # lower runs first
+        self.active = 0
+        self.waiting = deque()
+        self.rejected = 0
+        self.wait_avg_s = 0.0
+        self.wait_max_s = 0.0
+        self.service_avg_s = 1.0
+
+    def stats(self):
+        return {
+            "active": self.active,
+            "queued": len(self.waiting),
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "rejected": self.rejected,
+            "wait_avg_s": round(self.wait_avg_s, 3),
+            "wait_max_s": round(self.wait_max_s, 3),
+            "service_avg_s": round(self.service_avg_s, 3)
+        }
+
+class Scheduler:
+    """
+    Admission control for orchestrator work. Each work class has its own
+    concurrency pool and bounded queue. Classes are ordered by priority: a
+    lower-priority class (batch ingestion) does not start new work while a
+    higher-priority class (interactive tutoring) has requests waiting. When a
+    queue is full the request is rejected right away with a Retry-After
+    estimate instead of waiting until it times out.
+    """
+
+    def __init__(self, pools):
+        self.pools = {pool.name: pool for pool in pools}
+        self._by_priority = sorted(pools, key=lambda p: p.priority)
+
+    @classmethod
+    def from_settings(cls):
+        return cls([
+            WorkPool("interactive", settings.INTERACTIVE_CONCURRENCY, settings.INTERACTIVE_QUEUE, priority=0),
+            WorkPool("batch", settings.BATCH_CONCURRENCY, settings.BATCH_QUEUE, priority=1),
+        ])
+
+    def _blocked(self, pool: WorkPool) -> bool:
+        return any(p.waiting for p in self._by_priority if p.priority < pool.priority)
+
+    def _can_start(self, pool: WorkPool) -> bool:
+        return pool.active < pool.max_concurrency and not self._blocked(pool)
+
+    def _dispatch(self):
+        for pool in self._by_priority:
+            while pool.waiting and self._can_start(pool):
+                waiter = pool.waiting.popleft()
+                if not waiter.done():
+                    pool.active += 1
+                    waiter.set_result(None)
+
+    def retry_after(self, pool: WorkPool) -> int:
+        backlog = len(pool.waiting) + pool.active
+        return max(1, math.ceil(pool.service_avg_s * backlog / pool.max_concurrency))
+
+    @asynccontextmanager
+    async def admit(self, work_class: str):
+        """Hold a slot of `work_class` for the duration of the block; yields the queue wait in seconds"""
+        pool = self.pools[work_class]
+        queued_at = time.perf_counter()
+
+        if not pool.waiting and self._can_start(pool):
+            pool.active += 1
+        else:
+            if len(pool.waiting) >= pool.max_queue:
+                pool.rejected += 1
+                raise QueueFullError(work_class, self.retry_after(pool))
+            waiter = asyncio.get_running_loop().create_future()
+            pool.waiting.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if waiter.done() and not waiter.cancelled():
+                    # The slot was granted just as we were cancelled; hand it on
+                    pool.active -= 1
+                    self._dispatch()
+                elif waiter in pool.waiting:
+                    pool.waiting.remove(waiter)
+                    # A lower-priority class may have been held back by this waiter
+                    self._dispatch()
+                raise
+
+        waited = time.perf_counter() - queued_at
+        pool.wait_avg_s = 0.9 * pool.wait_avg_s + 0.1 * waited
+        pool.wait_max_s = max(pool.wait_max_s, waited)
+
+        started = time.perf_counter()
+        try:
+            yield waited
+        finally:
+            pool.service_avg_s = 0.9 * pool.service_avg_s + 0.1 * (time.perf_counter() - started)
+            pool.active -= 1
+            self._dispatch()
+
+    def stats(self):
+        return {name: pool.stats() for name, pool in self.pools.items()}
@@ -1,5 +1,6 @@
 from ..orchestrator.agent_base import BaseAgent, AgentResult
 from ..tools.llm_clients import LLMClient
+from ..tools.model_router import router
 from typing import Dict, Any
 
 class CriticAgent(BaseAgent):
@@ -31,12 +32,15 @@ class CriticAgent(BaseAgent):
         Return 'APPROVED' if good, or a critique explaining what to fix.
         """
         
-        critique = await self.llm.generate(
-            messages=[{"role": "user", "content": prompt}],
-            provider="mistral",
-            temperature=0.0
-        )
+        messages = [{"role": "user", "content": prompt}]
+        # Short critiques go to a small, fast model (see MODEL_ROUTES)
+        route = router.select("critique", messages)
+        critique = await self.llm.generate(messages, temperature=0.0, route=route)
         
         is_approved = "APPROVED" in critique
         
-        return AgentResult(success=True, payload={"approved": is_approved, "critique": critique})
+        return AgentResult(
+            success=True,
+            payload={"approved": is_approved, "critique": critique},
+            meta={"route": route.info()}
+        )
@@ -2,6 +2,7 @@ from pydantic import BaseModel
 from typing import Optional, Dict, List
 import json
 import os
+import threading
 from datetime import datetime
 
 class FeedbackRequest(BaseModel):
@@ -14,6 +15,8 @@ class FeedbackRequest(BaseModel):
 class FeedbackService:
     def __init__(self, storage_path: str = "data/feedback.json"):
         self.storage_path = storage_path
+        # Submissions run on worker threads; the read-modify-write must not interleave
+        self._lock = threading.Lock()
         self._ensure_storage()
 
     def _ensure_storage(self):
@@ -27,18 +30,21 @@ class FeedbackService:
         entry = feedback.dict()
         entry['timestamp'] = datetime.now().isoformat()
         
-        with open(self.storage_path, 'r') as f:
-            data = json.load(f)
-        
-        data.append(entry)
-        
-        with open(self.storage_path, 'w') as f:
-            json.dump(data, f, indent=2)
+        with self._lock:
+            with open(self.storage_path, 'r') as f:
+                data = json.load(f)
+            
+            data.append(entry)
+            
+            tmp_path = f"{self.storage_path}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(data, f, indent=2)
+            os.replace(tmp_path, self.storage_path)
             
         return {"status": "success", "message": "Feedback received"}
 
     def get_feedback_stats(self):
-        with open(self.storage_path, 'r') as f:
+        with self._lock, open(self.storage_path, 'r') as f:
             data = json.load(f)
         return {
             "total_feedback": len(data),
@@ -0,0 +1,159 @@
+from ..tools.llm_clients import LLMClient
+from ..orchestrator.config import settings
+from dataclasses import dataclass, field
+from typing import List, Optional
+import logging
+import math
+import re
+
+logger = logging.getLogger(__name__)
+
+_STOPWORDS = frozenset("""
+a an and are as at be been being but by can could did do does for from had has have how i if in into is it
+its just let like may might more much must of on or our over should so such than that the their them
+then there these they this those through to too under up us very was we were what when where which while who
+why will with would you your yes also about because other any both here
+""".split())
+
+# Words that flip or scope a claim. They are kept as content tokens, and a claim
+# whose negation or quantifiers differ from its best-matching context sentence
+# is unsupported however many other words it shares ("does not guarantee" vs
+# "always guarantees").
+_NEGATIONS = frozenset("not no never none nor cannot without".split())
+_QUANTIFIERS = frozenset("all every always only same some most each".split())
+
+# Sentences that carry no factual claim (encouragement, meta commentary) are skipped
+_MIN_CLAIM_TOKENS = 3
+
+
+def _normalize_token(word: str) -> str:
+    # Very light stemming so "networks"/"network" and "trained"/"training" overlap
+    for suffix in ("ing", "ed", "es", "s"):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 4:
+            return word[:-len(suffix)]
+    return word
+
+
+def _content_tokens(text: str) -> set:
+    words = re.findall(r"[a-z0-9]+", text.lower())
+    return {_normalize_token(w) for w in words if w not in _STOPWORDS and len(w) > 2}
+
+
+def _markers(text: str) -> frozenset:
+    """Negation (folded into "not") and quantifier words of a text"""
+    markers = set()
+    for word in re.findall(r"[a-z0-9']+", text.lower()):
+        if word in _NEGATIONS or word.endswith("n't"):
+            markers.add("not")
+        elif word in _QUANTIFIERS:
+            markers.add(word)
+    return frozenset(markers)
+
+
+def _sentences(text: str) -> List[str]:
+    return [s for s in re.split(r"(?<=[.!?])\s+|\n+", text) if s.strip()]
+
+
+def _cosine(a, b) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+def extract_claims(response: str) -> List[str]:
+    """
+    Split a tutor response into checkable claims.
+
+    Only the explanation is considered; the Socratic follow-up question and any
+    other questions make no factual assertions.
+    """
+    explanation = re.split(r"\*\*\s*Follow-up Question", response, flags=re.IGNORECASE)[0]
+    explanation = re.sub(r"\*\*\s*Explanation:?\s*\*\*", " ", explanation, flags=re.IGNORECASE)
+    explanation = re.sub(r"[*_`#>]", " ", explanation)
+
+    claims = []
+    for sentence in re.split(r"(?<=[.!?])\s+|\n+\s*(?:[-\d]+[.)]?\s+)?", explanation):
+        sentence = sentence.strip()
+        if not sentence or sentence.endswith("?"):
+            continue
+        if len(_content_tokens(sentence)) >= _MIN_CLAIM_TOKENS:
+            claims.append(sentence)
+    return claims
+
+
+@dataclass
+class GroundingReport:
+    score: float
+    claims: int
+    supported: int
+    used_embeddings: bool = False
+    unsupported: List[str] = field(default_factory=list)
+
+    def to_dict(self):
+        return {
+            "score": round(self.score, 3),
+            "claims": self.claims,
+            "supported": self.supported,
+            "used_embeddings": self.used_embeddings,
+            "unsupported": self.unsupported
+        }
+
+
+class GroundingScorer:
+    """
+    Cheap claim-level grounding check against the retrieved context.
+
+    Each claim is first matched lexically against its best context chunk. Only
+    claims that fail the lexical check are embedded (one batched request) and
+    compared with the context chunks, so most answers are scored without any
+    network call. Claims whose negation or quantifiers disagree with the
+    context are unsupported outright and left to the critic, since neither
+    word overlap nor embeddings notice a flipped "not".
+    """
+
+    def __init__(self, llm: Optional[LLMClient] = None):
+        self.llm = llm or LLMClient()
+        self.lexical_threshold = settings.GROUNDING_LEXICAL_THRESHOLD
+        self.embedding_threshold = settings.GROUNDING_EMBEDDING_THRESHOLD
+
+    async def score(self, response: str, context_text: str) -> GroundingReport:
+        claims = extract_claims(response or "")
+        chunks = [c.strip() for c in re.split(r"\n\s*\n", context_text or "") if c.strip()]
+        if not claims or not chunks:
+            # Nothing to verify locally: let the critic decide
+            return GroundingReport(score=0.0, claims=len(claims), supported=0, unsupported=claims)
+
+        chunk_tokens = [_content_tokens(c) for c in chunks]
+        sentences = [(_content_tokens(s), _markers(s)) for c in chunks for s in _sentences(c)]
+        contradicted, unresolved = [], []
+        for claim in claims:
+            tokens = _content_tokens(claim)
+            # The sentence sharing most words with the claim is the one it restates
+            _, markers = max(sentences, key=lambda sentence: len(tokens & sentence[0]))
+            if _markers(claim) != markers:
+                contradicted.append(claim)
+            elif max(len(tokens & c) for c in chunk_tokens) / len(tokens) < self.lexical_threshold:
+                unresolved.append(claim)
+
+        used_embeddings = False
+        if unresolved:
+            try:
+                vectors = await self.llm.embed_batch(unresolved + chunks)
+                claim_vecs, chunk_vecs = vectors[:len(unresolved)], vectors[len(unresolved):]
+                used_embeddings = True
+                unresolved = [
+                    claim for claim, vec in zip(unresolved, claim_vecs)
+                    if max(_cosine(vec, c) for c in chunk_vecs) < self.embedding_threshold
+                ]
+            except Exception as e:
+                logger.warning(f"Embedding grounding check failed, using lexical score only: {e}")
+
+        unsupported = [claim for claim in claims if claim in contradicted or claim in unresolved]
+        supported = len(claims) - len(unsupported)
+        return GroundingReport(
+            score=supported / len(claims),
+            claims=len(claims),
+            supported=supported,
+            used_embeddings=used_embeddings,
+            unsupported=unsupported
+        )
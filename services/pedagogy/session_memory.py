@@ -0,0 +1,196 @@
+from ..tools.llm_clients import LLMClient
+from ..tools.model_router import router
+from ..orchestrator.config import settings
+from collections import OrderedDict
+import asyncio
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+class InMemorySessionBackend:
+    """Bounded LRU of session states; the least recently used session is evicted first"""
+
+    def __init__(self, max_sessions: int):
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()
+
+    async def get(self, session_id):
+        state = self._sessions.get(session_id)
+        if state is not None:
+            self._sessions.move_to_end(session_id)
+        return state
+
+    async def put(self, session_id, state):
+        self._sessions[session_id] = state
+        self._sessions.move_to_end(session_id)
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+
+    async def update(self, session_id, change):
+        """
+        Apply `change(state or None)` and store what it returns; None leaves the
+        session untouched. Atomic, as nothing here awaits between read and write.
+        """
+        state = change(self._sessions.get(session_id))
+        if state is not None:
+            await self.put(session_id, state)
+        return state
+
+class RedisSessionBackend:
+    """Session states as JSON in Redis, expiring after SESSION_TTL_S of inactivity"""
+
+    def __init__(self, url: str, ttl_s: int):
+        import redis.asyncio as redis  # Optional dependency, only needed for this backend
+
+        from redis.exceptions import WatchError
+
+        self.client = redis.from_url(url)
+        self.ttl_s = ttl_s
+        self._watch_error = WatchError
+
+    @staticmethod
+    def _key(session_id):
+        return f"flowmind:session:{session_id}"
+
+    async def get(self, session_id):
+        raw = await self.client.get(self._key(session_id))
+        return json.loads(raw) if raw else None
+
+    async def put(self, session_id, state):
+        await self.client.set(self._key(session_id), json.dumps(state), ex=self.ttl_s)
+
+    async def update(self, session_id, change):
+        """
+        Apply `change(state or None)` and store what it returns; None leaves the
+        session untouched. Optimistic: WATCH the key and retry if another
+        worker wrote it in between.
+        """
+        key = self._key(session_id)
+        async with self.client.pipeline(transaction=True) as pipe:
+            while True:
+                try:
+                    await pipe.watch(key)
+                    raw = await pipe.get(key)
+                    state = change(json.loads(raw) if raw else None)
+                    if state is None:
+                        await pipe.unwatch()
+                        return None
+                    pipe.multi()
+                    pipe.set(key, json.dumps(state), ex=self.ttl_s)
+                    await pipe.execute()
+                    return state
+                except self._watch_error:
+                    continue
+
+class SessionMemory:
+    """
+    Per-session dialogue state: a rolling summary plus the last few turns.
+
+    Once a session has more than SESSION_MAX_TURNS turns, the oldest are folded
+    into the summary by a background LLM call, so neither the stored state nor
+    the prompt grows with the length of the session and the compaction never
+    sits on the request path.
+    """
+
+    def __init__(self, llm: LLMClient = None, backend=None):
+        self.llm = llm or LLMClient()
+        if backend is None:
+            if settings.SESSION_BACKEND == "redis":
+                backend = RedisSessionBackend(settings.REDIS_URL, settings.SESSION_TTL_S)
+            else:
+                backend = InMemorySessionBackend(settings.SESSION_MAX_SESSIONS)
+        self.backend = backend
+        self._compacting = set()
+        self._tasks = set()
+
+    @staticmethod
+    def _empty():
+        return {"summary": "", "turns": [], "next_id": 0}
+
+    async def history(self, session_id):
+        """Return (prompt-ready history text, last query) for the session"""
+        state = await self.backend.get(session_id)
+        if not state or not (state["summary"] or state["turns"]):
+            return "", None
+
+        parts = []
+        if state["summary"]:
+            parts.append(f"Summary of earlier conversation: {state['summary']}")
+        for turn in state["turns"]:
+            parts.append(f"Student: {turn['query']}\nTutor: {turn['response']}")
+        last_query = state["turns"][-1]["query"] if state["turns"] else None
+        return "\n\n".join(parts), last_query
+
+    async def record(self, session_id, query, response):
+        limit = settings.SESSION_TURN_CHARS
+
+        def append(state):
+            state = state or self._empty()
+            state["turns"].append({"id": state["next_id"], "query": query[:limit], "response": response[:limit]})
+            state["next_id"] += 1
+
+            # Hard bound in case compaction keeps failing or falls behind
+            overflow = len(state["turns"]) - 2 * settings.SESSION_MAX_TURNS
+            if overflow > 0:
+                state["summary"] = self._truncate(state["summary"], state["turns"][:overflow])
+                state["turns"] = state["turns"][overflow:]
+            return state
+
+        state = await self.backend.update(session_id, append)
+
+        if len(state["turns"]) > settings.SESSION_MAX_TURNS and session_id not in self._compacting:
+            self._compacting.add(session_id)
+            task = asyncio.create_task(self._compact(session_id))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    @staticmethod
+    def _truncate(summary, turns):
+        text = " ".join([summary] + [f"Student asked: {t['query']}" for t in turns]).strip()
+        return text[-settings.SESSION_SUMMARY_CHARS:]
+
+    async def _compact(self, session_id):
+        try:
+            state = await self.backend.get(session_id)
+            if not state:
+                return
+            old_turns = state["turns"][:-settings.SESSION_KEEP_TURNS]
+            if not old_turns:
+                return
+
+            transcript = "\n".join(f"Student: {t['query']}\nTutor: {t['response']}" for t in old_turns)
+            prompt = f"""
+            Update the summary of a tutoring session with the new exchanges below.
+            Keep what the student has understood, what they struggled with, and any open questions.
+            Reply with the summary only, in at most {settings.SESSION_SUMMARY_CHARS} characters.
+
+            Current summary:
+            {state['summary'] or '(none)'}
+
+            New exchanges:
+            {transcript}
+            """
+            try:
+                messages = [{"role": "user", "content": prompt}]
+                summary = await self.llm.generate(messages, temperature=0.2, route=router.select("summary", messages))
+                summary = summary.strip()[:settings.SESSION_SUMMARY_CHARS]
+            except Exception as e:
+                logger.warning(f"Session summary failed, truncating instead: {e}")
+                summary = self._truncate(state["summary"], old_turns)
+
+            # Turns may have been added meanwhile: drop only the ones summarised.
+            # A session that expired or was cleared meanwhile stays gone.
+            summarised = {t["id"] for t in old_turns}
+
+            def fold(latest):
+                if latest is None:
+                    return None
+                latest["turns"] = [t for t in latest["turns"] if t["id"] not in summarised]
+                latest["summary"] = summary
+                return latest
+
+            if await self.backend.update(session_id, fold) is None:
+                logger.info(f"Session {session_id} ended during compaction; summary dropped")
+        finally:
+            self._compacting.discard(session_id)
@@ -1,8 +1,13 @@
 from ..orchestrator.agent_base import BaseAgent, AgentResult
 from ..tools.llm_clients import LLMClient
+from ..tools.model_router import router
 from ..tools.vector_store import VectorStore
-from ..tools.graph_store import GraphStore
+from ..tools.graph_store import open_graph_store
+from ..orchestrator.config import settings
 from typing import Dict, Any
+import re
+
+_FOLLOW_UP_MARKER = re.compile(r"\*\*\s*Follow-up Question", re.IGNORECASE)
 
 class TeachingAgent(BaseAgent):
     name = "teaching_agent"
@@ -11,72 +16,149 @@ class TeachingAgent(BaseAgent):
         self.llm = LLMClient()
         self.vector_store = None
         self.graph_store = None
+        self.context_packs = None  # set by the orchestrator once the graph is loaded
 
-    async def run(self, context: Dict[str, Any]) -> AgentResult:
-        query = context.get("query")
-        if not query:
-            return AgentResult(success=False, payload={"error": "No query provided"})
-
+    async def retrieve(self, query: str, course_id: str = None, doc_id: str = None):
+        """
+        Return (concept names, context text) for the query, searching only the
+        course's namespace and, if given, a single document within it.
+        """
         if not self.vector_store: self.vector_store = VectorStore()
-        if not self.graph_store: self.graph_store = GraphStore()
+        if not self.graph_store: self.graph_store = open_graph_store()
 
         # 1. Generate embedding for the query
         print(f"Generating embedding for query: {query[:50]}...")
         query_embedding = await self.llm.embed(query)
-        
+
         # 2. Retrieve context from vector store
         print("Searching for relevant concepts...")
-        results = self.vector_store.query(query_embedding, top_k=3)
-        
+        results = await self.vector_store.aquery(
+            query_embedding,
+            top_k=3,
+            # doc_ids lists every document that defines the concept (see entity resolution)
+            filter={"doc_ids": {"$in": [doc_id]}} if doc_id else None,
+            namespace=course_id or settings.DEFAULT_COURSE_ID
+        )
+
         context_concepts = []
         context_text = ""
-        
+
         if hasattr(results, 'matches') and len(results.matches) > 0:
+            # Ready-made context packs for every hit in one lookup; fall back to
+            # the vector metadata for concepts without one
+            packs = await self.context_packs.lookup([match.id for match in results.matches]) if self.context_packs else {}
+            sections = []
             for match in results.matches:
                 metadata = match.metadata
-                context_text += f"Concept: {metadata['name']}\nDefinition: {metadata['definition']}\n\n"
+                sections.append(packs.get(match.id) or f"Concept: {metadata['name']}\nDefinition: {metadata['definition']}")
                 context_concepts.append(metadata['name'])
-            print(f"Found {len(results.matches)} relevant concepts: {', '.join(context_concepts)}")
+            context_text = "\n\n".join(sections) + "\n\n"
+            print(f"Found {len(results.matches)} relevant concepts ({len(packs)} context packs): {', '.join(context_concepts)}")
         else:
             context_text = "No relevant concepts found in the knowledge base."
             print("No relevant concepts found.")
 
-        # 3. Generate explanation using retrieved context
-        prompt = f"""
+        return context_concepts, context_text
+
+    def build_prompt(self, query: str, context_text: str, previous_response=None, critique=None, history=None):
+        conversation = ""
+        if history:
+            conversation = f"""
+        Conversation so far (the student may be answering your last follow-up question):
+        {history}
+        """
+
+        revision = ""
+        if previous_response and critique:
+            revision = f"""
+        Your previous answer was reviewed and needs revision.
+
+        Previous Answer:
+        {previous_response}
+
+        Reviewer Critique:
+        {critique}
+
+        Rewrite the answer so that it addresses the critique.
+        """
+
+        return f"""
         You are a Socratic tutor. Use the following context to answer the student's question.
-        
+
         Context from Knowledge Base:
         {context_text}
-        
+        {conversation}
         Student Question: {query}
-        
+        {revision}
         Instructions:
         1. Provide a clear, accurate explanation based ONLY on the context provided
         2. If the context doesn't contain enough information, say so
         3. Ask a follow-up question to check understanding
         4. Be encouraging and supportive
-        
+
         Format your response as:
         **Explanation:**
         [Your explanation here]
-        
+
         **Follow-up Question:**
         [Your question here]
         """
-        
-        print("Generating tutor response...")
-        response = await self.llm.generate(
-            messages=[{"role": "user", "content": prompt}],
-            provider="openrouter",
-            model="google/gemma-3-27b-it:free",
-            temperature=0.7
+
+    async def run(self, context: Dict[str, Any]) -> AgentResult:
+        """
+        Context keys:
+            query: the student's question (required)
+            course_id / doc_id: scope retrieval to a course namespace or a single document
+            context_used / context_text: reuse an earlier retrieval instead of querying again
+            previous_response / critique: revise an earlier answer
+            history: earlier turns of the tutoring session
+            on_explanation: callback invoked with the explanation as soon as it has been
+                generated, while the follow-up question is still streaming
+        """
+        query = context.get("query")
+        if not query:
+            return AgentResult(success=False, payload={"error": "No query provided"})
+
+        if "context_text" in context:
+            context_concepts = context.get("context_used", [])
+            context_text = context["context_text"]
+        else:
+            context_concepts, context_text = await self.retrieve(
+                query, context.get("course_id"), context.get("doc_id")
+            )
+
+        # 3. Generate explanation using retrieved context
+        prompt = self.build_prompt(
+            query,
+            context_text,
+            context.get("previous_response"),
+            context.get("critique"),
+            context.get("history")
         )
-        
+        messages = [{"role": "user", "content": prompt}]
+        route = router.select("tutoring", messages)
+        on_explanation = context.get("on_explanation")
+
+        print("Generating tutor response...")
+        if on_explanation is None:
+            response = await self.llm.generate(messages, temperature=0.7, route=route)
+        else:
+            response = ""
+            explanation_sent = False
+            async for delta in self.llm.generate_stream(messages, temperature=0.7, route=route):
+                response += delta
+                if not explanation_sent:
+                    marker = _FOLLOW_UP_MARKER.search(response)
+                    if marker:
+                        on_explanation(response[:marker.start()])
+                        explanation_sent = True
+
         return AgentResult(
-            success=True, 
+            success=True,
             payload={
-                "response": response, 
+                "response": response,
                 "context_used": context_concepts,
                 "context_text": context_text
-            }
+            },
+            meta={"route": route.info()}
         )
@@ -0,0 +1,791 @@
+from array import array
+from collections import deque
+from collections.abc import Mapping
+from pathlib import Path
+from ..orchestrator.config import settings
+from .executors import run_io
+from .graph_store import GraphStore
+from .ids import normalize_name
+import asyncio
+import json
+import mmap
+import numpy as np
+import os
+import sys
+
+# Edges added since the adjacency arrays were last built are looked up in a
+# dict; past this many, the arrays are rebuilt on the next write
+MAX_PENDING_EDGES = 4096
+# Overwritten nodes leave their old definitions in the string table; a save
+# rewrites the table once that garbage is this share of it (and at least
+# STRING_GARBAGE_MIN_BYTES)
+STRING_GARBAGE_RATIO = 0.5
+STRING_GARBAGE_MIN_BYTES = 1 << 20
+
+_NODE_KEYS = ('name', 'definition', 'embedding_id', 'source_doc', 'source_page', 'node_type', 'sources', 'aliases')
+
+class StringTable:
+    """
+    Append-only table of long strings (definitions), referenced by integer.
+    Saved strings are read from a memory-mapped file only when asked for;
+    strings added since the last save are held in memory until it completes.
+    Strings nothing refers to any more are dropped by rewriting the live ones
+    into a new table (see CompactGraphStore._compact_strings).
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.offsets = np.zeros(1, dtype=np.int64)  # string i is bytes offsets[i]:offsets[i + 1]
+        self._new = []
+        self._map = None
+
+    @property
+    def stored(self):
+        return len(self.offsets) - 1
+
+    def __len__(self):
+        return self.stored + len(self._new)
+
+    @property
+    def nbytes(self):
+        """Size of the saved strings"""
+        return int(self.offsets[-1])
+
+    def stored_bytes(self, refs):
+        """Total size of the saved strings among `refs`"""
+        refs = np.fromiter((ref for ref in refs if 0 <= ref < self.stored), dtype=np.int64)
+        return int((self.offsets[refs + 1] - self.offsets[refs]).sum())
+
+    def get_many(self, refs):
+        return {ref: self.get(ref) for ref in refs}
+
+    def open(self, offsets):
+        self.close()
+        self.offsets = offsets
+        self._new = []
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+    def add(self, text):
+        self._new.append(text or "")
+        return len(self) - 1
+
+    def get(self, ref):
+        if ref < 0:
+            return None
+        if ref >= self.stored:
+            return self._new[ref - self.stored]
+        if self._map is None:
+            with open(self.path, 'rb') as f:
+                # Map only the committed prefix; bytes past it may be a torn append
+                self._map = mmap.mmap(f.fileno(), int(self.offsets[-1]), access=mmap.ACCESS_READ)
+        return self._map[self.offsets[ref]:self.offsets[ref + 1]].decode('utf-8')
+
+    def pending(self):
+        """Strings added since the last save, to hand to append()"""
+        return list(self._new)
+
+    def append(self, texts):
+        """
+        Write strings after the committed prefix and return the new offsets
+        (runs on the I/O pool; nothing in memory changes until commit()).
+        """
+        encoded = [text.encode('utf-8') for text in texts]
+        lengths = np.fromiter((len(b) for b in encoded), dtype=np.int64, count=len(encoded))
+        offsets = np.concatenate([self.offsets, self.offsets[-1] + np.cumsum(lengths)])
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, 'r+b' if self.path.exists() else 'w+b') as f:
+            f.seek(int(self.offsets[-1]))
+            f.truncate()
+            f.write(b"".join(encoded))
+        return offsets
+
+    def commit(self, count, offsets):
+        """Adopt offsets written by append() for the first `count` pending strings"""
+        self.close()
+        self.offsets = offsets
+        self._new = self._new[count:]
+
+class _NodeView(Mapping):
+    """Read-only attributes of one node, decoded on access"""
+    __slots__ = ('_store', '_i')
+
+    def __init__(self, store, i):
+        self._store = store
+        self._i = i
+
+    def __getitem__(self, key):
+        return self._store._node_attr(self._i, key)
+
+    def __iter__(self):
+        return iter(self._store._node_keys(self._i))
+
+    def __len__(self):
+        return len(self._store._node_keys(self._i))
+
+class CompactGraphStore:
+    """
+    Memory-lean GraphStore backend (GRAPH_BACKEND="compact") with the same
+    methods and return values as the networkx one.
+
+    - Concept IDs are interned and numbered in insertion order.
+    - Edges are parallel typed arrays (source, target, relation type as a
+      small int, confidence as float32) in insertion order, indexed by CSR
+      adjacency arrays in both directions that are rebuilt lazily after writes.
+    - Definitions live in a StringTable, memory-mapped from disk and decoded
+      only when a caller asks for them.
+
+    Saved under GRAPH_COMPACT_DIR. If that is empty and a networkx graph exists
+    at GRAPH_STORAGE_PATH, it is imported on first load.
+    """
+
+    def __init__(self, directory: str = None):
+        self.directory = Path(directory or settings.GRAPH_COMPACT_DIR)
+        self.index_path = self.directory / "graph.npz"
+        self._strings_generation = 0  # bumped each time the string table is rewritten
+        self._strings = StringTable(self._strings_path(0))
+        self._stale_strings = []  # replaced table files, deleted once the index no longer uses them
+        self._save_lock = None
+        self.version = 0
+        self._listeners = []
+        self._reset()
+
+        if self.index_path.exists():
+            self.load()
+        elif os.path.exists(settings.GRAPH_STORAGE_PATH):
+            self._import_json(settings.GRAPH_STORAGE_PATH)
+            self.save()
+
+    def _reset(self):
+        # Nodes, by number
+        self._ids = []
+        self._index = {}  # concept ID -> number
+        self._ids_by_name = {}  # normalized name -> concept IDs with that name
+        self._names = []
+        self._source_docs = []
+        self._definitions = array('q')  # string table refs
+        self._source_pages = array('i')  # -1 for none
+        self._node_types = array('B')
+        self._sources = []  # per node: [(doc ID, page, name, definition ref)]
+        # Sparse attributes
+        self._aliases = {}
+        self._image_ids = {}
+        self._extra = {}  # attributes the store has no column for, from older files
+        # Edges, by number
+        self._src = array('i')
+        self._dst = array('i')
+        self._rel = array('B')
+        self._conf = array('f')
+        self._pending = {}  # (source, target) -> edge number, for edges not in the CSR yet
+        self._csr = None
+        self._csr_edges = 0
+        # Small vocabularies, stored as ints on nodes and edges
+        self._relation_types = []
+        self._node_type_names = []
+        self._strings.open(np.zeros(1, dtype=np.int64))
+
+    # -- change notification -----------------------------------------------
+
+    def subscribe(self, listener):
+        """Call `listener(event, *node_ids)` after each change ("load", "concept", "merge", "relation")"""
+        self._listeners.append(listener)
+
+    def _changed(self, event, *node_ids):
+        self.version += 1
+        for listener in self._listeners:
+            listener(event, *node_ids)
+
+    # -- encoding ------------------------------------------------------------
+
+    @staticmethod
+    def _code(vocabulary, value):
+        try:
+            return vocabulary.index(value)
+        except ValueError:
+            if len(vocabulary) >= 255:
+                raise ValueError(f"Too many distinct values: {value}")
+            vocabulary.append(value)
+            return len(vocabulary) - 1
+
+    @staticmethod
+    def _intern(value):
+        return sys.intern(value) if isinstance(value, str) else value
+
+    def _node_keys(self, i):
+        keys = list(_NODE_KEYS)
+        if i in self._image_ids:
+            keys.append('image_id')
+        return keys + list(self._extra.get(i, ()))
+
+    def _node_attr(self, i, key):
+        if key == 'name':
+            return self._names[i]
+        if key == 'definition':
+            return self._strings.get(self._definitions[i])
+        if key == 'embedding_id':
+            return self._ids[i]
+        if key == 'source_doc':
+            return self._source_docs[i]
+        if key == 'source_page':
+            page = self._source_pages[i]
+            return page if page >= 0 else None
+        if key == 'node_type':
+            return self._node_type_names[self._node_types[i]]
+        if key == 'sources':
+            return [
+                {'doc_id': doc_id, 'page': page, 'name': name, 'definition': self._strings.get(ref)}
+                for doc_id, page, name, ref in self._sources[i]
+            ]
+        if key == 'aliases':
+            return list(self._aliases.get(i, ()))
+        if key == 'image_id' and i in self._image_ids:
+            return self._image_ids[i]
+        return self._extra.get(i, {})[key]
+
+    def _node_record(self, node_id):
+        return {'id': node_id, **_NodeView(self, self._index[node_id])}
+
+    def _edge_attrs(self, e):
+        return {
+            'relation_type': self._relation_types[self._rel[e]],
+            'confidence': round(float(self._conf[e]), 6)
+        }
+
+    # -- adjacency -------------------------------------------------------------
+
+    def _adjacency(self):
+        """
+        CSR arrays (row pointers, neighbour numbers, edge numbers) for both
+        directions, rebuilt if edges were added since the last build
+        """
+        if self._csr is None or self._csr_edges != len(self._src):
+            n = len(self._ids)
+            src = np.array(self._src, dtype=np.int32)
+            dst = np.array(self._dst, dtype=np.int32)
+
+            def build(rows, cols):
+                # A stable sort keeps each row's edges in insertion order
+                order = np.argsort(rows, kind='stable').astype(np.int32)
+                pointers = np.zeros(n + 1, dtype=np.int64)
+                np.cumsum(np.bincount(rows, minlength=n), out=pointers[1:])
+                return pointers, cols[order], order
+
+            self._csr = {"out": build(src, dst), "in": build(dst, src)}
+            self._csr_edges = len(self._src)
+            self._pending = {}
+        return self._csr
+
+    def _row(self, direction, i):
+        """(neighbour number, edge number) pairs of one node, in insertion order"""
+        pointers, neighbours, edges = self._adjacency()[direction]
+        if i + 1 >= len(pointers):
+            # Added after the last build; any edge of it would have forced a rebuild
+            return iter(())
+        start, end = pointers[i], pointers[i + 1]
+        return zip(neighbours[start:end].tolist(), edges[start:end].tolist())
+
+    def _find_edge(self, s, t):
+        """Number of the edge s -> t, or None; doesn't rebuild the CSR for recent edges"""
+        e = self._pending.get((s, t))
+        if e is not None:
+            return e
+        if self._csr is None:
+            self._adjacency()
+        pointers, neighbours, edges = self._csr["out"]
+        if s + 1 >= len(pointers):
+            return None  # node added after the last build
+        start, end = pointers[s], pointers[s + 1]
+        hits = np.flatnonzero(neighbours[start:end] == t)
+        return int(edges[start + hits[0]]) if len(hits) else None
+
+    # -- iteration ---------------------------------------------------------------
+
+    def nodes(self):
+        """Iterate (concept ID, attributes); attributes are decoded on access"""
+        return ((node_id, _NodeView(self, i)) for i, node_id in enumerate(self._ids))
+
+    def edges(self):
+        """Iterate (source ID, target ID, attributes)"""
+        return (
+            (self._ids[self._src[e]], self._ids[self._dst[e]], self._edge_attrs(e))
+            for e in range(len(self._src))
+        )
+
+    def neighbors(self, node_id):
+        """Edges touching a node as (direction "out"/"in", other node ID, edge attributes)"""
+        i = self._index.get(node_id)
+        if i is None:
+            return
+        for direction in ("out", "in"):
+            for other, e in self._row(direction, i):
+                yield direction, self._ids[other], self._edge_attrs(e)
+
+    # -- persistence -------------------------------------------------------------
+
+    def close(self):
+        """Save graph before closing"""
+        self.save()
+        self._strings.close()
+
+    def snapshot(self):
+        """The whole graph in the JSON layout of the networkx backend"""
+        return {
+            'version': self.version,
+            'nodes': [{'id': node_id, **attrs} for node_id, attrs in self.nodes()],
+            'edges': [{'source': s, 'target': t, **attrs} for s, t, attrs in self.edges()]
+        }
+
+    def _strings_path(self, generation):
+        return self.directory / ("strings.bin" if generation == 0 else f"strings.{generation}.bin")
+
+    def _live_refs(self):
+        refs = set(self._definitions)
+        for sources in self._sources:
+            refs.update(source[3] for source in sources)
+        refs.discard(-1)
+        return refs
+
+    def _string_garbage(self):
+        """Saved refs still in use, if the table has enough garbage to rewrite; otherwise None"""
+        total = self._strings.nbytes
+        if total < STRING_GARBAGE_MIN_BYTES:
+            return None
+        live = [ref for ref in self._live_refs() if ref < self._strings.stored]
+        if total - self._strings.stored_bytes(live) <= STRING_GARBAGE_RATIO * total:
+            return None
+        return live
+
+    def _compact_strings(self, texts):
+        """
+        Move the strings still referenced into a new table, held in memory
+        until the next save writes it to a new file. `texts` maps saved refs to
+        their text; anything else live is read here.
+        """
+        table = StringTable(self._strings_path(self._strings_generation + 1))
+        mapping = {}
+        for ref in sorted(self._live_refs()):
+            text = texts.get(ref)
+            mapping[ref] = table.add(text if text is not None else self._strings.get(ref))
+        self._definitions = array('q', (mapping.get(ref, -1) for ref in self._definitions))
+        self._sources = [
+            [(doc_id, page, name, mapping[ref]) for doc_id, page, name, ref in sources]
+            for sources in self._sources
+        ]
+        self._strings.close()
+        self._stale_strings.append(self._strings.path)
+        self._strings = table
+        self._strings_generation += 1
+
+    def _remove_stale_strings(self):
+        for path in self._stale_strings:
+            path.unlink(missing_ok=True)
+        self._stale_strings = []
+
+    def _state(self):
+        """Everything _write() needs, copied so the graph can keep changing meanwhile"""
+        meta = {
+            'ids': self._ids,
+            'names': self._names,
+            'source_docs': self._source_docs,
+            'sources': self._sources,
+            'aliases': {str(i): aliases for i, aliases in self._aliases.items()},
+            'image_ids': {str(i): image_id for i, image_id in self._image_ids.items()},
+            'extra': {str(i): extra for i, extra in self._extra.items()},
+            'relation_types': self._relation_types,
+            'node_types': self._node_type_names,
+            'version': self.version,
+            'strings_generation': self._strings_generation
+        }
+        return {
+            'meta': json.dumps(meta, default=str),
+            'table': self._strings,
+            'strings': self._strings.pending(),
+            'definitions': np.array(self._definitions, dtype=np.int64),
+            'source_pages': np.array(self._source_pages, dtype=np.int32),
+            'node_types': np.array(self._node_types, dtype=np.uint8),
+            'src': np.array(self._src, dtype=np.int32),
+            'dst': np.array(self._dst, dtype=np.int32),
+            'rel': np.array(self._rel, dtype=np.uint8),
+            'conf': np.array(self._conf, dtype=np.float32)
+        }
+
+    def _write(self, state):
+        # Strings first: the index below is what makes them part of the graph
+        offsets = state['table'].append(state['strings'])
+        arrays = {k: v for k, v in state.items() if k not in ('meta', 'table', 'strings')}
+        tmp_path = self.index_path.with_suffix(".tmp.npz")
+        np.savez(
+            tmp_path,
+            meta=np.frombuffer(state['meta'].encode('utf-8'), dtype=np.uint8),
+            string_offsets=offsets,
+            **arrays
+        )
+        os.replace(tmp_path, self.index_path)
+        return offsets
+
+    def save(self):
+        live = self._string_garbage()
+        if live is not None:
+            self._compact_strings(self._strings.get_many(live))
+        state = self._state()
+        state['table'].commit(len(state['strings']), self._write(state))
+        self._remove_stale_strings()
+
+    async def asave(self):
+        """Copy the state on the event loop and write it on the I/O pool; saves are serialised"""
+        if self._save_lock is None:
+            self._save_lock = asyncio.Lock()
+        async with self._save_lock:
+            live = self._string_garbage()
+            if live is not None:
+                # Read the live strings off the loop; nodes may change meanwhile
+                self._compact_strings(await run_io(self._strings.get_many, live))
+            state = self._state()
+            offsets = await run_io(self._write, state)
+            state['table'].commit(len(state['strings']), offsets)
+            if self._stale_strings:
+                await run_io(self._remove_stale_strings)
+
+    def load(self):
+        """Load the graph from GRAPH_COMPACT_DIR"""
+        try:
+            self._reset()
+            with np.load(self.index_path) as data:
+                meta = json.loads(data['meta'].tobytes().decode('utf-8'))
+                self._strings_generation = meta.get('strings_generation', 0)
+                self._strings.close()
+                self._strings = StringTable(self._strings_path(self._strings_generation))
+                self._strings.open(data['string_offsets'])
+                self._definitions = array('q', data['definitions'].tolist())
+                self._source_pages = array('i', data['source_pages'].tolist())
+                self._node_types = array('B', data['node_types'].tolist())
+                self._src = array('i', data['src'].tolist())
+                self._dst = array('i', data['dst'].tolist())
+                self._rel = array('B', data['rel'].tolist())
+                self._conf = array('f', data['conf'].tolist())
+
+            self._ids = [sys.intern(node_id) for node_id in meta['ids']]
+            self._index = {node_id: i for i, node_id in enumerate(self._ids)}
+            self._names = meta['names']
+            self._source_docs = [self._intern(doc_id) for doc_id in meta['source_docs']]
+            self._sources = [
+                [(self._intern(doc_id), page, name, ref) for doc_id, page, name, ref in sources]
+                for sources in meta['sources']
+            ]
+            self._aliases = {int(i): aliases for i, aliases in meta['aliases'].items()}
+            self._image_ids = {int(i): image_id for i, image_id in meta['image_ids'].items()}
+            self._extra = {int(i): extra for i, extra in meta['extra'].items()}
+            self._relation_types = meta['relation_types']
+            self._node_type_names = meta['node_types']
+            self.version = max(self.version, meta.get('version', 0))
+            # Tables left behind by a rewrite that didn't finish
+            for path in self.directory.glob("strings*.bin"):
+                if path != self._strings.path:
+                    path.unlink(missing_ok=True)
+            for i, node_id in enumerate(self._ids):
+                for name in [self._names[i], *self._aliases.get(i, [])]:
+                    self._index_name(node_id, name)
+        except Exception as e:
+            print(f"Error loading graph: {e}")
+        self._changed("load")
+
+    def _import_json(self, path):
+        """Take over a graph saved by the networkx backend"""
+        try:
+            with open(path, 'r') as f:
+                data = json.load(f)
+            for node_data in data.get('nodes', []):
+                node_id = node_data.pop('id', None) or node_data['name']
+                self._put_node(node_id, node_data)
+            for edge_data in data.get('edges', []):
+                self._put_edge(
+                    self._index[edge_data['source']],
+                    self._index[edge_data['target']],
+                    edge_data.get('relation_type', 'RelatedTo'),
+                    edge_data.get('confidence')
+                )
+            self.version = max(self.version, data.get('version', 0))
+        except Exception as e:
+            print(f"Error importing graph: {e}")
+        self._changed("load")
+
+    # -- writes ----------------------------------------------------------------
+
+    def _put_node(self, node_id, attrs):
+        """Insert or overwrite a node from a networkx-style attribute dict"""
+        attrs = dict(attrs)
+        i = self._index.get(node_id)
+        if i is None:
+            i = len(self._ids)
+            node_id = sys.intern(node_id)
+            self._ids.append(node_id)
+            self._index[node_id] = i
+            self._names.append(None)
+            self._source_docs.append(None)
+            self._definitions.append(-1)
+            self._source_pages.append(-1)
+            self._node_types.append(0)
+            self._sources.append([])
+
+        self._names[i] = attrs.pop('name')
+        self._definitions[i] = self._strings.add(attrs.pop('definition', None))
+        attrs.pop('embedding_id', None)
+        self._source_docs[i] = self._intern(attrs.pop('source_doc', None))
+        page = attrs.pop('source_page', None)
+        self._source_pages[i] = page if isinstance(page, int) and page >= 0 else -1
+        self._node_types[i] = self._code(self._node_type_names, attrs.pop('node_type', 'concept'))
+        self._sources[i] = [
+            (self._intern(s.get('doc_id')), s.get('page'), s.get('name'), self._strings.add(s.get('definition')))
+            for s in attrs.pop('sources', [])
+        ]
+        aliases = attrs.pop('aliases', [])
+        if aliases:
+            self._aliases[i] = list(aliases)
+        else:
+            self._aliases.pop(i, None)
+        if attrs.get('image_id'):
+            self._image_ids[i] = attrs.pop('image_id')
+        attrs.pop('image_id', None)
+        if attrs:
+            self._extra[i] = attrs
+        for name in [self._names[i], *aliases]:
+            self._index_name(node_id, name)
+        return i
+
+    def _put_edge(self, s, t, relation_type, confidence):
+        try:
+            confidence = float(confidence or 0)
+        except (TypeError, ValueError):
+            confidence = 0.0
+        rel = self._code(self._relation_types, relation_type)
+        e = self._find_edge(s, t)
+        if e is None:
+            e = len(self._src)
+            self._src.append(s)
+            self._dst.append(t)
+            self._rel.append(rel)
+            self._conf.append(confidence)
+            self._pending[(s, t)] = e
+            if len(self._pending) > MAX_PENDING_EDGES:
+                self._adjacency()
+        else:
+            self._rel[e] = rel
+            self._conf[e] = confidence
+
+    def query(self, query_type, parameters=None):
+        """
+        Execute a query on the graph.
+        For compatibility with the original interface, supports basic operations.
+        """
+        if query_type == "RETURN 1 as num":
+            return [{"num": 1}]
+        return []
+
+    def _index_name(self, node_id, name):
+        ids = self._ids_by_name.setdefault(normalize_name(name), [])
+        if node_id not in ids:
+            ids.append(node_id)
+
+    def resolve(self, concept):
+        """Map a concept ID or name to a node ID (the first match for ambiguous names)"""
+        if concept in self._index:
+            return concept
+        ids = self._ids_by_name.get(normalize_name(concept))
+        return ids[0] if ids else None
+
+    def add_concept(self, concept_name, definition, embedding_id, source_info, save=True):
+        """
+        Add a concept node to the graph, keyed by its concept ID. Callers adding
+        many nodes pass save=False and call asave() once at the end.
+        """
+        attrs = {
+            'name': concept_name,
+            'definition': definition,
+            'source_doc': source_info.get('doc_id'),
+            'source_page': source_info.get('page'),
+            'node_type': source_info.get('node_type', 'concept'),
+            'sources': [{
+                'doc_id': source_info.get('doc_id'),
+                'page': source_info.get('page'),
+                'name': concept_name,
+                'definition': definition
+            }],
+            'aliases': []
+        }
+        i = self._index.get(embedding_id)
+        if source_info.get('image_id'):
+            # Visual concepts keep the content hash of their image in the image store
+            attrs['image_id'] = source_info['image_id']
+        elif i is not None and i in self._image_ids:
+            attrs['image_id'] = self._image_ids[i]
+        self._put_node(embedding_id, attrs)
+        self._changed("concept", embedding_id)
+        if save:
+            self.save()
+        return [{"id": embedding_id, "name": concept_name}]
+
+    def merge_concept(self, concept_id, concept_name, definition, source_info, save=True):
+        """
+        Record another document's mention of an existing concept. The canonical
+        definition is kept; the new name and definition are kept as provenance.
+        """
+        i = self._index[concept_id]
+        doc_id = self._intern(source_info.get('doc_id'))
+        # Re-ingesting a document replaces its earlier mention instead of duplicating it
+        self._sources[i] = [s for s in self._sources[i] if (s[0], s[2]) != (doc_id, concept_name)]
+        self._sources[i].append((doc_id, source_info.get('page'), concept_name, self._strings.add(definition)))
+        if not self._strings.get(self._definitions[i]):
+            self._definitions[i] = self._strings.add(definition)
+        aliases = self._aliases.setdefault(i, [])
+        if concept_name != self._names[i] and concept_name not in aliases:
+            aliases.append(concept_name)
+            self._index_name(concept_id, concept_name)
+        if not aliases:
+            del self._aliases[i]
+        self._changed("merge", concept_id)
+        if save:
+            self.save()
+        return [{"id": concept_id, "name": self._names[i]}]
+
+    def add_relation(self, source, target, relation_type, confidence, save=True):
+        """Add a relationship edge between concepts (given by ID or name)"""
+        source, target = self.resolve(source), self.resolve(target)
+        if source is not None and target is not None:
+            self._put_edge(self._index[source], self._index[target], relation_type, confidence)
+            self._changed("relation", source, target)
+            if save:
+                self.save()
+            return [{"source": source, "target": target, "type": relation_type}]
+        return []
+
+    # -- reads -------------------------------------------------------------------
+
+    def get_concept(self, concept_name):
+        """Get a concept node and its properties"""
+        node_id = self.resolve(concept_name)
+        return self._node_record(node_id) if node_id is not None else None
+
+    def get_related_concepts(self, concept_name, max_depth=2):
+        """Get concepts related to the given concept within max_depth hops"""
+        start = self.resolve(concept_name)
+        if start is None:
+            return []
+
+        related = []
+        visited = set()
+        queue = deque([(self._index[start], 0)])
+        while queue:
+            current, depth = queue.popleft()
+            if current in visited or depth > max_depth:
+                continue
+            visited.add(current)
+            if current != self._index[start]:
+                related.append({'id': self._ids[current], 'depth': depth, **_NodeView(self, current)})
+            if depth < max_depth:
+                for neighbor, _ in self._row("out", current):
+                    if neighbor not in visited:
+                        queue.append((neighbor, depth + 1))
+        return related
+
+    _encode_cursor = staticmethod(GraphStore._encode_cursor)
+    _decode_cursor = staticmethod(GraphStore._decode_cursor)
+
+    def list_nodes(self, cursor=None, limit=100):
+        """
+        One page of nodes in insertion order. Returns (nodes, next cursor), the
+        cursor being None on the last page. Raises ValueError for a malformed cursor.
+        """
+        start = self._decode_cursor("nodes", cursor)
+        page = self._ids[start:start + limit]
+        end = start + len(page)
+        next_cursor = self._encode_cursor("nodes", end) if end < len(self._ids) else None
+        return [self._node_record(node) for node in page], next_cursor
+
+    def list_edges(self, cursor=None, limit=100):
+        """Same as list_nodes(), for edges"""
+        start = self._decode_cursor("edges", cursor)
+        end = min(start + limit, len(self._src))
+        edges = [
+            {'source': self._ids[self._src[e]], 'target': self._ids[self._dst[e]], **self._edge_attrs(e)}
+            for e in range(start, end)
+        ]
+        next_cursor = self._encode_cursor("edges", end) if end < len(self._src) else None
+        return edges, next_cursor
+
+    def subgraph(self, concept, radius=1, limit=200):
+        """
+        The neighbourhood of a concept: nodes within `radius` hops in either
+        direction (at most `limit`, nearest first) and the edges between them.
+        Returns None for an unknown concept.
+        """
+        center = self.resolve(concept)
+        if center is None:
+            return None
+
+        depth = {self._index[center]: 0}
+        frontier = [self._index[center]]
+        truncated = False
+        while frontier and not truncated:
+            next_frontier = []
+            for node in frontier:
+                if depth[node] >= radius:
+                    continue
+                for neighbor, _ in [*self._row("out", node), *self._row("in", node)]:
+                    if neighbor in depth:
+                        continue
+                    if len(depth) >= limit:
+                        truncated = True
+                        break
+                    depth[neighbor] = depth[node] + 1
+                    next_frontier.append(neighbor)
+                if truncated:
+                    break
+            frontier = next_frontier
+
+        nodes = [{'id': self._ids[node], **_NodeView(self, node), 'depth': d} for node, d in depth.items()]
+        edges = [
+            {'source': self._ids[source], 'target': self._ids[target], **self._edge_attrs(e)}
+            for source in depth
+            for target, e in self._row("out", source)
+            if target in depth
+        ]
+        return {"center": center, "nodes": nodes, "edges": edges, "truncated": truncated}
+
+    def iter_ndjson(self, batch_size=500):
+        """
+        Export the graph as NDJSON, one node or edge per line, yielding chunks
+        of `batch_size` lines. Nodes come first, then edges; items added during
+        the export are included.
+        """
+        yield json.dumps({
+            "type": "meta",
+            "version": self.version,
+            "num_concepts": len(self._ids),
+            "num_relations": len(self._src)
+        }) + "\n"
+
+        for kind, count, record in (
+            ("node", lambda: len(self._ids), lambda i: {'id': self._ids[i], **_NodeView(self, i)}),
+            ("edge", lambda: len(self._src), lambda e: {
+                'source': self._ids[self._src[e]], 'target': self._ids[self._dst[e]], **self._edge_attrs(e)
+            }),
+        ):
+            position = 0
+            while position < count():
+                end = min(position + batch_size, count())
+                yield "".join(
+                    json.dumps({"type": kind, **record(i)}, default=str) + "\n" for i in range(position, end)
+                )
+                position = end
+
+    def get_graph_stats(self):
+        """Get statistics about the graph"""
+        n, m = len(self._ids), len(self._src)
+        return {
+            'num_concepts': n,
+            'num_relations': m,
+            'density': m / (n * (n - 1)) if n > 1 else 0
+        }
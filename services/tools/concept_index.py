@@ -0,0 +1,117 @@
+from ..orchestrator.config import settings
+from .executors import run_io
+from .ids import normalize_name
+from pathlib import Path
+import asyncio
+import numpy as np
+
+class ConceptIndex:
+    """
+    Local copy of the concept embeddings of one course, used for entity
+    resolution without round-trips to Pinecone.
+
+    Embeddings are L2-normalised and kept as float16 (100k x 1024 is ~200 MB);
+    similarity search upcasts one chunk of rows at a time so peak memory stays
+    bounded regardless of how many concepts the course has.
+    """
+
+    def __init__(self, course_id: str):
+        self.course_id = course_id
+        self.path = Path(settings.CONCEPT_INDEX_DIR) / f"{course_id}.npz"
+        self.ids = []
+        self.by_name = {}  # normalized name -> concept ID, for exact-name blocking
+        self._buffer = None  # grown geometrically so appends don't copy the whole matrix
+        self._save_lock = None
+        if self.path.exists():
+            self.load()
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def vectors(self):
+        return self._buffer[:len(self.ids)] if self._buffer is not None else None
+
+    @staticmethod
+    def normalize(embeddings) -> np.ndarray:
+        matrix = np.asarray(embeddings, dtype=np.float32)
+        if matrix.ndim == 1:
+            matrix = matrix[None, :]
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+    def best_matches(self, embeddings):
+        """
+        For each embedding, the most similar indexed concept.
+
+        Returns (ids, scores): ids[i] is None when the index is empty.
+        """
+        queries = self.normalize(embeddings)
+        n = len(queries)
+        if not self.ids:
+            return [None] * n, np.zeros(n, dtype=np.float32)
+
+        best_scores = np.full(n, -1.0, dtype=np.float32)
+        best_rows = np.zeros(n, dtype=np.int64)
+        chunk = settings.ENTITY_RESOLUTION_CHUNK
+        for start in range(0, len(self.ids), chunk):
+            block = self.vectors[start:start + chunk].astype(np.float32)
+            scores = queries @ block.T
+            rows = scores.argmax(axis=1)
+            top = scores[np.arange(n), rows]
+            better = top > best_scores
+            best_scores[better] = top[better]
+            best_rows[better] = rows[better] + start
+
+        return [self.ids[r] for r in best_rows], best_scores
+
+    def add(self, ids, names, embeddings):
+        if not ids:
+            return
+        rows = self.normalize(embeddings).astype(np.float16)
+        size, needed = len(self.ids), len(self.ids) + len(rows)
+        if self._buffer is None or needed > len(self._buffer):
+            buffer = np.zeros((max(needed, 2 * size, 1024), rows.shape[1]), dtype=np.float16)
+            if size:
+                buffer[:size] = self._buffer[:size]
+            self._buffer = buffer
+        self._buffer[size:needed] = rows
+        self.ids.extend(ids)
+        for concept_id, name in zip(ids, names):
+            if name is not None:  # None: not blocked by name
+                self.by_name.setdefault(normalize_name(name), concept_id)
+
+    def add_alias(self, name, concept_id):
+        self.by_name.setdefault(normalize_name(name), concept_id)
+
+    def snapshot(self):
+        # Rows below len(ids) are never rewritten, so the vectors view is stable
+        return {
+            "ids": np.array(self.ids),
+            "vectors": self.vectors,
+            "names": np.array(list(self.by_name.keys())),
+            "name_ids": np.array(list(self.by_name.values()))
+        }
+
+    def _write(self, data):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp.npz")
+        np.savez(tmp_path, **data)
+        tmp_path.replace(self.path)
+
+    def save(self):
+        self._write(self.snapshot())
+
+    async def asave(self):
+        """Snapshot on the event loop, write on the I/O pool; saves are serialised"""
+        if self._save_lock is None:
+            self._save_lock = asyncio.Lock()
+        async with self._save_lock:
+            await run_io(self._write, self.snapshot())
+
+    def load(self):
+        with np.load(self.path) as data:
+            self.ids = [str(i) for i in data["ids"]]
+            self.by_name = {str(n): str(i) for n, i in zip(data["names"], data["name_ids"])}
+            self._buffer = data["vectors"]
@@ -0,0 +1,38 @@
+from ..orchestrator.config import settings
+from contextlib import asynccontextmanager
+import asyncio
+
+class ConcurrencyLimits:
+    """
+    Process-wide named concurrency limits, e.g. "provider:mistral" or
+    "stage:vision". Names without a configured limit are unrestricted.
+    """
+
+    def __init__(self):
+        self._limits = {}
+        self._semaphores = {}
+
+    def configure(self, name: str, limit: int):
+        self._limits[name] = limit
+        self._semaphores[name] = asyncio.Semaphore(limit)
+
+    @asynccontextmanager
+    async def slot(self, name: str):
+        semaphore = self._semaphores.get(name)
+        if semaphore is None:
+            yield
+            return
+        async with semaphore:
+            yield
+
+    def stats(self):
+        return {
+            name: {"limit": limit, "available": self._semaphores[name]._value}
+            for name, limit in self._limits.items()
+        }
+
+limits = ConcurrencyLimits()
+for _provider, _limit in settings.PROVIDER_CONCURRENCY.items():
+    limits.configure(f"provider:{_provider}", _limit)
+for _stage, _limit in settings.STAGE_CONCURRENCY.items():
+    limits.configure(f"stage:{_stage}", _limit)
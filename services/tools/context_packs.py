@@ -0,0 +1,201 @@
+from ..orchestrator.config import settings
+from .executors import run_io
+from pathlib import Path
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Rough characters per token, to turn CONTEXT_PACK_TOKENS into a text budget
+CHARS_PER_TOKEN = 4
+
+class ContextPackStore:
+    """
+    SQLite key-value store of tutor context packs, one row per concept ID.
+    Each pack records the graph version it was built from.
+    """
+
+    def __init__(self, path: str = None):
+        self.path = Path(path or settings.CONTEXT_PACK_PATH)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Shared by the I/O threads; sqlite3 connections need serialised access
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS packs ("
+                "concept_id TEXT PRIMARY KEY, graph_version INTEGER, text TEXT, data TEXT, built_at REAL)"
+            )
+
+    def get_many(self, concept_ids):
+        """{concept ID: {"text", "data", "graph_version"}} for the IDs that have a pack, in one query"""
+        concept_ids = list(dict.fromkeys(concept_ids))
+        if not concept_ids:
+            return {}
+        placeholders = ",".join("?" * len(concept_ids))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT concept_id, graph_version, text, data FROM packs WHERE concept_id IN ({placeholders})",
+                concept_ids
+            ).fetchall()
+        return {
+            concept_id: {"text": text, "data": json.loads(data), "graph_version": version}
+            for concept_id, version, text, data in rows
+        }
+
+    def put_many(self, packs, graph_version):
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO packs (concept_id, graph_version, text, data, built_at) VALUES (?, ?, ?, ?, ?)",
+                [(pack["concept_id"], graph_version, pack["text"], json.dumps(pack["data"]), now) for pack in packs]
+            )
+
+    def ids(self):
+        with self._lock:
+            return {row[0] for row in self._conn.execute("SELECT concept_id FROM packs")}
+
+    def count(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM packs").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+class ContextPacks:
+    """
+    Ready-made tutor context per concept, built at ingestion time: the
+    definition, the strongest relations, descriptions of linked figures and
+    the source pages, trimmed to CONTEXT_PACK_TOKENS.
+
+    The graph store reports which concepts changed (a concept added or merged,
+    or a relation added at either end), and `rebuild()` refreshes just those
+    packs. At query time `lookup()` turns retrieval hits into context with a
+    single batched read.
+    """
+
+    def __init__(self, graph_store, store: ContextPackStore = None, image_store=None):
+        self.graph_store = graph_store
+        self.store = store or ContextPackStore()
+        self.image_store = image_store  # figures described in a pack count as used
+        self._dirty = set()
+        graph_store.subscribe(self._on_change)
+
+    def _on_change(self, event, *node_ids):
+        if event == "load":
+            self._dirty.update(node for node, _ in self.graph_store.nodes())
+        else:
+            self._dirty.update(node_ids)
+
+    async def backfill(self):
+        """Queue concepts that have no pack yet (e.g. ingested before packs existed)"""
+        existing = await run_io(self.store.ids)
+        self._dirty.update(node for node, _ in self.graph_store.nodes() if node not in existing)
+
+    def build(self, concept_id):
+        """Assemble the pack of one concept from the graph; None if it isn't in the graph"""
+        node = self.graph_store.get_concept(concept_id)
+        if node is None:
+            return None
+
+        relations, visuals = [], []
+        for direction, other_id, attrs in self.graph_store.neighbors(concept_id):
+            other = self.graph_store.get_concept(other_id) or {}
+            other_name = other.get('name', other_id)
+            if other.get('node_type') == 'visual' and other.get('definition'):
+                visuals.append({"page": other.get('source_page'), "description": other['definition']})
+                if self.image_store and other.get('image_id'):
+                    self.image_store.touch(other['image_id'])
+                continue
+            relation_type = attrs.get('relation_type', 'RelatedTo')
+            source, target = (node['name'], other_name) if direction == "out" else (other_name, node['name'])
+            relations.append({
+                "text": f"{source} -{relation_type}-> {target}",
+                "confidence": float(attrs.get('confidence') or 0)
+            })
+        relations.sort(key=lambda r: -r["confidence"])
+        relations = [r["text"] for r in relations[:settings.CONTEXT_PACK_MAX_RELATIONS]]
+        visuals = visuals[:settings.CONTEXT_PACK_MAX_VISUALS]
+
+        pages = []
+        for source in node.get('sources') or []:
+            if source.get('page') is not None and (source.get('doc_id'), source['page']) not in pages:
+                pages.append((source.get('doc_id'), source['page']))
+
+        data = {
+            "name": node.get('name'),
+            "aliases": node.get('aliases') or [],
+            "definition": node.get('definition') or "",
+            "relations": relations,
+            "visuals": visuals,
+            "pages": pages
+        }
+        return {"concept_id": concept_id, "text": self.render(data), "data": data}
+
+    @staticmethod
+    def render(data, budget_chars=None):
+        """Pack text, most important parts first, cut to the character budget"""
+        budget = budget_chars or settings.CONTEXT_PACK_TOKENS * CHARS_PER_TOKEN
+
+        title = f"Concept: {data['name']}"
+        if data["aliases"]:
+            title += f" (also: {', '.join(data['aliases'][:3])})"
+        lines = [title, f"Definition: {data['definition']}"]
+        used = sum(len(line) + 1 for line in lines)
+        if used > budget:
+            # The definition alone is over budget; keep its beginning
+            lines[1] = lines[1][:max(0, budget - len(title) - 4)] + "..."
+            return "\n".join(lines)
+
+        optional = [f"Relation: {relation}" for relation in data["relations"]]
+        for visual in data["visuals"]:
+            page = f" (page {visual['page']})" if visual.get("page") is not None else ""
+            optional.append(f"Figure{page}: {visual['description'][:300]}")
+        if data["pages"]:
+            optional.append("Sources: " + ", ".join(f"{doc} p.{page}" for doc, page in data["pages"][:5]))
+
+        for line in optional:
+            if used + len(line) + 1 > budget:
+                continue
+            lines.append(line)
+            used += len(line) + 1
+        return "\n".join(lines)
+
+    async def rebuild(self):
+        """Rebuild the packs of concepts that changed since the last rebuild; returns how many"""
+        dirty, self._dirty = self._dirty, set()
+        if not dirty:
+            return 0
+        # Read the graph on the event loop (where it is mutated), write from a thread
+        version = self.graph_store.version
+        packs = [pack for pack in (self.build(concept_id) for concept_id in dirty) if pack]
+        try:
+            await run_io(self.store.put_many, packs, version)
+        except Exception:
+            self._dirty.update(dirty)
+            raise
+        logger.info(f"Rebuilt {len(packs)} context packs at graph version {version}")
+        return len(packs)
+
+    async def lookup(self, concept_ids):
+        """
+        {concept ID: pack text} in one batched read. Concepts whose pack is
+        missing or about to be rebuilt are assembled from the graph instead.
+        """
+        packs = await run_io(self.store.get_many, concept_ids)
+        texts = {}
+        for concept_id in concept_ids:
+            pack = packs.get(concept_id)
+            if pack is None or concept_id in self._dirty:
+                pack = self.build(concept_id)
+            if pack is not None:
+                texts[concept_id] = pack["text"]
+        return texts
+
+    def stats(self):
+        return {"pending": len(self._dirty)}
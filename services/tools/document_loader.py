@@ -0,0 +1,26 @@
+from .pdf_parser import PDFParser, PyMuPDFParser
+from .image_extractor import ImageExtractor
+from pathlib import Path
+from typing import Optional
+
+def load_document(pdf_path: str, backend: str = "pymupdf", detect_tables: bool = True,
+                  image_dir: Optional[str] = None):
+    """
+    Parse a PDF's text and, if `image_dir` is given, extract its images, opening
+    the document once for both. Runs in a worker process, so it is a
+    module-level function with picklable arguments and result.
+
+    Returns {"blocks", "pages", "images"}.
+    """
+    import fitz  # PyMuPDF, deferred until the first document is loaded
+
+    with fitz.open(pdf_path) as doc:
+        if backend == "pymupdf":
+            blocks = PyMuPDFParser(detect_tables).parse_document(doc)
+        elif backend == "pdfminer":
+            blocks = PDFParser().parse(pdf_path)
+        else:
+            raise ValueError(f"Unknown PDF parser backend: {backend}")
+
+        images = ImageExtractor(image_dir).extract_from_document(doc, Path(pdf_path).stem) if image_dir else []
+        return {"blocks": blocks, "pages": len(doc), "images": images}
@@ -0,0 +1,71 @@
+"""
+Bounded executors for blocking work called from async code.
+
+- io: threads for blocking I/O (Pinecone SDK calls, file writes).
+- cpu: worker processes for CPU-heavy work (PDF parsing, image extraction),
+  so it neither holds the GIL nor stalls the event loop serving /ask.
+
+Functions sent to the cpu pool must be module-level and take picklable
+arguments. With CPU_WORKERS = 0 CPU work runs on the io threads instead.
+"""
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from ..orchestrator.config import settings
+import asyncio
+import logging
+import multiprocessing
+
+logger = logging.getLogger(__name__)
+
+_io_executor = None
+_cpu_executor = None
+
+def io_executor() -> ThreadPoolExecutor:
+    global _io_executor
+    if _io_executor is None:
+        _io_executor = ThreadPoolExecutor(max_workers=settings.IO_WORKERS, thread_name_prefix="flowmind-io")
+    return _io_executor
+
+def cpu_executor():
+    global _cpu_executor
+    if settings.CPU_WORKERS <= 0:
+        return io_executor()
+    if _cpu_executor is None:
+        # spawn: forking a process that runs an event loop and threads is unsafe
+        _cpu_executor = ProcessPoolExecutor(
+            max_workers=settings.CPU_WORKERS,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _cpu_executor
+
+async def run_io(fn, *args, **kwargs):
+    """Run a blocking I/O call on the bounded thread pool"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(io_executor(), partial(fn, *args, **kwargs))
+
+async def run_cpu(fn, *args, **kwargs):
+    """Run a CPU-bound, picklable call in a worker process"""
+    global _cpu_executor
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(cpu_executor(), partial(fn, *args, **kwargs))
+    except BrokenProcessPool:
+        # A worker died (e.g. killed for memory); start a fresh pool for later calls
+        logger.error("CPU worker pool broke; it will be restarted on the next call")
+        _cpu_executor = None
+        raise
+
+def shutdown():
+    global _io_executor, _cpu_executor
+    for executor in (_cpu_executor, _io_executor):
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+    _io_executor = _cpu_executor = None
+
+def stats():
+    return {
+        "io_workers": settings.IO_WORKERS,
+        "cpu_workers": settings.CPU_WORKERS,
+        "cpu_pool": "process" if settings.CPU_WORKERS > 0 else "thread"
+    }
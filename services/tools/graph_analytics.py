@@ -0,0 +1,282 @@
+from ..orchestrator.config import settings
+from .executors import run_io
+from collections import OrderedDict
+import asyncio
+import heapq
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Relation types that constrain teaching order, mapped to whether the edge
+# points the other way: "A Prerequisite B" and "A PartOf B" teach A first,
+# "A Extends B" and "A IsA B" teach B first.
+ORDERING_RELATIONS = {"Prerequisite": False, "PartOf": False, "Extends": True, "IsA": True}
+
+def pagerank(n, sources, targets, weights, start=None, damping=0.85, tol=1e-6, max_iter=100):
+    """
+    Weighted PageRank by power iteration over edge arrays. `start` warm-starts
+    the iteration (e.g. with the previous scores), so a graph that changed a
+    little converges in a few rounds. Returns (scores, iterations).
+    """
+    if n == 0:
+        return np.zeros(0), 0
+    rank = np.full(n, 1.0 / n) if start is None else start / start.sum()
+    out_weight = np.bincount(sources, weights=weights, minlength=n)
+    dangling = out_weight == 0
+    scale = np.divide(1.0, out_weight, out=np.zeros(n), where=~dangling)
+
+    iterations = 0
+    for iterations in range(1, max_iter + 1):
+        spread = np.bincount(targets, weights=(rank * scale)[sources] * weights, minlength=n)
+        new_rank = damping * (spread + rank[dangling].sum() / n) + (1 - damping) / n
+        delta = np.abs(new_rank - rank).sum()
+        rank = new_rank
+        if delta < tol:
+            break
+    return rank, iterations
+
+def strongly_connected_components(n, successors):
+    """Tarjan's algorithm, iterative; returns a component index per node"""
+    index = [-1] * n
+    low = [0] * n
+    on_stack = [False] * n
+    component = [-1] * n
+    stack = []
+    counter = components = 0
+
+    for root in range(n):
+        if index[root] != -1:
+            continue
+        work = [(root, 0)]
+        while work:
+            node, child = work.pop()
+            if child == 0:
+                index[node] = low[node] = counter
+                counter += 1
+                stack.append(node)
+                on_stack[node] = True
+            recurse = False
+            for k in range(child, len(successors[node])):
+                nxt = successors[node][k]
+                if index[nxt] == -1:
+                    work.append((node, k + 1))
+                    work.append((nxt, 0))
+                    recurse = True
+                    break
+                if on_stack[nxt]:
+                    low[node] = min(low[node], index[nxt])
+            if recurse:
+                continue
+            if low[node] == index[node]:
+                while True:
+                    member = stack.pop()
+                    on_stack[member] = False
+                    component[member] = components
+                    if member == node:
+                        break
+                components += 1
+            if work:
+                parent = work[-1][0]
+                low[parent] = min(low[parent], low[node])
+    return component
+
+class GraphAnalytics:
+    """
+    Precomputed centrality and teaching order over a GraphStore.
+
+    - PageRank per concept, warm-started from the previous scores.
+    - A global prerequisite order: cycles (concepts that are each other's
+      prerequisites) are collapsed into strongly connected components, the
+      components are ordered topologically, and ties go to the more central
+      concept.
+    - Learning paths (every prerequisite of a concept, in teaching order),
+      cached per concept. A new ordering edge only evicts the paths of its
+      target and the target's dependents.
+
+    The store notifies us of each change; `refresh()` recomputes off the event
+    loop once per batch of changes, so serving a cached path costs O(path length).
+    """
+
+    def __init__(self, graph_store):
+        self.graph_store = graph_store
+        self.version = -1
+        self.ids = []
+        self.position = {}  # concept ID -> row in the arrays below
+        self.scores = np.zeros(0)
+        self.order = {}  # concept ID -> rank in the global teaching order
+        self.component = []
+        self.cyclic = set()  # component indexes with more than one concept
+        self._predecessors = []
+        self._paths = OrderedDict()
+        self._touched = set()  # endpoints of relations added since the last refresh
+        self._lock = None
+        self.last_refresh = {}
+        graph_store.subscribe(self._on_change)
+
+    def _on_change(self, event, *node_ids):
+        if event == "load":
+            self._paths.clear()
+        elif event == "relation":
+            self._touched.update(node_ids)
+
+    def _snapshot(self):
+        ids = [node for node, _ in self.graph_store.nodes()]
+        edges = [
+            (source, target, attrs.get('relation_type'), float(attrs.get('confidence') or 1.0))
+            for source, target, attrs in self.graph_store.edges()
+        ]
+        return ids, edges
+
+    def _compute(self, ids, edges, previous):
+        position = {node: i for i, node in enumerate(ids)}
+        n = len(ids)
+
+        sources = np.fromiter((position[s] for s, _, _, _ in edges), dtype=np.int64, count=len(edges))
+        targets = np.fromiter((position[t] for _, t, _, _ in edges), dtype=np.int64, count=len(edges))
+        weights = np.fromiter((w for _, _, _, w in edges), dtype=np.float64, count=len(edges))
+        start = None
+        if previous:
+            # Warm start: carry over known scores, seed new concepts uniformly
+            start = np.array([previous.get(node, 1.0 / n) for node in ids])
+        scores, iterations = pagerank(n, sources, targets, weights, start, damping=settings.PAGERANK_DAMPING)
+
+        successors = [[] for _ in range(n)]
+        predecessors = [[] for _ in range(n)]
+        for source, target, relation_type, _ in edges:
+            if relation_type not in ORDERING_RELATIONS:
+                continue
+            before, after = position[source], position[target]
+            if ORDERING_RELATIONS[relation_type]:
+                before, after = after, before
+            if before != after:
+                successors[before].append(after)
+                predecessors[after].append(before)
+
+        component = strongly_connected_components(n, successors)
+        count = max(component) + 1 if n else 0
+        members = [[] for _ in range(count)]
+        for node, c in enumerate(component):
+            members[c].append(node)
+
+        # Kahn's algorithm over the condensation, most central component first
+        indegree = [0] * count
+        component_successors = [set() for _ in range(count)]
+        for node in range(n):
+            for nxt in successors[node]:
+                a, b = component[node], component[nxt]
+                if a != b and b not in component_successors[a]:
+                    component_successors[a].add(b)
+                    indegree[b] += 1
+        weight = [-max(scores[m] for m in group) for group in members]
+        ready = [(weight[c], c) for c in range(count) if indegree[c] == 0]
+        heapq.heapify(ready)
+        order = []
+        while ready:
+            _, c = heapq.heappop(ready)
+            order.extend(sorted(members[c], key=lambda m: -scores[m]))
+            for nxt in component_successors[c]:
+                indegree[nxt] -= 1
+                if indegree[nxt] == 0:
+                    heapq.heappush(ready, (weight[nxt], nxt))
+
+        return {
+            "ids": ids,
+            "position": position,
+            "scores": scores,
+            "iterations": iterations,
+            "order": {ids[node]: rank for rank, node in enumerate(order)},
+            "component": component,
+            "cyclic": {c for c, group in enumerate(members) if len(group) > 1},
+            "predecessors": predecessors,
+            "successors": successors,
+        }
+
+    async def refresh(self):
+        """Recompute if the graph changed since the last refresh"""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            version = self.graph_store.version
+            if version == self.version:
+                return
+            touched, self._touched = self._touched, set()
+            # Snapshot on the loop (the graph is only mutated there), compute in a thread
+            ids, edges = self._snapshot()
+            previous = {node: self.scores[i] for i, node in enumerate(self.ids)}
+            result = await run_io(self._compute, ids, edges, previous)
+
+            # Evict cached paths of the touched targets and everything that depends on them
+            stale = [result["position"][node] for node in touched if node in result["position"]]
+            seen = set(stale)
+            while stale:
+                node = stale.pop()
+                self._paths.pop(ids[node], None)
+                for nxt in result["successors"][node]:
+                    if nxt not in seen:
+                        seen.add(nxt)
+                        stale.append(nxt)
+
+            self.ids = result["ids"]
+            self.position = result["position"]
+            self.scores = result["scores"]
+            self.order = result["order"]
+            self.component = result["component"]
+            self.cyclic = result["cyclic"]
+            self._predecessors = result["predecessors"]
+            self.version = version
+            self.last_refresh = {
+                "version": version,
+                "concepts": len(ids),
+                "relations": len(edges),
+                "pagerank_iterations": result["iterations"],
+                "evicted_paths": len(seen)
+            }
+            logger.info(f"Graph analytics refreshed: {self.last_refresh}")
+
+    def _entry(self, node):
+        concept_id = self.ids[node]
+        attrs = self.graph_store.get_concept(concept_id) or {}
+        return {
+            "id": concept_id,
+            "name": attrs.get('name', concept_id),
+            "pagerank": round(float(self.scores[node]), 6),
+            "order": self.order.get(concept_id),
+            "in_cycle": self.component[node] in self.cyclic
+        }
+
+    def learning_path(self, concept_id):
+        """
+        Every prerequisite of the concept followed by the concept itself, in
+        teaching order. Call refresh() first. The member list is cached until an
+        ordering edge changes the concept's prerequisites; scores are current.
+        """
+        path = self._paths.get(concept_id)
+        if path is None:
+            node = self.position.get(concept_id)
+            if node is None:
+                return None
+            ancestors = {node}
+            stack = [node]
+            while stack:
+                for prev in self._predecessors[stack.pop()]:
+                    if prev not in ancestors:
+                        ancestors.add(prev)
+                        stack.append(prev)
+            # The global order is a valid order for any subset of it
+            path = [self.ids[i] for i in sorted(ancestors, key=lambda i: self.order[self.ids[i]])]
+            self._paths[concept_id] = path
+            while len(self._paths) > settings.LEARNING_PATH_CACHE_SIZE:
+                self._paths.popitem(last=False)
+        else:
+            self._paths.move_to_end(concept_id)
+        return [self._entry(self.position[member]) for member in path]
+
+    def top_concepts(self, k=10):
+        if not self.ids:
+            return []
+        best = np.argsort(-self.scores)[:k]
+        return [self._entry(int(i)) for i in best]
+
+    def stats(self):
+        return {**self.last_refresh, "cached_paths": len(self._paths), "stale": self.version != self.graph_store.version}
@@ -1,13 +1,35 @@
-import networkx as nx
+import asyncio
+import base64
 import json
 import os
 from pathlib import Path
 from ..orchestrator.config import settings
+from .executors import run_io
+from .ids import normalize_name
+
+def open_graph_store():
+    """Open the graph store selected by GRAPH_BACKEND ("networkx" by default, or "compact")"""
+    if settings.GRAPH_BACKEND == "compact":
+        from .compact_graph import CompactGraphStore
+        return CompactGraphStore()
+    return GraphStore()
 
 class GraphStore:
     def __init__(self):
-        self.graph = nx.DiGraph()  # Directed graph for concept relationships
+        import networkx as nx  # Deferred: networkx is slow to import and only needed once the store is built
+
+        self.graph = nx.DiGraph()  # Directed graph for concept relationships, keyed by concept ID
+        self._ids_by_name = {}  # normalized name -> concept IDs with that name
+        # Insertion order of nodes and edges; the graph only grows, so positions
+        # are stable and make cheap pagination cursors
+        self._node_order = []
+        self._edge_order = []
         self.storage_path = settings.GRAPH_STORAGE_PATH
+        self._save_lock = None  # created on first asave(), inside the running loop
+        # Bumped on every structural change and saved with the graph, so it keeps
+        # increasing across restarts; listeners get (event, *node IDs)
+        self.version = 0
+        self._listeners = []
         
         # Ensure directory exists
         Path(self.storage_path).parent.mkdir(parents=True, exist_ok=True)
@@ -16,32 +38,81 @@ class GraphStore:
         if os.path.exists(self.storage_path):
             self.load()
 
+    def subscribe(self, listener):
+        """Call `listener(event, *node_ids)` after each change ("load", "concept", "merge", "relation")"""
+        self._listeners.append(listener)
+
+    def _changed(self, event, *node_ids):
+        self.version += 1
+        for listener in self._listeners:
+            listener(event, *node_ids)
+
+    def nodes(self):
+        """Iterate (concept ID, attributes)"""
+        return iter(self.graph.nodes(data=True))
+
+    def edges(self):
+        """Iterate (source ID, target ID, attributes)"""
+        return iter(self.graph.edges(data=True))
+
+    def neighbors(self, node_id):
+        """Edges touching a node as (direction "out"/"in", other node ID, edge attributes)"""
+        for _, target, attrs in self.graph.out_edges(node_id, data=True):
+            yield "out", target, attrs
+        for source, _, attrs in self.graph.in_edges(node_id, data=True):
+            yield "in", source, attrs
+
     def close(self):
         """Save graph before closing"""
         self.save()
 
-    def save(self):
-        """Save graph to JSON file"""
-        data = {
+    def snapshot(self):
+        """
+        A copy of the graph that is safe to serialise while the graph keeps
+        changing (list attributes such as aliases are mutated in place)
+        """
+        def copy(attrs):
+            return {k: list(v) if isinstance(v, list) else v for k, v in attrs.items()}
+
+        return {
+            'version': self.version,
             'nodes': [
                 {
-                    'name': node,
-                    **self.graph.nodes[node]
+                    'id': node,
+                    **copy(attrs)
                 }
-                for node in self.graph.nodes()
+                for node, attrs in self.graph.nodes(data=True)
             ],
             'edges': [
                 {
-                    'source': edge[0],
-                    'target': edge[1],
-                    **self.graph.edges[edge]
+                    'source': source,
+                    'target': target,
+                    **copy(attrs)
                 }
-                for edge in self.graph.edges()
+                for source, target, attrs in self.graph.edges(data=True)
             ]
         }
-        
-        with open(self.storage_path, 'w') as f:
+
+    def _write(self, data):
+        # Write to a temporary file and rename, so a crash never leaves a torn file
+        tmp_path = f"{self.storage_path}.tmp"
+        with open(tmp_path, 'w') as f:
             json.dump(data, f, indent=2)
+        os.replace(tmp_path, self.storage_path)
+
+    def save(self):
+        """Save graph to JSON file"""
+        self._write(self.snapshot())
+
+    async def asave(self):
+        """
+        Snapshot the graph on the event loop and write it on the I/O pool.
+        Saves are serialised so an older snapshot never overwrites a newer one.
+        """
+        if self._save_lock is None:
+            self._save_lock = asyncio.Lock()
+        async with self._save_lock:
+            await run_io(self._write, self.snapshot())
 
     def load(self):
         """Load graph from JSON file"""
@@ -51,20 +122,32 @@ class GraphStore:
             
             # Clear existing graph
             self.graph.clear()
+            self._ids_by_name = {}
+            self._node_order = []
+            self._edge_order = []
             
-            # Add nodes
+            # Add nodes (graphs saved before concept IDs existed are keyed by name)
             for node_data in data.get('nodes', []):
-                name = node_data.pop('name')
-                self.graph.add_node(name, **node_data)
+                node_id = node_data.pop('id', None) or node_data['name']
+                if node_id not in self.graph:
+                    self._node_order.append(node_id)
+                self.graph.add_node(node_id, **node_data)
+                for name in [node_data['name'], *node_data.get('aliases', [])]:
+                    self._index_name(node_id, name)
             
             # Add edges
             for edge_data in data.get('edges', []):
                 source = edge_data.pop('source')
                 target = edge_data.pop('target')
+                if not self.graph.has_edge(source, target):
+                    self._edge_order.append((source, target))
                 self.graph.add_edge(source, target, **edge_data)
-                
+
+            # Graphs saved before the version was persisted start from 0
+            self.version = max(self.version, data.get('version', 0))
         except Exception as e:
             print(f"Error loading graph: {e}")
+        self._changed("load")
 
     def query(self, query_type, parameters=None):
         """
@@ -80,50 +163,115 @@ class GraphStore:
         # Add more query types as needed
         return []
 
-    def add_concept(self, concept_name, definition, embedding_id, source_info):
-        """Add a concept node to the graph"""
+    def _index_name(self, node_id, name):
+        ids = self._ids_by_name.setdefault(normalize_name(name), [])
+        if node_id not in ids:
+            ids.append(node_id)
+
+    def resolve(self, concept):
+        """Map a concept ID or name to a node ID (the first match for ambiguous names)"""
+        if concept in self.graph.nodes():
+            return concept
+        ids = self._ids_by_name.get(normalize_name(concept))
+        return ids[0] if ids else None
+
+    def add_concept(self, concept_name, definition, embedding_id, source_info, save=True):
+        """
+        Add a concept node to the graph, keyed by its concept ID. Callers adding
+        many nodes pass save=False and call asave() once at the end.
+        """
+        if embedding_id not in self.graph:
+            self._node_order.append(embedding_id)
         self.graph.add_node(
-            concept_name,
+            embedding_id,
+            name=concept_name,
             definition=definition,
             embedding_id=embedding_id,
             source_doc=source_info.get('doc_id'),
             source_page=source_info.get('page'),
-            node_type='concept'
+            node_type=source_info.get('node_type', 'concept'),
+            sources=[{
+                'doc_id': source_info.get('doc_id'),
+                'page': source_info.get('page'),
+                'name': concept_name,
+                'definition': definition
+            }],
+            aliases=[]
         )
-        self.save()
-        return [{"name": concept_name}]
+        if source_info.get('image_id'):
+            # Visual concepts keep the content hash of their image in the image store
+            self.graph.nodes[embedding_id]['image_id'] = source_info['image_id']
+        self._index_name(embedding_id, concept_name)
+        self._changed("concept", embedding_id)
+        if save:
+            self.save()
+        return [{"id": embedding_id, "name": concept_name}]
 
-    def add_relation(self, source, target, relation_type, confidence):
-        """Add a relationship edge between concepts"""
-        if source in self.graph.nodes() and target in self.graph.nodes():
+    def merge_concept(self, concept_id, concept_name, definition, source_info, save=True):
+        """
+        Record another document's mention of an existing concept. The canonical
+        definition is kept; the new name and definition are kept as provenance.
+        """
+        node = self.graph.nodes[concept_id]
+        # Re-ingesting a document replaces its earlier mention instead of duplicating it
+        node['sources'] = [
+            source for source in node.get('sources', [])
+            if (source.get('doc_id'), source.get('name')) != (source_info.get('doc_id'), concept_name)
+        ]
+        node['sources'].append({
+            'doc_id': source_info.get('doc_id'),
+            'page': source_info.get('page'),
+            'name': concept_name,
+            'definition': definition
+        })
+        if not node.get('definition'):
+            node['definition'] = definition
+        if concept_name != node.get('name') and concept_name not in node.setdefault('aliases', []):
+            node['aliases'].append(concept_name)
+            self._index_name(concept_id, concept_name)
+        self._changed("merge", concept_id)
+        if save:
+            self.save()
+        return [{"id": concept_id, "name": node.get('name')}]
+
+    def add_relation(self, source, target, relation_type, confidence, save=True):
+        """Add a relationship edge between concepts (given by ID or name)"""
+        source, target = self.resolve(source), self.resolve(target)
+        if source is not None and target is not None:
+            if not self.graph.has_edge(source, target):
+                self._edge_order.append((source, target))
             self.graph.add_edge(
                 source,
                 target,
                 relation_type=relation_type,
                 confidence=confidence
             )
-            self.save()
+            self._changed("relation", source, target)
+            if save:
+                self.save()
             return [{"source": source, "target": target, "type": relation_type}]
         return []
 
     def get_concept(self, concept_name):
         """Get a concept node and its properties"""
-        if concept_name in self.graph.nodes():
+        node_id = self.resolve(concept_name)
+        if node_id is not None:
             return {
-                'name': concept_name,
-                **self.graph.nodes[concept_name]
+                'id': node_id,
+                **self.graph.nodes[node_id]
             }
         return None
 
     def get_related_concepts(self, concept_name, max_depth=2):
         """Get concepts related to the given concept within max_depth hops"""
-        if concept_name not in self.graph.nodes():
+        start = self.resolve(concept_name)
+        if start is None:
             return []
         
         # Get neighbors within max_depth
         related = []
         visited = set()
-        queue = [(concept_name, 0)]
+        queue = [(start, 0)]
         
         while queue:
             current, depth = queue.pop(0)
@@ -131,9 +279,9 @@ class GraphStore:
                 continue
                 
             visited.add(current)
-            if current != concept_name:
+            if current != start:
                 related.append({
-                    'name': current,
+                    'id': current,
                     'depth': depth,
                     **self.graph.nodes[current]
                 })
@@ -145,8 +293,118 @@ class GraphStore:
         
         return related
 
+    @staticmethod
+    def _encode_cursor(kind, offset):
+        raw = json.dumps({"kind": kind, "offset": offset}).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+    @staticmethod
+    def _decode_cursor(kind, cursor):
+        if not cursor:
+            return 0
+        try:
+            raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+            data = json.loads(raw)
+            if data["kind"] == kind and isinstance(data["offset"], int) and data["offset"] >= 0:
+                return data["offset"]
+        except (ValueError, KeyError, TypeError):
+            pass
+        raise ValueError(f"Invalid {kind} cursor")
+
+    def _node_record(self, node_id):
+        return {'id': node_id, **self.graph.nodes[node_id]}
+
+    def _edge_record(self, source, target):
+        return {'source': source, 'target': target, **self.graph.edges[source, target]}
+
+    def list_nodes(self, cursor=None, limit=100):
+        """
+        One page of nodes in insertion order. Returns (nodes, next cursor), the
+        cursor being None on the last page. Nodes added while paging show up
+        on later pages. Raises ValueError for a malformed cursor.
+        """
+        start = self._decode_cursor("nodes", cursor)
+        page = self._node_order[start:start + limit]
+        end = start + len(page)
+        next_cursor = self._encode_cursor("nodes", end) if end < len(self._node_order) else None
+        return [self._node_record(node) for node in page], next_cursor
+
+    def list_edges(self, cursor=None, limit=100):
+        """Same as list_nodes(), for edges"""
+        start = self._decode_cursor("edges", cursor)
+        page = self._edge_order[start:start + limit]
+        end = start + len(page)
+        next_cursor = self._encode_cursor("edges", end) if end < len(self._edge_order) else None
+        return [self._edge_record(source, target) for source, target in page], next_cursor
+
+    def subgraph(self, concept, radius=1, limit=200):
+        """
+        The neighbourhood of a concept: nodes within `radius` hops in either
+        direction (at most `limit`, nearest first) and the edges between them.
+        Returns None for an unknown concept.
+        """
+        center = self.resolve(concept)
+        if center is None:
+            return None
+
+        depth = {center: 0}
+        frontier = [center]
+        truncated = False
+        while frontier and not truncated:
+            next_frontier = []
+            for node in frontier:
+                if depth[node] >= radius:
+                    continue
+                for neighbor in [*self.graph.successors(node), *self.graph.predecessors(node)]:
+                    if neighbor in depth:
+                        continue
+                    if len(depth) >= limit:
+                        truncated = True
+                        break
+                    depth[neighbor] = depth[node] + 1
+                    next_frontier.append(neighbor)
+                if truncated:
+                    break
+            frontier = next_frontier
+
+        nodes = [{**self._node_record(node), 'depth': d} for node, d in depth.items()]
+        edges = [
+            self._edge_record(source, target)
+            for source in depth
+            for target in self.graph.successors(source)
+            if target in depth
+        ]
+        return {"center": center, "nodes": nodes, "edges": edges, "truncated": truncated}
+
+    def iter_ndjson(self, batch_size=500):
+        """
+        Export the graph as NDJSON, one node or edge per line, yielding chunks
+        of `batch_size` lines so the full dump is never held in memory.
+        Nodes come first, then edges; items added during the export are included.
+        """
+        yield json.dumps({
+            "type": "meta",
+            "version": self.version,
+            "num_concepts": len(self._node_order),
+            "num_relations": len(self._edge_order)
+        }) + "\n"
+
+        for kind, order, record in (
+            ("node", self._node_order, self._node_record),
+            ("edge", self._edge_order, lambda item: self._edge_record(*item)),
+        ):
+            position = 0
+            while position < len(order):
+                items = order[position:position + batch_size]
+                position += len(items)
+                yield "".join(
+                    json.dumps({"type": kind, **record(item)}, default=str) + "\n" for item in items
+                )
+
     def get_graph_stats(self):
         """Get statistics about the graph"""
+        import networkx as nx
+
         return {
             'num_concepts': self.graph.number_of_nodes(),
             'num_relations': self.graph.number_of_edges(),
@@ -0,0 +1,23 @@
+import hashlib
+import re
+
+def normalize_name(name: str) -> str:
+    """Case-, punctuation- and whitespace-insensitive form of a concept name"""
+    return " ".join(re.findall(r"[a-z0-9]+", (name or "").lower()))
+
+def document_id(pdf_path: str) -> str:
+    """Stable document ID derived from the file's content, not its name or location"""
+    digest = hashlib.sha256()
+    with open(pdf_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return f"doc_{digest.hexdigest()[:16]}"
+
+def concept_id(doc_id: str, name: str) -> str:
+    """
+    Content-derived concept ID, namespaced by document. Re-ingesting the same
+    document yields the same IDs, so upserts replace rather than duplicate.
+    """
+    normalized = normalize_name(name)
+    slug = normalized.replace(" ", "-")[:40] or "concept"
+    return f"{doc_id}:{slug}-{hashlib.sha1(normalized.encode('utf-8')).hexdigest()[:8]}"
@@ -1,15 +1,13 @@
-import fitz  # PyMuPDF
-from PIL import Image
-import io
-import os
 from pathlib import Path
 from typing import List, Dict
+from ..orchestrator.config import settings
+from .image_store import ImageStore, write_blob
 
 class ImageExtractor:
-    """Extract images from PDFs using PyMuPDF"""
+    """Extract images from PDFs using PyMuPDF into the content-addressed image store"""
     
-    def __init__(self, output_dir: str = "data/extracted_images"):
-        self.output_dir = Path(output_dir)
+    def __init__(self, output_dir: str = None):
+        self.output_dir = Path(output_dir or settings.IMAGE_STORE_DIR)
         self.output_dir.mkdir(parents=True, exist_ok=True)
     
     def extract_images(self, pdf_path: str) -> List[Dict[str, str]]:
@@ -17,14 +15,23 @@ class ImageExtractor:
         Extract all images from a PDF
         
         Returns:
-            List of dicts with 'path', 'page', 'index'
+            List of dicts with 'image_id' (content hash), 'path', 'page', 'index', 'size'
         """
+        import fitz  # PyMuPDF, deferred until the first extraction
+
+        try:
+            with fitz.open(pdf_path) as doc:
+                return self.extract_from_document(doc, Path(pdf_path).stem)
+        except Exception as e:
+            print(f"Error extracting images: {e}")
+            return []
+    
+    def extract_from_document(self, doc, pdf_name: str) -> List[Dict[str, str]]:
+        """Same as extract_images(), for a document that is already open"""
         images = []
+        seen = set()  # the same image (e.g. a logo) can appear on many pages
         
         try:
-            doc = fitz.open(pdf_path)
-            pdf_name = Path(pdf_path).stem
-            
             for page_num in range(len(doc)):
                 page = doc[page_num]
                 image_list = page.get_images()
@@ -37,23 +44,21 @@ class ImageExtractor:
                         image_bytes = base_image["image"]
                         image_ext = base_image["ext"]
                         
-                        # Save image
-                        image_filename = f"{pdf_name}_page{page_num+1}_img{img_index+1}.{image_ext}"
-                        image_path = self.output_dir / image_filename
-                        
-                        with open(image_path, "wb") as img_file:
-                            img_file.write(image_bytes)
+                        # Save image once per content; the main process registers it in the store
+                        image_id, image_path = write_blob(self.output_dir, image_bytes, image_ext)
+                        if image_id in seen:
+                            continue
+                        seen.add(image_id)
                         
                         images.append({
-                            "path": str(image_path),
+                            "image_id": image_id,
+                            "path": image_path,
                             "page": page_num + 1,
                             "index": img_index + 1,
                             "size": len(image_bytes)
                         })
                         
-                        print(f"  Extracted: {image_filename} ({len(image_bytes)} bytes)")
-            
-            doc.close()
+                        print(f"  Extracted: {pdf_name} page {page_num+1} image {img_index+1} -> {image_id[:12]} ({len(image_bytes)} bytes)")
             
         except Exception as e:
             print(f"Error extracting images: {e}")
@@ -61,7 +66,9 @@ class ImageExtractor:
         return images
     
     def cleanup_images(self):
-        """Remove all extracted images"""
-        for file in self.output_dir.glob("*"):
-            if file.is_file():
-                file.unlink()
+        """Remove extracted images no graph node references; returns bytes freed"""
+        return ImageStore(self.output_dir).load().purge_unreferenced()
+
+def extract_images(pdf_path: str, output_dir: str = None) -> List[Dict[str, str]]:
+    """Module-level entry point so extraction can run in a worker process"""
+    return ImageExtractor(output_dir).extract_images(pdf_path)
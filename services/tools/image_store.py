@@ -0,0 +1,208 @@
+from ..orchestrator.config import settings
+from .executors import run_io
+from pathlib import Path
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+def blob_path(root, digest: str, ext: str) -> Path:
+    return Path(root) / "blobs" / digest[:2] / f"{digest}.{ext}"
+
+def write_blob(root, data: bytes, ext: str):
+    """
+    Store image bytes under their SHA-256 and return (digest, path). Safe to
+    call from worker processes: it only touches the blob file, never the
+    manifest. An existing blob is not rewritten, but its mtime is bumped so the
+    main process doesn't evict it before registering it.
+    """
+    digest = hashlib.sha256(data).hexdigest()
+    path = blob_path(root, digest, ext)
+    if path.exists():
+        os.utime(path)
+        return digest, str(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    return digest, str(path)
+
+class ImageStore:
+    """
+    Content-addressed store for extracted images. A manifest, owned by the
+    main process, records each blob's size, last use and the graph nodes that
+    reference it.
+
+    Identical images, from one document or several, are stored once. When the
+    store grows past IMAGE_STORE_QUOTA_MB, unreferenced blobs are evicted
+    least recently used first. Referenced blobs are never evicted, and neither
+    are blobs written in the last IMAGE_STORE_GRACE_S seconds, which may still
+    be on their way to registration.
+    """
+
+    def __init__(self, root: str = None, quota_bytes: int = None):
+        self.root = Path(root or settings.IMAGE_STORE_DIR)
+        self.quota_bytes = quota_bytes if quota_bytes is not None else settings.IMAGE_STORE_QUOTA_MB * 1024 * 1024
+        self.manifest_path = self.root / "index.json"
+        self.blobs = {}  # digest -> {"ext", "size", "last_used", "refs": [node IDs]}
+        self._save_lock = None
+
+    # -- persistence -------------------------------------------------------
+
+    def load(self):
+        """Load the manifest and adopt blob files it doesn't know about (as unreferenced)"""
+        if self.manifest_path.exists():
+            with open(self.manifest_path) as f:
+                self.blobs = json.load(f).get("blobs", {})
+        for path in (self.root / "blobs").glob("*/*"):
+            if path.suffix == ".tmp":
+                continue
+            digest, ext = path.stem, path.suffix.lstrip(".")
+            if digest not in self.blobs:
+                stat = path.stat()
+                self.blobs[digest] = {"ext": ext, "size": stat.st_size, "last_used": stat.st_mtime, "refs": []}
+        return self
+
+    def snapshot(self):
+        return {"blobs": {digest: {**entry, "refs": list(entry["refs"])} for digest, entry in self.blobs.items()}}
+
+    def _write(self, data):
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.manifest_path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.manifest_path)
+
+    def save(self):
+        self._write(self.snapshot())
+
+    async def asave(self):
+        """Snapshot on the event loop, write on the I/O pool; saves are serialised"""
+        if self._save_lock is None:
+            self._save_lock = asyncio.Lock()
+        async with self._save_lock:
+            await run_io(self._write, self.snapshot())
+
+    # -- bookkeeping -------------------------------------------------------
+
+    def register(self, images):
+        """Record images written by write_blob() (dicts with image_id, path and size)"""
+        now = time.time()
+        for image in images:
+            entry = self.blobs.get(image["image_id"])
+            if entry is None:
+                ext = Path(image["path"]).suffix.lstrip(".")
+                self.blobs[image["image_id"]] = {"ext": ext, "size": image["size"], "last_used": now, "refs": []}
+            else:
+                entry["last_used"] = now
+
+    def touch(self, digest):
+        """Mark an image as just read, so eviction takes the least recently used first"""
+        if digest in self.blobs:
+            self.blobs[digest]["last_used"] = time.time()
+
+    def add_ref(self, digest, node_id):
+        entry = self.blobs.get(digest)
+        if entry is None:
+            logger.warning(f"Reference from {node_id} to unknown image {digest}")
+            return
+        if node_id not in entry["refs"]:
+            entry["refs"].append(node_id)
+        entry["last_used"] = time.time()
+
+    def release(self, node_id):
+        """Drop every reference held by a graph node; its images become evictable"""
+        for entry in self.blobs.values():
+            if node_id in entry["refs"]:
+                entry["refs"].remove(node_id)
+
+    def set_ref(self, node_id, digest=None):
+        """Make `digest` the only image a node references (none if it's None)"""
+        self.release(node_id)
+        if digest:
+            self.add_ref(digest, node_id)
+
+    def path(self, digest):
+        entry = self.blobs.get(digest)
+        return str(blob_path(self.root, digest, entry["ext"])) if entry else None
+
+    def total_bytes(self):
+        return sum(entry["size"] for entry in self.blobs.values())
+
+    # -- eviction ----------------------------------------------------------
+
+    def _victims(self, target_bytes):
+        """Unreferenced blobs to delete, least recently used first, to get under target_bytes"""
+        total = self.total_bytes()
+        if total <= target_bytes:
+            return []
+        cutoff = time.time() - settings.IMAGE_STORE_GRACE_S
+        candidates = sorted(
+            (entry["last_used"], digest) for digest, entry in self.blobs.items()
+            if not entry["refs"] and entry["last_used"] < cutoff
+        )
+        victims = []
+        for _, digest in candidates:
+            if total <= target_bytes:
+                break
+            victims.append((digest, blob_path(self.root, digest, self.blobs[digest]["ext"])))
+            total -= self.blobs[digest]["size"]
+        return victims
+
+    @staticmethod
+    def _delete(victims):
+        cutoff = time.time() - settings.IMAGE_STORE_GRACE_S
+        deleted = []
+        for digest, path in victims:
+            try:
+                # A worker may have just re-extracted this image
+                if path.stat().st_mtime >= cutoff:
+                    continue
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            deleted.append(digest)
+        return deleted
+
+    def _forget(self, deleted):
+        freed = 0
+        for digest in deleted:
+            entry = self.blobs.get(digest)
+            # Skip blobs referenced or re-registered while the files were being deleted
+            if entry and not entry["refs"]:
+                freed += entry["size"]
+                del self.blobs[digest]
+        return freed
+
+    async def enforce_quota(self):
+        """Evict unreferenced blobs until the store fits its quota; returns bytes freed"""
+        victims = self._victims(self.quota_bytes)
+        if not victims:
+            if self.total_bytes() > self.quota_bytes:
+                logger.warning("Image store is over quota but every remaining blob is referenced or recent")
+            return 0
+        deleted = await run_io(self._delete, victims)
+        freed = self._forget(deleted)
+        await self.asave()
+        logger.info(f"Evicted {len(deleted)} images ({freed} bytes) from the image store")
+        return freed
+
+    def purge_unreferenced(self):
+        """Delete every unreferenced blob outside the grace period (synchronous)"""
+        freed = self._forget(self._delete(self._victims(0)))
+        self.save()
+        return freed
+
+    def stats(self):
+        referenced = sum(1 for entry in self.blobs.values() if entry["refs"])
+        return {
+            "blobs": len(self.blobs),
+            "referenced": referenced,
+            "bytes": self.total_bytes(),
+            "quota_bytes": self.quota_bytes
+        }
@@ -1,28 +1,160 @@
 import httpx
+import json
 import logging
+import os
+import time
 from ..orchestrator.config import settings
+from .concurrency import limits
+from .model_router import router
+from .rate_limiter import IMAGE_TOKENS, estimate_tokens, governor
+from .single_flight import flight_key, llm_flight
+from .structured_output import IncrementalJSONParser, parse_json_array
 
 logger = logging.getLogger(__name__)
 
+# Providers whose chat API accepts `response_format: {"type": "json_object"}`
+JSON_MODE_PROVIDERS = {"mistral"}
+
 class LLMClient:
     def __init__(self):
         self.mistral_key = settings.MISTRAL_API_KEY
         self.openrouter_key = settings.OPENROUTER_API_KEY
 
-    async def generate(self, messages, provider='auto', model=None, temperature=0.7):
-        if provider == 'auto':
-            # Default strategy: use Mistral for extraction/logic, Gemini (via OpenRouter) for creative/pedagogy
-            # For now, let's default to Mistral if not specified, or Gemini if explicitly requested
-            provider = 'mistral'
+    async def generate(self, messages, provider='auto', model=None, temperature=0.7, json_mode=False, route=None):
+        """
+        `json_mode` asks providers that support it to constrain the output to a
+        JSON object; the prompt must still describe the expected shape.
+
+        With a `route` from `router.select(task, messages)`, provider and model
+        come from the route: its candidates are tried in order, up to
+        ROUTER_MAX_ATTEMPTS, and the outcome is recorded on it. provider='auto'
+        routes the request as the "general" task.
+        """
+        if route is None and provider == 'auto':
+            route = router.select("general", messages)
+        if route is not None:
+            return await self._generate_routed(messages, route, temperature, json_mode)
+        # Identical concurrent requests share one upstream call
+        key = flight_key("generate", provider, model, temperature, json_mode, messages)
+        return await llm_flight.do(key, lambda: self._generate(messages, provider, model, temperature, json_mode))
 
+    async def _generate_routed(self, messages, route, temperature, json_mode):
+        attempts = min(len(route.candidates), settings.ROUTER_MAX_ATTEMPTS)
+        for index in range(attempts):
+            route.index = index
+            started = time.perf_counter()
+            try:
+                text = await self.generate(messages, route.provider, route.model, temperature, json_mode)
+            except Exception as e:
+                router.record(route, time.perf_counter() - started, ok=False, error=e)
+                if index == attempts - 1:
+                    raise
+                continue
+            router.record(route, time.perf_counter() - started, ok=True)
+            return text
+
+    async def _generate(self, messages, provider, model, temperature, json_mode=False):
         if provider == 'mistral':
-            return await self._call_mistral(messages, model or 'mistral-large-latest', temperature)
+            return await self._call_mistral(messages, model or 'mistral-large-latest', temperature, json_mode)
         elif provider == 'openrouter':
             return await self._call_openrouter(messages, model or 'google/gemma-3-27b-it:free', temperature)
         else:
             raise ValueError(f"Unknown provider: {provider}")
 
-    async def _call_mistral(self, messages, model, temperature):
+    async def generate_json_items(self, messages, provider='auto', model=None, temperature=0.7, route=None):
+        """
+        Stream a JSON-mode completion and yield each object of its list as soon
+        as the object closes. If nothing could be read incrementally, the full
+        response is repaired and parsed once at the end.
+        """
+        parser = IncrementalJSONParser()
+        yielded = 0
+        async for delta in self.generate_stream(messages, provider, model, temperature, json_mode=True, route=route):
+            for item in parser.feed(delta):
+                yielded += 1
+                yield item
+        if not yielded:
+            for item in parse_json_array(parser.buffer):
+                if isinstance(item, dict):
+                    yield item
+
+    async def generate_stream(self, messages, provider='auto', model=None, temperature=0.7, json_mode=False, route=None):
+        """Same as generate(), but yields the completion as it is produced"""
+        if route is None and provider == 'auto':
+            route = router.select("general", messages)
+        if route is not None:
+            async for delta in self._stream_routed(messages, route, temperature, json_mode):
+                yield delta
+            return
+
+        if provider == 'mistral':
+            url = 'https://api.mistral.ai/v1/chat/completions'
+            headers = {'Authorization': f'Bearer {self.mistral_key}'}
+            model = model or 'mistral-large-latest'
+        elif provider == 'openrouter':
+            url = 'https://openrouter.ai/api/v1/chat/completions'
+            headers = {
+                'Authorization': f'Bearer {self.openrouter_key}',
+                'HTTP-Referer': 'https://flowmind.local',
+                'X-Title': 'FlowMind'
+            }
+            model = model or 'google/gemma-3-27b-it:free'
+        else:
+            raise ValueError(f"Unknown provider: {provider}")
+
+        body = {
+            'model': model,
+            'messages': messages,
+            'temperature': temperature,
+            'stream': True
+        }
+        if json_mode and provider in JSON_MODE_PROVIDERS:
+            body['response_format'] = {'type': 'json_object'}
+        tokens = estimate_tokens(messages)
+        for attempt in range(settings.RATE_LIMIT_MAX_RETRIES + 1):
+            await governor.acquire(provider, model, tokens)
+            async with limits.slot(f"provider:{provider}"), httpx.AsyncClient() as client:
+                try:
+                    async with client.stream('POST', url, json=body, headers=headers, timeout=60) as r:
+                        if governor.observe(provider, model, r) and attempt < settings.RATE_LIMIT_MAX_RETRIES:
+                            continue  # throttled before anything was streamed; retry once allowed
+                        r.raise_for_status()
+                        # Both providers use OpenAI-style server-sent events
+                        async for line in r.aiter_lines():
+                            if not line.startswith('data:'):
+                                continue
+                            data = line[len('data:'):].strip()
+                            if data == '[DONE]':
+                                break
+                            choices = json.loads(data).get('choices') or [{}]
+                            delta = (choices[0].get('delta') or {}).get('content')
+                            if delta:
+                                yield delta
+                        return
+                except Exception as e:
+                    logger.error(f"{provider} streaming call failed: {e}")
+                    raise
+
+    async def _stream_routed(self, messages, route, temperature, json_mode):
+        attempts = min(len(route.candidates), settings.ROUTER_MAX_ATTEMPTS)
+        for index in range(attempts):
+            route.index = index
+            started = time.perf_counter()
+            streamed = False
+            try:
+                async for delta in self.generate_stream(messages, route.provider, route.model, temperature, json_mode):
+                    streamed = True
+                    yield delta
+            except Exception as e:
+                router.record(route, time.perf_counter() - started, ok=False, error=e)
+                # Once text has been streamed, switching models would garble the output
+                if streamed or index == attempts - 1:
+                    raise
+                continue
+            router.record(route, time.perf_counter() - started, ok=True)
+            return
+
+    async def _call_mistral(self, messages, model, temperature, json_mode=False):
         url = 'https://api.mistral.ai/v1/chat/completions'
         headers = {'Authorization': f'Bearer {self.mistral_key}'}
         body = {
@@ -30,14 +162,14 @@ class LLMClient:
             'messages': messages,
             'temperature': temperature
         }
-        async with httpx.AsyncClient() as client:
-            try:
-                r = await client.post(url, json=body, headers=headers, timeout=60)
-                r.raise_for_status()
-                return r.json()['choices'][0]['message']['content']
-            except Exception as e:
-                logger.error(f"Mistral call failed: {e}")
-                raise
+        if json_mode:
+            body['response_format'] = {'type': 'json_object'}
+        try:
+            r = await self._post('mistral', model, url, body, headers, timeout=60)
+            return r.json()['choices'][0]['message']['content']
+        except Exception as e:
+            logger.error(f"Mistral call failed: {e}")
+            raise
 
     async def _call_openrouter(self, messages, model, temperature):
         url = 'https://openrouter.ai/api/v1/chat/completions'
@@ -52,87 +184,151 @@ class LLMClient:
             'messages': messages,
             'temperature': temperature
         }
-        async with httpx.AsyncClient() as client:
-            try:
-                r = await client.post(url, json=body, headers=headers, timeout=60)
-                r.raise_for_status()
-                return r.json()['choices'][0]['message']['content']
-            except Exception as e:
-                logger.error(f"OpenRouter call failed: {e}")
-                raise
+        try:
+            r = await self._post('openrouter', model, url, body, headers, timeout=60)
+            return r.json()['choices'][0]['message']['content']
+        except Exception as e:
+            logger.error(f"OpenRouter call failed: {e}")
+            raise
 
+    async def _post(self, provider, model, url, body, headers, timeout, max_wait=None):
+        """
+        POST through the rate governor: wait for the provider's and model's
+        budget, report the response's rate-limit headers and token usage, and
+        retry 429s after the delay the governor sets. Returns the successful
+        response; raises httpx.HTTPStatusError otherwise, or RateLimited when
+        the wait would exceed `max_wait` seconds.
+        """
+        tokens = estimate_tokens(body.get('messages') or body.get('input') or [])
+        for attempt in range(settings.RATE_LIMIT_MAX_RETRIES + 1):
+            await governor.acquire(provider, model, tokens, max_wait)
+            async with limits.slot(f"provider:{provider}"), httpx.AsyncClient() as client:
+                r = await client.post(url, json=body, headers=headers, timeout=timeout)
+            used = None
+            if r.is_success:
+                try:
+                    used = (r.json().get('usage') or {}).get('total_tokens')
+                except ValueError:
+                    pass
+            delay = governor.observe(provider, model, r, used, tokens)
+            if not delay or attempt == settings.RATE_LIMIT_MAX_RETRIES:
+                break
+            if max_wait is not None and delay > max_wait:
+                break
+        r.raise_for_status()
+        return r
 
     async def embed(self, text):
         """Generate embeddings using Mistral's embedding model"""
+        return await llm_flight.do(flight_key("embed", text.strip()), lambda: self._embed(text))
+
+    async def _embed(self, text):
         url = 'https://api.mistral.ai/v1/embeddings'
         headers = {'Authorization': f'Bearer {self.mistral_key}'}
         body = {
             'model': 'mistral-embed',
             'input': [text]  # API expects a list
         }
-        async with httpx.AsyncClient() as client:
-            try:
-                r = await client.post(url, json=body, headers=headers, timeout=60)
-                r.raise_for_status()
-                # Returns list of embeddings, we take the first one
-                return r.json()['data'][0]['embedding']
-            except Exception as e:
-                logger.error(f"Mistral embed call failed: {e}")
-                raise
+        try:
+            r = await self._post('mistral', 'mistral-embed', url, body, headers, timeout=60)
+            # Returns list of embeddings, we take the first one
+            return r.json()['data'][0]['embedding']
+        except Exception as e:
+            logger.error(f"Mistral embed call failed: {e}")
+            raise
+
 
+    async def embed_batch(self, texts):
+        """Embed several texts in a single Mistral request, preserving order"""
+        if not texts:
+            return []
+        texts = list(texts)
+        # Texts already being embedded by a concurrent caller are not requested again
+        keys = [flight_key("embed", text.strip()) for text in texts]
+        return await llm_flight.do_many(keys, lambda indexes: self._embed_batch([texts[i] for i in indexes]))
 
-    async def process_vision(self, image_path, prompt):
+    async def _embed_batch(self, texts):
+        url = 'https://api.mistral.ai/v1/embeddings'
+        headers = {'Authorization': f'Bearer {self.mistral_key}'}
+        body = {
+            'model': 'mistral-embed',
+            'input': list(texts)
+        }
+        try:
+            r = await self._post('mistral', 'mistral-embed', url, body, headers, timeout=60)
+            data = sorted(r.json()['data'], key=lambda d: d.get('index', 0))
+            return [d['embedding'] for d in data]
+        except Exception as e:
+            logger.error(f"Mistral batch embed call failed: {e}")
+            raise
+
+
+    async def process_vision(self, image_path, prompt, route=None):
         """
-        Process image with vision model using fallback chain:
-        1. Try google/gemma-3-27b-it:free (OpenRouter)
-        2. Fall back to mistralai/mistral-small-3.1-24b-instruct:free (OpenRouter)
-        3. Final fallback: pixtral-12b-2409 (Mistral API)
+        Process image with vision model, trying the candidates of the "vision"
+        route in order (by default google/gemma-3-27b-it:free and
+        mistralai/mistral-small-3.1-24b-instruct:free on OpenRouter, then
+        pixtral-12b-2409 on the Mistral API).
         
         Args:
             image_path: Path to image file
             prompt: Text prompt for the vision model
+            route: Route from router.select("vision", ...); chosen here if omitted
         
         Returns:
             String response from vision model
         """
+        return await self.process_vision_batch([image_path], prompt, route)
+
+    async def process_vision_batch(self, image_paths, prompt, route=None):
+        """
+        Send several images with one prompt in a single request, in order, using
+        the same fallback chain as process_vision(). Every model in the chain
+        accepts multiple images.
+
+        Raises VisionBatchTooLarge if a model rejected the request as too large,
+        so the caller can retry with fewer images.
+        """
         import base64
         
-        # Read and encode image
-        try:
-            with open(image_path, 'rb') as f:
-                image_data = base64.b64encode(f.read()).decode('utf-8')
-        except Exception as e:
-            logger.error(f"Failed to read image {image_path}: {e}")
-            raise
+        # Read and encode images
+        images = []
+        for image_path in image_paths:
+            try:
+                with open(image_path, 'rb') as f:
+                    images.append((_image_mime(image_path), base64.b64encode(f.read()).decode('utf-8')))
+            except Exception as e:
+                logger.error(f"Failed to read image {image_path}: {e}")
+                raise
         
-        # Try OpenRouter models first
-        openrouter_models = [
-            'google/gemma-3-27b-it:free',
-            'mistralai/mistral-small-3.1-24b-instruct:free'
-        ]
+        if route is None:
+            route = router.select("vision", prompt_tokens=estimate_tokens([prompt]) + len(images) * IMAGE_TOKENS)
         
-        for model in openrouter_models:
+        too_large = False
+        for index in range(len(route.candidates)):
+            route.index = index
+            started = time.perf_counter()
             try:
-                logger.info(f"Trying vision model: {model}")
-                result = await self._call_openrouter_vision(image_data, prompt, model)
-                logger.info(f"Success with {model}")
-                return result
+                logger.info(f"Trying vision model: {route.provider}/{route.model} ({len(images)} images)")
+                if route.provider == 'openrouter':
+                    result = await self._call_openrouter_vision(images, prompt, route.model)
+                else:
+                    result = await self._call_mistral_vision(images, prompt, route.model)
             except Exception as e:
-                logger.warning(f"Failed with {model}: {e}")
+                router.record(route, time.perf_counter() - started, ok=False, error=e)
+                too_large = too_large or _rejected_as_too_large(e)
                 continue
-        
-        # Final fallback: Mistral Pixtral
-        try:
-            logger.info("Trying final fallback: Mistral Pixtral")
-            result = await self._call_mistral_vision(image_data, prompt)
-            logger.info("Success with Mistral Pixtral")
+            router.record(route, time.perf_counter() - started, ok=True)
+            logger.info(f"Success with {route.model}")
             return result
-        except Exception as e:
-            logger.error(f"All vision models failed. Last error: {e}")
-            raise Exception("All vision models failed")
+        
+        logger.error(f"All vision models failed: {'; '.join(route.errors)}")
+        if too_large and len(images) > 1:
+            raise VisionBatchTooLarge(len(images))
+        raise Exception("All vision models failed")
     
-    async def _call_openrouter_vision(self, image_data, prompt, model):
-        """Call OpenRouter vision model"""
+    async def _call_openrouter_vision(self, images, prompt, model):
+        """Call OpenRouter vision model with (mime type, base64 data) images"""
         url = 'https://openrouter.ai/api/v1/chat/completions'
         headers = {
             'Authorization': f'Bearer {self.openrouter_key}',
@@ -144,45 +340,66 @@ class LLMClient:
             'model': model,
             'messages': [{
                 'role': 'user',
-                'content': [
-                    {'type': 'text', 'text': prompt},
+                'content': [{'type': 'text', 'text': prompt}] + [
                     {
                         'type': 'image_url',
                         'image_url': {
-                            'url': f'data:image/jpeg;base64,{image_data}'
+                            'url': f'data:{mime};base64,{data}'
                         }
                     }
+                    for mime, data in images
                 ]
             }],
             'temperature': 0.3
         }
         
-        async with httpx.AsyncClient() as client:
-            r = await client.post(url, json=body, headers=headers, timeout=90)
-            r.raise_for_status()
-            return r.json()['choices'][0]['message']['content']
+        # Rather than wait out a long rate limit, let the caller try the next model
+        r = await self._post('openrouter', model, url, body, headers, timeout=90 + 30 * (len(images) - 1),
+                             max_wait=settings.RATE_LIMIT_MAX_WAIT_S)
+        return r.json()['choices'][0]['message']['content']
     
-    async def _call_mistral_vision(self, image_data, prompt):
-        """Call Mistral Pixtral vision model"""
+    async def _call_mistral_vision(self, images, prompt, model='pixtral-12b-2409'):
+        """Call a Mistral vision model (Pixtral) with (mime type, base64 data) images"""
         url = 'https://api.mistral.ai/v1/chat/completions'
         headers = {'Authorization': f'Bearer {self.mistral_key}'}
         
         body = {
-            'model': 'pixtral-12b-2409',
+            'model': model,
             'messages': [{
                 'role': 'user',
-                'content': [
-                    {'type': 'text', 'text': prompt},
+                'content': [{'type': 'text', 'text': prompt}] + [
                     {
                         'type': 'image_url',
-                        'image_url': f'data:image/jpeg;base64,{image_data}'
+                        'image_url': f'data:{mime};base64,{data}'
                     }
+                    for mime, data in images
                 ]
             }],
             'temperature': 0.3
         }
         
-        async with httpx.AsyncClient() as client:
-            r = await client.post(url, json=body, headers=headers, timeout=90)
-            r.raise_for_status()
-            return r.json()['choices'][0]['message']['content']
+        r = await self._post('mistral', model, url, body, headers, timeout=90 + 30 * (len(images) - 1))
+        return r.json()['choices'][0]['message']['content']
+
+class VisionBatchTooLarge(Exception):
+    """A provider rejected a multi-image request because of its size"""
+
+    def __init__(self, size: int):
+        super().__init__(f"Vision request with {size} images was rejected as too large")
+        self.size = size
+
+_MIME_TYPES = {'.png': 'image/png', '.gif': 'image/gif', '.webp': 'image/webp'}
+
+def _image_mime(image_path):
+    return _MIME_TYPES.get(os.path.splitext(str(image_path))[1].lower(), 'image/jpeg')
+
+def _rejected_as_too_large(error):
+    """Whether an HTTP error looks like the request carried too many or too large images"""
+    if not isinstance(error, httpx.HTTPStatusError):
+        return False
+    if error.response.status_code == 413:
+        return True
+    if error.response.status_code in (400, 422):
+        text = error.response.text.lower()
+        return any(word in text for word in ("image", "too large", "too many", "size", "payload", "context"))
+    return False
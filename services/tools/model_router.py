@@ -0,0 +1,150 @@
+from ..orchestrator.config import settings
+from .rate_limiter import estimate_tokens, governor
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+import logging
+import math
+import time
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class Route:
+    """The candidates chosen for one request, best first, and how the request went"""
+    task: str
+    candidates: List[Tuple[str, str]]  # (provider, model)
+    prompt_tokens: int
+    index: int = 0  # candidate currently in use
+    attempts: int = 0
+    latency_s: Optional[float] = None
+    errors: List[str] = field(default_factory=list)
+
+    @property
+    def provider(self):
+        return self.candidates[self.index][0]
+
+    @property
+    def model(self):
+        return self.candidates[self.index][1]
+
+    def info(self):
+        """Summary for AgentResult.meta"""
+        return {
+            "task": self.task,
+            "provider": self.provider,
+            "model": self.model,
+            "prompt_tokens": self.prompt_tokens,
+            "attempts": self.attempts,
+            "latency_s": round(self.latency_s, 3) if self.latency_s is not None else None,
+            "fallback": self.index > 0
+        }
+
+class _ModelStats:
+    """Moving averages of one model's latency and error rate, decaying with time"""
+
+    def __init__(self):
+        self.latency_s = None
+        self.error_rate = 0.0
+        self.calls = 0
+        self.errors = 0
+        self.updated = time.monotonic()
+
+    def _decay(self, now):
+        # Old failures are forgotten over ROUTER_STATS_HALFLIFE_S, so a model
+        # that had an outage gets tried again
+        self.error_rate *= 0.5 ** ((now - self.updated) / settings.ROUTER_STATS_HALFLIFE_S)
+        self.updated = now
+
+    def record(self, latency_s, ok, now):
+        self._decay(now)
+        alpha = settings.ROUTER_EWMA_ALPHA
+        self.calls += 1
+        self.error_rate = (1 - alpha) * self.error_rate + alpha * (0.0 if ok else 1.0)
+        if ok:
+            self.latency_s = latency_s if self.latency_s is None else (1 - alpha) * self.latency_s + alpha * latency_s
+        else:
+            self.errors += 1
+
+    def current_error_rate(self, now):
+        self._decay(now)
+        return self.error_rate
+
+class ModelRouter:
+    """
+    Maps a task ("extraction", "relations", "critique", "tutoring", "summary",
+    "vision", "general") to the ranked candidates in MODEL_ROUTES and picks one
+    per request.
+
+    Candidates with a `max_prompt_tokens` only take prompts up to that size,
+    which sends short critiques and small relation batches to small, fast
+    models. The remaining candidates are ordered by expected cost: measured
+    latency, a penalty for recent errors, the current rate-limit wait, and
+    ROUTER_RANK_PENALTY_S per rank so the configured order wins when the
+    statistics are close. The others stay on the route as fallbacks.
+    """
+
+    def __init__(self):
+        self._stats = {}
+
+    def _model_stats(self, provider, model):
+        key = f"{provider}/{model}"
+        stats = self._stats.get(key)
+        if stats is None:
+            stats = self._stats[key] = _ModelStats()
+        return stats
+
+    def select(self, task, messages=None, prompt_tokens=None) -> Route:
+        if prompt_tokens is None:
+            prompt_tokens = estimate_tokens(messages or [])
+        candidates = settings.MODEL_ROUTES.get(task) or settings.MODEL_ROUTES["general"]
+        fitting = [c for c in candidates if prompt_tokens <= c.get("max_prompt_tokens", math.inf)]
+        # Never leave a request without a model: the largest one takes oversized prompts
+        fitting = fitting or [max(candidates, key=lambda c: c.get("max_prompt_tokens", math.inf))]
+
+        now = time.monotonic()
+        scored = []
+        for rank, candidate in enumerate(fitting):
+            provider, model = candidate["provider"], candidate["model"]
+            stats = self._model_stats(provider, model)
+            cost = (
+                (stats.latency_s or 0.0)
+                + stats.current_error_rate(now) * settings.ROUTER_ERROR_PENALTY_S
+                + governor.delay(provider, model, prompt_tokens)
+                + rank * settings.ROUTER_RANK_PENALTY_S
+            )
+            scored.append((cost, rank, (provider, model)))
+        scored.sort()
+        return Route(task, [candidate for _, _, candidate in scored], prompt_tokens)
+
+    def prompt_budget(self, task):
+        """
+        The smallest `max_prompt_tokens` among the task's candidates, or None if
+        none is capped. Callers size requests by it so small models can take them.
+        """
+        candidates = settings.MODEL_ROUTES.get(task) or settings.MODEL_ROUTES["general"]
+        budgets = [c["max_prompt_tokens"] for c in candidates if c.get("max_prompt_tokens")]
+        return min(budgets) if budgets else None
+
+    def record(self, route: Route, latency_s: float, ok: bool, error: Exception = None):
+        """Report the outcome of a call to the route's current candidate"""
+        self._model_stats(route.provider, route.model).record(latency_s, ok, time.monotonic())
+        route.attempts += 1
+        if ok:
+            route.latency_s = latency_s
+        else:
+            route.errors.append(f"{route.provider}/{route.model}: {error}")
+            logger.warning(f"{route.task} call to {route.provider}/{route.model} failed: {error}")
+
+    def stats(self):
+        now = time.monotonic()
+        return {
+            key: {
+                "calls": stats.calls,
+                "errors": stats.errors,
+                "error_rate": round(stats.current_error_rate(now), 3),
+                "latency_s": round(stats.latency_s, 3) if stats.latency_s is not None else None
+            }
+            for key, stats in sorted(self._stats.items())
+        }
+
+router = ModelRouter()
@@ -1,8 +1,14 @@
-from pdfminer.high_level import extract_text
+from collections import Counter
 import logging
+import re
 
 logger = logging.getLogger(__name__)
 
+PARSER_BACKENDS = ("pymupdf", "pdfminer")
+
+# "Figure 3:", "Fig. 2", "Table 1." ...
+CAPTION_PATTERN = re.compile(r"^(fig(ure)?|table|tab|chart|diagram|exhibit|plate)\.?\s*\d+", re.IGNORECASE)
+
 class PDFParser:
     def __init__(self):
         # Initialize layout parser model if needed
@@ -15,26 +21,190 @@ class PDFParser:
         """
         Parses a PDF and returns a list of structured blocks.
         """
+        # Deferred: pdfminer is only needed once a document is actually parsed
+        from pdfminer.high_level import extract_text
+
         try:
             # Basic text extraction
             text = extract_text(pdf_path)
             
             # Simple heuristic chunking (can be improved with LayoutParser)
-            # Splitting by double newlines to approximate paragraphs
-            raw_blocks = text.split('\n\n')
-            
+            # pdfminer separates pages with form feeds; within a page, split by
+            # double newlines to approximate paragraphs
             structured_blocks = []
-            for i, block in enumerate(raw_blocks):
-                clean_block = block.strip()
-                if clean_block:
-                    structured_blocks.append({
-                        "id": f"block_{i}",
-                        "type": "text", # Placeholder, would be 'heading', 'table', etc. with LP
-                        "content": clean_block,
-                        "page": 1 # Placeholder, pdfminer can give page numbers with more complex usage
-                    })
+            for page_num, page_text in enumerate(text.split('\f'), start=1):
+                for block in page_text.split('\n\n'):
+                    clean_block = block.strip()
+                    if clean_block:
+                        structured_blocks.append({
+                            "id": f"block_{len(structured_blocks)}",
+                            "type": "text", # Placeholder, would be 'heading', 'table', etc. with LP
+                            "content": clean_block,
+                            "page": page_num
+                        })
             
             return structured_blocks
         except Exception as e:
             logger.error(f"Error parsing PDF: {e}")
             raise
+
+class PyMuPDFParser:
+    """
+    Layout-aware parsing from PyMuPDF's structured text. Each block is
+    classified as a heading, paragraph, table or caption and keeps its
+    bounding box (x0, y0, x1, y1 in points):
+
+    - tables come from PyMuPDF's table finder; text blocks inside a table are
+      replaced by one block holding its rows. The finder is by far the most
+      expensive step, so it only runs on pages with ruling lines or a
+      "Table n" caption;
+    - captions start with "Figure n", "Table n" etc., or are short blocks
+      directly above or below an image;
+    - headings are short blocks set larger than the document's body text, or
+      in bold, and get a level from their font size (1 = largest).
+    """
+
+    def __init__(self, detect_tables: bool = True):
+        self.detect_tables = detect_tables
+
+    def parse(self, pdf_path):
+        import fitz  # PyMuPDF, deferred until the first parse
+
+        with fitz.open(pdf_path) as doc:
+            return self.parse_document(doc)
+
+    def parse_document(self, doc):
+        # One pass over the pages keeps a light summary of every block; the
+        # body font size is only known once all pages have been seen
+        sizes = Counter()
+        pages = []
+        for page in doc:
+            summaries, images = [], []
+            for block in page.get_text("dict", sort=True)["blocks"]:
+                if block.get("type") == 1:
+                    images.append(block["bbox"])
+                    continue
+                summary = self._summarize(block)
+                if summary:
+                    summaries.append(summary)
+                    sizes[summary["size"]] += len(summary["text"])
+            pages.append((page.number + 1, summaries, images, self._tables(page, summaries)))
+
+        body_size = sizes.most_common(1)[0][0] if sizes else 0.0
+        blocks = []
+        for page_num, summaries, images, tables in pages:
+            emitted = set()
+            for summary in summaries:
+                table = self._containing_table(summary["bbox"], tables)
+                if table is not None:
+                    # The whole table is emitted where its first block was
+                    if table not in emitted:
+                        emitted.add(table)
+                        blocks.append(self._block(blocks, "table", tables[table]["text"], page_num, tables[table]["bbox"]))
+                    continue
+                kind = self._classify(summary, body_size, images)
+                block = self._block(blocks, kind, summary["text"], page_num, summary["bbox"])
+                if kind == "heading":
+                    block["font_size"] = summary["size"]
+                blocks.append(block)
+
+        self._assign_heading_levels(blocks)
+        return blocks
+
+    @staticmethod
+    def _block(blocks, kind, content, page, bbox):
+        return {
+            "id": f"block_{len(blocks)}",
+            "type": kind,
+            "content": content,
+            "page": page,
+            "bbox": [round(v, 1) for v in bbox]
+        }
+
+    @staticmethod
+    def _summarize(block):
+        lines, sizes, bold = [], Counter(), True
+        for line in block.get("lines", []):
+            text = "".join(span["text"] for span in line["spans"]).strip()
+            if not text:
+                continue
+            lines.append(text)
+            for span in line["spans"]:
+                if span["text"].strip():
+                    sizes[round(span["size"], 1)] += len(span["text"])
+                    bold = bold and bool(span["flags"] & 16)
+        if not lines:
+            return None
+        return {
+            "text": "\n".join(lines),
+            "lines": len(lines),
+            "size": sizes.most_common(1)[0][0],
+            "bold": bold,
+            "bbox": block["bbox"]
+        }
+
+    @staticmethod
+    def _may_have_tables(page, summaries):
+        if any(s["text"][:5].lower() == "table" and CAPTION_PATTERN.match(s["text"]) for s in summaries):
+            return True
+        drawings = page.get_cdrawings() if hasattr(page, "get_cdrawings") else page.get_drawings()
+        return len(drawings) >= 4
+
+    def _tables(self, page, summaries):
+        if not self.detect_tables or not hasattr(page, "find_tables"):
+            return []
+        if not self._may_have_tables(page, summaries):
+            return []
+        tables = []
+        try:
+            for table in page.find_tables().tables:
+                rows = [" | ".join((cell or "").strip() for cell in row) for row in table.extract()]
+                text = "\n".join(row for row in rows if row.strip(" |"))
+                if text:
+                    tables.append({"bbox": tuple(table.bbox), "text": text})
+        except Exception as e:
+            logger.warning(f"Table detection failed on page {page.number + 1}: {e}")
+        return tables
+
+    @staticmethod
+    def _containing_table(bbox, tables):
+        cx, cy = (bbox[0] + bbox[2]) / 2, (bbox[1] + bbox[3]) / 2
+        for i, table in enumerate(tables):
+            x0, y0, x1, y1 = table["bbox"]
+            if x0 <= cx <= x1 and y0 <= cy <= y1:
+                return i
+        return None
+
+    @staticmethod
+    def _classify(summary, body_size, images):
+        text = summary["text"]
+        if len(text) <= 400 and CAPTION_PATTERN.match(text):
+            return "caption"
+
+        x0, y0, x1, y1 = summary["bbox"]
+        if len(text) <= 300:
+            for ix0, iy0, ix1, iy1 in images:
+                overlaps = x0 < ix1 and ix0 < x1
+                if overlaps and (0 <= y0 - iy1 <= 24 or 0 <= iy0 - y1 <= 24):
+                    return "caption"
+
+        short = summary["lines"] <= 3 and len(text) <= 200 and not text.endswith((".", ":", ";", ","))
+        if short and (summary["size"] >= body_size * 1.15 or (summary["bold"] and summary["size"] >= body_size)):
+            return "heading"
+        return "paragraph"
+
+    @staticmethod
+    def _assign_heading_levels(blocks):
+        sizes = sorted({b["font_size"] for b in blocks if b["type"] == "heading"}, reverse=True)
+        level = {size: i + 1 for i, size in enumerate(sizes)}
+        for block in blocks:
+            if block["type"] == "heading":
+                block["level"] = min(level[block.pop("font_size")], 6)
+
+def parse_pdf(pdf_path, backend: str = "pdfminer", detect_tables: bool = True):
+    """Module-level entry point so parsing can run in a worker process"""
+    if backend == "pymupdf":
+        return PyMuPDFParser(detect_tables).parse(pdf_path)
+    if backend == "pdfminer":
+        return PDFParser().parse(pdf_path)
+    raise ValueError(f"Unknown PDF parser backend: {backend}")
@@ -0,0 +1,267 @@
+from ..orchestrator.config import settings
+from email.utils import parsedate_to_datetime
+import asyncio
+import logging
+import random
+import re
+import time
+
+logger = logging.getLogger(__name__)
+
+# Rough characters per token, to estimate a request's size before sending it
+CHARS_PER_TOKEN = 4
+# Token estimate for one image in a vision request
+IMAGE_TOKENS = 800
+
+# Response headers providers use to report their limits; the first one present wins
+_HEADERS = {
+    "limit_requests": ("x-ratelimit-limit-requests", "x-ratelimit-limit"),
+    "remaining_requests": ("x-ratelimit-remaining-requests", "x-ratelimit-remaining",
+                           "x-ratelimit-remaining-req-minute"),
+    "remaining_tokens": ("x-ratelimit-remaining-tokens", "x-ratelimit-remaining-tokens-minute",
+                         "x-ratelimitbysize-remaining-minute"),
+    "reset": ("x-ratelimit-reset-requests", "x-ratelimit-reset", "x-ratelimit-reset-tokens"),
+}
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+
+class RateLimited(Exception):
+    """Waiting for a rate limit would take longer than the caller allows"""
+
+    def __init__(self, scope: str, wait_s: float):
+        super().__init__(f"Rate limit on {scope}: next request allowed in {wait_s:.1f}s")
+        self.scope = scope
+        self.wait_s = wait_s
+
+def estimate_tokens(messages) -> int:
+    """Token estimate for chat messages (or a list of texts), counting images at IMAGE_TOKENS"""
+    chars = images = 0
+    for message in messages:
+        content = message.get("content", "") if isinstance(message, dict) else message
+        if isinstance(content, str):
+            chars += len(content)
+            continue
+        for part in content:
+            if part.get("type") == "image_url":
+                images += 1
+            else:
+                chars += len(part.get("text", ""))
+    return chars // CHARS_PER_TOKEN + images * IMAGE_TOKENS + 1
+
+def parse_delay(value, now=None):
+    """
+    Seconds until a reset given as seconds ("2", "0.5"), a duration ("1m30s",
+    "250ms"), an epoch timestamp in seconds or milliseconds, or an HTTP date.
+    None if it can't be parsed.
+    """
+    if value is None:
+        return None
+    value = value.strip()
+    now = time.time() if now is None else now
+    try:
+        number = float(value)
+    except ValueError:
+        parts = _DURATION_PART.findall(value)
+        if parts and "".join(n + unit for n, unit in parts) == value:
+            scale = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+            return sum(float(n) * scale[unit] for n, unit in parts)
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - now)
+        except (TypeError, ValueError):
+            return None
+    if number > 1e12:  # epoch milliseconds
+        return max(0.0, number / 1000 - now)
+    if number > 1e9:  # epoch seconds
+        return max(0.0, number - now)
+    return max(0.0, number)
+
+class TokenBucket:
+    """Refills `per_minute` units per minute, holding at most `capacity`"""
+
+    def __init__(self, per_minute: float, capacity: float = None):
+        self.configure(per_minute, capacity)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def configure(self, per_minute: float, capacity: float = None):
+        self.per_minute = per_minute
+        self.capacity = capacity or max(1.0, per_minute * settings.RATE_LIMIT_BURST_S / 60)
+
+    def _refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.per_minute / 60)
+        self.updated = now
+
+    def wait_time(self, amount, now):
+        """Seconds until `amount` units are available (amounts above capacity wait for a full bucket)"""
+        self._refill(now)
+        missing = min(amount, self.capacity) - self.level
+        return max(0.0, missing * 60 / self.per_minute)
+
+    def available(self, now):
+        self._refill(now)
+        return self.level
+
+    def take(self, amount, now):
+        self._refill(now)
+        self.level -= min(amount, self.capacity)
+
+    def cap(self, remaining, now):
+        """Lower the level to what the provider says is left"""
+        self._refill(now)
+        self.level = min(self.level, remaining)
+
+class _Scope:
+    """Limits of one provider ("mistral") or model ("openrouter/google/gemma-3-27b-it:free")"""
+
+    def __init__(self, name, limits):
+        self.name = name
+        self.requests = TokenBucket(limits["rpm"]) if limits.get("rpm") else None
+        self.tokens = TokenBucket(limits["tpm"]) if limits.get("tpm") else None
+        self.blocked_until = 0.0  # monotonic time before which no request may start
+        self.failures = 0  # consecutive 429s, for the backoff exponent
+        self.throttled = 0
+        self.waited_s = 0.0
+
+    def wait_time(self, tokens, now):
+        wait = max(0.0, self.blocked_until - now)
+        if self.requests:
+            wait = max(wait, self.requests.wait_time(1, now))
+        if self.tokens:
+            wait = max(wait, self.tokens.wait_time(tokens, now))
+        return wait
+
+    def take(self, tokens, now):
+        if self.requests:
+            self.requests.take(1, now)
+        if self.tokens:
+            self.tokens.take(tokens, now)
+
+    def headroom(self, now):
+        return {
+            "requests_available": round(self.requests.available(now), 1) if self.requests else None,
+            "rpm": self.requests.per_minute if self.requests else None,
+            "tokens_available": int(self.tokens.available(now)) if self.tokens else None,
+            "tpm": self.tokens.per_minute if self.tokens else None,
+            "blocked_for_s": round(max(0.0, self.blocked_until - now), 1),
+            "throttled": self.throttled,
+            "waited_s": round(self.waited_s, 1)
+        }
+
+class RateGovernor:
+    """
+    Process-wide pacing of LLM traffic. Every request waits for both its
+    provider's and its model's token buckets (requests and tokens per minute,
+    from PROVIDER_RATE_LIMITS and MODEL_RATE_LIMITS). Limits reported in
+    response headers tighten the buckets; a 429 blocks the model for the
+    provider's Retry-After or, without one, a jittered exponential backoff.
+
+    Callers that would rather fall back to another model than wait long pass
+    `max_wait`, and get RateLimited instead of a sleep.
+    """
+
+    def __init__(self):
+        self._scopes = {}
+
+    def _scope(self, name, limits=None):
+        scope = self._scopes.get(name)
+        if scope is None:
+            scope = self._scopes[name] = _Scope(name, limits or {})
+        return scope
+
+    def _scopes_for(self, provider, model):
+        return (
+            self._scope(provider, settings.PROVIDER_RATE_LIMITS.get(provider)),
+            self._scope(f"{provider}/{model}", settings.MODEL_RATE_LIMITS.get(model))
+        )
+
+    async def acquire(self, provider, model, tokens=1, max_wait=None):
+        """Wait until a request of about `tokens` tokens may be sent, then charge it"""
+        scopes = self._scopes_for(provider, model)
+        waited = 0.0
+        while True:
+            now = time.monotonic()
+            wait, scope = max((s.wait_time(tokens, now), s.name) for s in scopes)
+            if wait <= 0:
+                for s in scopes:
+                    s.take(tokens, now)
+                if waited:
+                    scopes[1].waited_s += waited
+                return
+            if max_wait is not None and waited + wait > max_wait:
+                raise RateLimited(scope, wait)
+            # A little jitter so waiters that wake together don't all retry at once
+            delay = wait + random.uniform(0, 0.1)
+            await asyncio.sleep(delay)
+            waited += delay
+
+    def delay(self, provider, model, tokens=1):
+        """Seconds a request of about `tokens` tokens would wait right now (nothing is charged)"""
+        now = time.monotonic()
+        return max(s.wait_time(tokens, now) for s in self._scopes_for(provider, model))
+
+    def observe(self, provider, model, response, tokens_used=None, estimate=0):
+        """
+        Learn from a response: adopt header-reported limits and remaining
+        quota, and on a 429 block the model. Returns the block in seconds (0 if
+        the request wasn't throttled).
+        """
+        now = time.monotonic()
+        provider_scope, scope = self._scopes_for(provider, model)
+        headers = {name: _header(response.headers, names) for name, names in _HEADERS.items()}
+
+        limit = _number(headers["limit_requests"])
+        if limit and (scope.requests is None or scope.requests.per_minute != limit):
+            # Treat the reported limit as per minute, which is how providers quote it
+            if scope.requests is None:
+                scope.requests = TokenBucket(limit)
+            else:
+                scope.requests.configure(limit)
+        remaining = _number(headers["remaining_requests"])
+        if remaining is not None and scope.requests:
+            scope.requests.cap(remaining, now)
+        # Token quotas are usually per account, so they apply to the provider as well
+        remaining_tokens = _number(headers["remaining_tokens"])
+        for bucket in (provider_scope.tokens, scope.tokens):
+            if bucket is None:
+                continue
+            if remaining_tokens is not None:
+                bucket.cap(remaining_tokens, now)
+            if tokens_used and tokens_used > estimate:
+                bucket.take(tokens_used - estimate, now)
+
+        if response.status_code != 429:
+            scope.failures = 0
+            if remaining == 0:
+                reset = parse_delay(headers["reset"])
+                if reset:
+                    scope.blocked_until = max(scope.blocked_until, now + reset)
+            return 0.0
+
+        scope.failures += 1
+        scope.throttled += 1
+        delay = parse_delay(response.headers.get("retry-after")) or parse_delay(headers["reset"])
+        if not delay:
+            # Equal jitter: somewhere in the upper half of the exponential window
+            window = min(settings.RATE_LIMIT_BACKOFF_MAX_S, settings.RATE_LIMIT_BACKOFF_BASE_S * 2 ** (scope.failures - 1))
+            delay = random.uniform(window / 2, window)
+        scope.blocked_until = max(scope.blocked_until, now + delay)
+        logger.warning(f"{scope.name} rate limited (429 #{scope.failures}); pausing it for {delay:.1f}s")
+        return delay
+
+    def headroom(self):
+        """Current capacity per provider and model, as reported by /health"""
+        now = time.monotonic()
+        return {name: scope.headroom(now) for name, scope in sorted(self._scopes.items())}
+
+def _header(headers, names):
+    for name in names:
+        if name in headers:
+            return headers[name]
+    return None
+
+def _number(value):
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+governor = RateGovernor()
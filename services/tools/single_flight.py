@@ -0,0 +1,86 @@
+import asyncio
+import hashlib
+import json
+
+def flight_key(*parts) -> str:
+    """Stable key for arbitrary JSON-serialisable call arguments"""
+    raw = json.dumps(parts, sort_keys=True, default=str, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical calls: while a call for a key is in flight,
+    later callers with the same key await the same result instead of starting
+    their own. Nothing is cached once the call completes.
+    """
+
+    def __init__(self):
+        self._inflight = {}
+
+    async def do(self, key: str, fn):
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(fn())
+            self._inflight[key] = future
+            future.add_done_callback(lambda f: self._inflight.pop(key, None) if self._inflight.get(key) is f else None)
+        # Shielded so one caller timing out doesn't cancel the call for the others
+        return await asyncio.shield(future)
+
+    async def do_many(self, keys, fn):
+        """
+        Batched variant: `fn(indexes)` fetches results for the keys at those
+        indexes in one call. Keys already in flight (from any caller) are
+        awaited instead of being fetched again.
+        """
+        futures = {}
+        missing = []
+        for i, key in enumerate(keys):
+            if key in futures:
+                continue
+            if key in self._inflight:
+                futures[key] = self._inflight[key]
+            else:
+                futures[key] = asyncio.get_running_loop().create_future()
+                self._inflight[key] = futures[key]
+                missing.append(i)
+
+        if missing:
+            batch = asyncio.ensure_future(fn(missing))
+
+            def settle(done):
+                error = results = None
+                if not done.cancelled():
+                    error = done.exception()
+                    if error is None:
+                        results = done.result()
+                        try:
+                            count = len(results)
+                        except TypeError:
+                            count = None
+                        if count != len(missing):
+                            # Every waiter must be settled, or they would hang
+                            error = ValueError(f"Batched call returned {count} results for {len(missing)} keys")
+                for pos, i in enumerate(missing):
+                    future = futures[keys[i]]
+                    if self._inflight.get(keys[i]) is future:
+                        del self._inflight[keys[i]]
+                    if future.done():
+                        continue
+                    if done.cancelled():
+                        future.cancel()
+                    elif error is not None:
+                        future.set_exception(error)
+                    else:
+                        future.set_result(results[pos])
+
+            batch.add_done_callback(settle)
+
+        return await asyncio.gather(*(asyncio.shield(futures[key]) for key in keys))
+
+    def __len__(self):
+        return len(self._inflight)
+
+# Shared by every client instance in the process
+llm_flight = SingleFlight()
+vector_flight = SingleFlight()
+ask_flight = SingleFlight()
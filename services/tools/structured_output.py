@@ -0,0 +1,176 @@
+"""
+Structured (JSON) output from LLM responses: local repair of near-miss JSON,
+and incremental parsing of streamed responses so list items can be used as
+soon as each one is complete.
+"""
+import json
+import re
+
+_FENCE = re.compile(r"```(?:json)?", re.IGNORECASE)
+_LITERALS = {"True": "true", "False": "false", "None": "null"}
+_CLOSERS = {"[": "]", "{": "}"}
+
+
+def strip_fences(text: str) -> str:
+    return _FENCE.sub("", text or "").strip()
+
+
+def _scan(text: str):
+    """
+    Normalise `text` outside of strings (trailing commas, Python literals) and
+    return (cleaned text, open containers, whether a string is left open,
+    comma positions with the containers open at each).
+    """
+    out = []
+    stack = []
+    commas = []
+    in_string = escape = False
+    i = 0
+    while i < len(text):
+        ch = text[i]
+        if in_string:
+            out.append(ch)
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+            i += 1
+            continue
+
+        if ch == '"':
+            in_string = True
+        elif ch in _CLOSERS:
+            stack.append(ch)
+        elif ch in "]}":
+            # Drop a trailing comma before a closing bracket
+            while out and out[-1] in " \n\r\t":
+                out.pop()
+            if out and out[-1] == ",":
+                out.pop()
+            if stack:
+                stack.pop()
+        elif ch == ",":
+            commas.append((len(out), list(stack)))
+        elif ch.isalpha():
+            word = re.match(r"[A-Za-z]+", text[i:]).group(0)
+            out.append(_LITERALS.get(word, word))
+            i += len(word)
+            continue
+        out.append(ch)
+        i += 1
+    return "".join(out), stack, in_string, commas
+
+
+def repair_json(text: str):
+    """
+    Parse JSON from an LLM response, repairing common small defects locally:
+    code fences, prose around the JSON, trailing commas, Python literals, and
+    output truncated mid-way (cut back to the last complete value and closed).
+    Raises ValueError if nothing usable can be recovered.
+    """
+    text = strip_fences(text)
+    starts = [i for i in (text.find("["), text.find("{")) if i >= 0]
+    if not starts:
+        raise ValueError("No JSON found in response")
+    text = text[min(starts):]
+
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        pass
+
+    cleaned, stack, in_string, commas = _scan(text)
+    # Trim anything after the outermost container closes
+    try:
+        return json.JSONDecoder().raw_decode(cleaned)[0]
+    except json.JSONDecodeError:
+        pass
+
+    candidate = cleaned + ('"' if in_string else "") + "".join(_CLOSERS[c] for c in reversed(stack))
+    try:
+        return json.loads(candidate)
+    except json.JSONDecodeError:
+        pass
+
+    # Truncated inside an item: cut back to the last comma and close what is open there
+    for position, open_stack in reversed(commas[-50:]):
+        candidate = cleaned[:position] + "".join(_CLOSERS[c] for c in reversed(open_stack))
+        try:
+            return json.loads(candidate)
+        except json.JSONDecodeError:
+            continue
+    raise ValueError("Could not repair JSON response")
+
+
+def parse_json_array(text: str) -> list:
+    """A JSON list from the response; a root object's first list value is accepted too"""
+    data = repair_json(text)
+    if isinstance(data, dict):
+        data = next((v for v in data.values() if isinstance(v, list)), [data])
+    if not isinstance(data, list):
+        raise ValueError("Expected a JSON list")
+    return data
+
+
+def parse_json_object(text: str) -> dict:
+    data = repair_json(text)
+    if isinstance(data, list):
+        data = next((item for item in data if isinstance(item, dict)), None)
+    if not isinstance(data, dict):
+        raise ValueError("Expected a JSON object")
+    return data
+
+
+class IncrementalJSONParser:
+    """
+    Feed streamed text; get back each object of the first JSON array as soon
+    as that object closes. Works for a bare list (`[{...}, ...]`) and for a
+    list wrapped in an object (`{"items": [{...}, ...]}`), as produced in JSON
+    mode.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self._pos = 0
+        self._depth = 0
+        self._item_depth = None  # depth of objects that are items of the first array
+        self._item_start = None
+        self._in_string = False
+        self._escape = False
+
+    def feed(self, chunk: str) -> list:
+        self.buffer += chunk
+        items = []
+        while self._pos < len(self.buffer):
+            ch = self.buffer[self._pos]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch in "[{":
+                self._depth += 1
+                if ch == "[" and self._item_depth is None:
+                    self._item_depth = self._depth + 1
+                elif ch == "{" and self._depth == self._item_depth:
+                    self._item_start = self._pos
+            elif ch in "]}":
+                if ch == "}" and self._depth == self._item_depth and self._item_start is not None:
+                    raw = self.buffer[self._item_start:self._pos + 1]
+                    self._item_start = None
+                    try:
+                        items.append(json.loads(raw))
+                    except json.JSONDecodeError:
+                        try:
+                            items.append(parse_json_object(raw))
+                        except ValueError:
+                            pass
+                self._depth -= 1
+            self._pos += 1
+        return items
@@ -1,9 +1,13 @@
-from pinecone import Pinecone, ServerlessSpec
 from ..orchestrator.config import settings
+from .single_flight import flight_key, vector_flight
+from .executors import run_io
 import time
 
 class VectorStore:
     def __init__(self, index_name="flowmind-concepts"):
+        # Deferred so importing the agents doesn't pull in the Pinecone SDK
+        from pinecone import Pinecone, ServerlessSpec
+
         self.pc = Pinecone(api_key=settings.PINECONE_API_KEY)
         self.index_name = index_name
         
@@ -28,9 +32,33 @@ class VectorStore:
         self.index = self.pc.Index(index_name)
         print(f"Pinecone Index Host: {self.index._config.host if hasattr(self.index, '_config') else 'Unknown'}")
 
-    def upsert(self, vectors):
+    def upsert(self, vectors, namespace=None):
         # vectors: list of (id, values, metadata)
-        return self.index.upsert(vectors=vectors)
+        # Each course gets its own namespace so queries only search its partition
+        return self.index.upsert(vectors=vectors, namespace=namespace or "")
+
+    def update_metadata(self, vector_id, metadata, namespace=None):
+        return self.index.update(id=vector_id, set_metadata=metadata, namespace=namespace or "")
+
+    def query(self, vector, top_k=5, filter=None, namespace=None):
+        return self.index.query(
+            vector=vector,
+            top_k=top_k,
+            include_metadata=True,
+            filter=filter,
+            namespace=namespace or ""
+        )
+
+    async def aquery(self, vector, top_k=5, filter=None, namespace=None):
+        """Non-blocking query; identical concurrent queries share one Pinecone call"""
+        key = flight_key("query", self.index_name, namespace, top_k, filter, vector)
+        return await vector_flight.do(
+            key,
+            lambda: run_io(self.query, vector, top_k, filter, namespace)
+        )
+
+    async def aupsert(self, vectors, namespace=None):
+        return await run_io(self.upsert, vectors, namespace)
 
-    def query(self, vector, top_k=5, filter=None):
-        return self.index.query(vector=vector, top_k=top_k, include_metadata=True, filter=filter)
+    async def aupdate_metadata(self, vector_id, metadata, namespace=None):
+        return await run_io(self.update_metadata, vector_id, metadata, namespace)
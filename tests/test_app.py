@@ -0,0 +1,29 @@
+from fastapi.testclient import TestClient
+from services.orchestrator.config import settings
+import importlib
+import pytest
+
+@pytest.fixture
+def app_module(tmp_path, monkeypatch):
+    # Importing the app creates its data files; keep them out of the tree
+    monkeypatch.chdir(tmp_path)
+    return importlib.import_module("services.orchestrator.app")
+
+@pytest.mark.parametrize("method, path, body", [
+    ("post", "/ingest", {"pdf_path": "notes.pdf"}),
+    ("post", "/ingest/bulk", {"source": "library"}),
+    ("post", "/ask", {"query": "What is entropy?"}),
+    ("get", "/learning-path?concept=entropy", None),
+    ("get", "/graph/nodes", None),
+])
+def test_stateful_endpoints_wait_for_warm_up(app_module, monkeypatch, method, path, body):
+    monkeypatch.setattr(app_module.orchestrator, "ready", False)
+    client = TestClient(app_module.app)  # not entered, so the warm-up never runs
+    response = getattr(client, method)(path, **({"json": body} if body else {}))
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == str(settings.WARMUP_RETRY_AFTER_S)
+
+@pytest.mark.parametrize("deadline_s", [0, -5, settings.ASK_MAX_DEADLINE_S + 1])
+def test_ask_rejects_bad_deadline(app_module, deadline_s):
+    response = TestClient(app_module.app).post("/ask", json={"query": "What is entropy?", "deadline_s": deadline_s})
+    assert response.status_code == 422
@@ -0,0 +1,28 @@
+from services.orchestrator.agent_base import AgentResult
+from services.orchestrator.bulk_ingest import BulkIngestJobs
+from services.orchestrator.config import settings
+import asyncio
+
+class FakeOrchestrator:
+    async def ingest_pdf(self, pdf_path, course_id=None):
+        await asyncio.sleep(0)
+        return AgentResult(success=True, payload={"doc_id": pdf_path, "pages": 2, "concepts_count": 3})
+
+def test_bulk_job_runs_in_background(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "BULK_CHECKPOINT_PATH", str(tmp_path / "checkpoint.json"))
+    for name in ("a.pdf", "b.pdf"):
+        (tmp_path / name).write_bytes(b"%PDF-1.4")
+
+    async def scenario():
+        jobs = BulkIngestJobs(FakeOrchestrator())
+        job_id = jobs.start(str(tmp_path))
+        assert jobs.running() == job_id
+        assert jobs.get(job_id)["status"] == "running"
+        await jobs._jobs[job_id]["task"]
+        return jobs.get(job_id), jobs.get("unknown")
+
+    job, unknown = asyncio.run(scenario())
+    assert unknown is None
+    assert job["status"] == "done"
+    assert job["progress"] == {"documents": 2, "skipped": 0, "finished": 2, "failed": 0}
+    assert job["result"]["ingested"] == 2
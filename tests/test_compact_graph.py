@@ -0,0 +1,51 @@
+import asyncio
+from services.orchestrator.config import settings
+from services.tools.compact_graph import CompactGraphStore
+import pytest
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "GRAPH_STORAGE_PATH", str(tmp_path / "graph.json"))
+    return CompactGraphStore(str(tmp_path / "compact"))
+
+def add(store, concept_id):
+    store.add_concept(concept_id.upper(), f"definition of {concept_id}", concept_id, {"doc_id": "doc", "page": 1}, save=False)
+
+def test_node_added_after_adjacency_build(store):
+    add(store, "a")
+    add(store, "b")
+    store.add_relation("a", "b", "Prerequisite", 0.9, save=False)
+    assert [other for _, other, _ in store.neighbors("a")] == ["b"]  # builds the CSR
+
+    add(store, "c")
+    assert list(store.neighbors("c")) == []
+    assert store.get_related_concepts("c") == []
+    subgraph = store.subgraph("c", radius=2)
+    assert [node["id"] for node in subgraph["nodes"]] == ["c"]
+    assert subgraph["edges"] == []
+
+    store.add_relation("c", "a", "IsA", 0.8, save=False)
+    assert [(direction, other) for direction, other, _ in store.neighbors("c")] == [("out", "a")]
+    assert [node["id"] for node in store.get_related_concepts("c")] == ["a", "b"]
+
+def test_overwritten_definitions_are_reclaimed(store, monkeypatch, tmp_path):
+    from services.tools import compact_graph
+    monkeypatch.setattr(compact_graph, "STRING_GARBAGE_MIN_BYTES", 1000)
+    add(store, "b")
+    for round in range(50):
+        store.add_concept("A", f"definition {round} " + "x" * 100, "a", {"doc_id": "doc", "page": 1}, save=False)
+        store.merge_concept("b", "B", f"mention {round} " + "y" * 100, {"doc_id": "doc", "page": 2}, save=False)
+        if round % 2:
+            asyncio.run(store.asave())
+        else:
+            store.save()
+
+    files = list((tmp_path / "compact").glob("strings*.bin"))
+    assert len(files) == 1
+    assert files[0].stat().st_size < 2000  # live: two definitions and two mentions
+    assert store.get_concept("a")["definition"].startswith("definition 49 ")
+    assert store.get_concept("b")["sources"][-1]["definition"].startswith("mention 49 ")
+
+    reopened = CompactGraphStore(str(tmp_path / "compact"))
+    assert reopened.get_concept("a")["definition"].startswith("definition 49 ")
+    assert [s["definition"][:10] for s in reopened.get_concept("b")["sources"]] == ["mention 49"]
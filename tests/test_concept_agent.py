@@ -0,0 +1,27 @@
+from services.ingestion.concept_agent import ConceptExtractionAgent
+from services.tools.ids import document_id
+import asyncio
+
+class FakeLLM:
+    async def generate_json_items(self, messages, **kwargs):
+        yield {"name": "Entropy", "definition": "A measure of disorder", "importance": 9}
+
+    async def embed(self, text):
+        return [1.0, 0.0]
+
+def run(context):
+    agent = ConceptExtractionAgent()
+    agent.llm = FakeLLM()
+    return asyncio.run(agent.run({"blocks": [{"content": "Entropy measures disorder."}], **context}))
+
+def test_missing_doc_id_is_an_error():
+    result = run({})
+    assert not result.success
+    assert "doc_id" in result.payload["error"]
+
+def test_doc_id_falls_back_to_content_hash(tmp_path):
+    pdf = tmp_path / "notes.pdf"
+    pdf.write_bytes(b"%PDF-1.4 entropy")
+    result = run({"pdf_path": str(pdf)})
+    assert result.success
+    assert [c["doc_id"] for c in result.payload["concepts"]] == [document_id(str(pdf))]
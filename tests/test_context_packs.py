@@ -0,0 +1,54 @@
+from services.orchestrator.config import settings
+from services.tools.compact_graph import CompactGraphStore
+from services.tools.context_packs import ContextPacks, ContextPackStore
+from services.tools.graph_store import GraphStore
+import asyncio
+import pytest
+
+@pytest.fixture(params=["networkx", "compact"])
+def open_store(request, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "GRAPH_STORAGE_PATH", str(tmp_path / "graph.json"))
+    if request.param == "compact":
+        return lambda: CompactGraphStore(str(tmp_path / "compact"))
+    return GraphStore
+
+def build(packs):
+    async def backfill_and_rebuild():
+        await packs.backfill()
+        await packs.rebuild()
+    asyncio.run(backfill_and_rebuild())
+
+def add(graph, concept_id):
+    graph.add_concept(concept_id.title(), f"about {concept_id}", concept_id, {"doc_id": "doc", "page": 1}, save=False)
+
+def test_graph_version_keeps_increasing_across_restarts(open_store, tmp_path):
+    graph = open_store()
+    add(graph, "entropy")
+    add(graph, "energy")
+    graph.add_relation("entropy", "energy", "RelatedTo", 0.9, save=False)
+    graph.save()
+    packs = ContextPacks(graph, ContextPackStore(str(tmp_path / "packs.db")))
+    build(packs)
+    built_at = packs.store.get_many(["entropy"])["entropy"]["graph_version"]
+    packs.store.close()
+
+    restarted = open_store()
+    assert restarted.version > built_at
+    add(restarted, "heat")
+    packs = ContextPacks(restarted, ContextPackStore(str(tmp_path / "packs.db")))
+    build(packs)
+    assert packs.store.get_many(["heat"])["heat"]["graph_version"] > built_at
+    packs.store.close()
+
+def test_lookup_rebuilds_changed_concepts(open_store, tmp_path):
+    graph = open_store()
+    add(graph, "entropy")
+    add(graph, "energy")
+    packs = ContextPacks(graph, ContextPackStore(str(tmp_path / "packs.db")))
+    build(packs)
+
+    graph.add_relation("entropy", "energy", "Prerequisite", 0.9, save=False)
+    texts = asyncio.run(packs.lookup(["entropy", "unknown"]))
+    assert list(texts) == ["entropy"]
+    assert "Relation: Entropy -Prerequisite-> Energy" in texts["entropy"]
+    packs.store.close()
@@ -0,0 +1,64 @@
+from services.orchestrator.config import settings
+from services.orchestrator.orchestrator import FlowMindOrchestrator
+from services.tools.graph_analytics import GraphAnalytics
+from services.tools.graph_store import GraphStore
+import asyncio
+import pytest
+
+class Orchestrator:
+    """Just the state FlowMindOrchestrator.learning_path uses"""
+    learning_path = FlowMindOrchestrator.learning_path
+    _refresh_analytics = FlowMindOrchestrator._refresh_analytics
+
+    def __init__(self, graph_store):
+        self.graph_store = graph_store
+        self.graph_analytics = GraphAnalytics(graph_store)
+        self._analytics_task = None
+
+@pytest.fixture
+def graph(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "GRAPH_STORAGE_PATH", str(tmp_path / "graph.json"))
+    graph = GraphStore()
+    for concept_id in ("algebra", "calculus", "physics"):
+        graph.add_concept(concept_id.title(), f"about {concept_id}", concept_id, {"doc_id": "doc", "page": 1}, save=False)
+    graph.add_relation("algebra", "calculus", "Prerequisite", 0.9, save=False)
+    return graph
+
+def ids(result):
+    return [step["id"] for step in result["path"]]
+
+def test_learning_path_serves_snapshot_and_refreshes_in_background(graph):
+    async def scenario():
+        orchestrator = Orchestrator(graph)
+        first = await orchestrator.learning_path("calculus")  # no snapshot yet: computed inline
+
+        graph.add_relation("calculus", "physics", "Prerequisite", 0.9, save=False)
+        graph.add_relation("physics", "algebra", "RelatedTo", 0.9, save=False)
+        stale = await orchestrator.learning_path("calculus")
+        assert orchestrator._analytics_task is not None and not orchestrator._analytics_task.done()
+        await orchestrator._analytics_task
+        fresh = await orchestrator.learning_path("physics")
+        return first, stale, fresh
+
+    first, stale, fresh = asyncio.run(scenario())
+    assert ids(first) == ["algebra", "calculus"] and not first["stale"]
+    assert stale["stale"] and stale["graph_version"] == first["graph_version"]
+    assert ids(fresh) == ["algebra", "calculus", "physics"] and not fresh["stale"]
+
+def test_learning_path_waits_for_concepts_missing_from_snapshot(graph):
+    async def scenario():
+        orchestrator = Orchestrator(graph)
+        await orchestrator.learning_path("calculus")
+        graph.add_concept("Topology", "about topology", "topology", {"doc_id": "doc", "page": 2}, save=False)
+        graph.add_relation("calculus", "topology", "Prerequisite", 0.9, save=False)
+        return await orchestrator.learning_path("topology")
+
+    assert ids(asyncio.run(scenario())) == ["algebra", "calculus", "topology"]
+
+def test_cycles_are_grouped(graph):
+    graph.add_relation("calculus", "algebra", "Prerequisite", 0.9, save=False)
+    analytics = GraphAnalytics(graph)
+    asyncio.run(analytics.refresh())
+    path = analytics.learning_path("calculus")
+    assert {step["id"] for step in path} == {"algebra", "calculus"}
+    assert all(step["in_cycle"] for step in path)
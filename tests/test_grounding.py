@@ -0,0 +1,40 @@
+from services.pedagogy.grounding import GroundingScorer
+import asyncio
+
+class FakeLLM:
+    def __init__(self):
+        self.embedded = []
+
+    async def embed_batch(self, texts):
+        self.embedded.extend(texts)
+        return [[1.0, 0.0] for _ in texts]
+
+CONTEXT = (
+    "Gradient descent does not guarantee convergence to the global minimum of a non-convex loss.\n\n"
+    "Backpropagation computes gradients of the loss with respect to every network weight."
+)
+
+def score(answer, context=CONTEXT):
+    llm = FakeLLM()
+    report = asyncio.run(GroundingScorer(llm).score(answer, context))
+    return report, llm
+
+def test_restated_claim_is_supported_without_embeddings():
+    report, llm = score("Gradient descent does not guarantee convergence to the global minimum.")
+    assert (report.score, report.supported) == (1.0, 1)
+    assert llm.embedded == []
+
+def test_contradicting_claim_is_unsupported():
+    answer = "Gradient descent always guarantees convergence to the global minimum of a non-convex loss."
+    report, llm = score(answer)
+    assert (report.score, report.supported) == (0.0, 0)
+    assert report.unsupported == [answer]
+    assert llm.embedded == []  # embeddings can't tell the two apart; the critic decides
+
+def test_claim_is_scored_against_single_chunk():
+    context = "Momentum speeds up gradient descent.\n\nDropout randomly disables neurons during training."
+    # Every word appears somewhere in the context, but no single chunk says it
+    claim = "Momentum speeds descent, dropout disables neurons."
+    report, llm = score(claim, context)
+    assert report.used_embeddings
+    assert llm.embedded[0] == claim
@@ -0,0 +1,49 @@
+from services.orchestrator.config import settings
+from services.tools.image_store import ImageStore, write_blob
+import asyncio
+import os
+import pytest
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "IMAGE_STORE_GRACE_S", 60)
+    return ImageStore(str(tmp_path), quota_bytes=250)
+
+def add_image(store, data, age_s):
+    """Register a 100-byte image written and last used `age_s` seconds ago"""
+    digest, path = write_blob(store.root, data * 100, "png")
+    store.register([{"image_id": digest, "path": path, "size": 100}])
+    then = store.blobs[digest]["last_used"] - age_s
+    os.utime(path, (then, then))
+    store.blobs[digest]["last_used"] = then
+    return digest
+
+def test_quota_evicts_least_recently_used_unreferenced_images(store):
+    old = add_image(store, b"a", 300)
+    read = add_image(store, b"b", 200)
+    referenced = add_image(store, b"c", 400)
+    recent = add_image(store, b"d", 0)  # inside the grace period
+    store.add_ref(referenced, "node-1")
+    store.blobs[referenced]["last_used"] -= 400
+    store.touch(read)  # read since: now the most recently used
+
+    freed = asyncio.run(store.enforce_quota())
+
+    assert freed == 100
+    assert set(store.blobs) == {read, referenced, recent}
+    assert not os.path.exists(store.path(old) or "") and os.path.exists(store.path(read))
+
+def test_released_images_become_evictable(store):
+    first = add_image(store, b"a", 300)
+    second = add_image(store, b"b", 300)
+    third = add_image(store, b"c", 300)
+    for digest in (first, second, third):
+        store.add_ref(digest, f"node-{digest[:4]}")
+        store.blobs[digest]["last_used"] -= 300
+    assert asyncio.run(store.enforce_quota()) == 0
+
+    # The node was rebuilt from another image
+    store.set_ref(f"node-{first[:4]}", second)
+    assert store.blobs[first]["refs"] == []
+    assert asyncio.run(store.enforce_quota()) == 100
+    assert first not in store.blobs and second in store.blobs
@@ -0,0 +1,44 @@
+from services.orchestrator.agent_base import AgentResult
+from services.orchestrator.orchestrator import FlowMindOrchestrator
+import asyncio
+
+class Agent:
+    def __init__(self, run):
+        self.run = run
+
+class Orchestrator(FlowMindOrchestrator):
+    """The ingestion stage graph with every agent replaced by a fake"""
+
+    def __init__(self):
+        self.vision_started = asyncio.Event()
+
+        async def parse(context):
+            # Finishes only once the vision branch is running
+            await self.vision_started.wait()
+            return AgentResult(success=True, payload={"blocks": [], "pages": 1})
+
+        async def vision(context):
+            self.vision_started.set()
+            return AgentResult(success=True, payload={"visual_concepts": []})
+
+        async def concepts(context):
+            return AgentResult(success=True, payload={"concepts": []})
+
+        async def relations(context):
+            return AgentResult(success=True, payload={"relations": []})
+
+        self.parsing_agent = Agent(parse)
+        self.vision_agent = Agent(vision)
+        self.concept_agent = Agent(concepts)
+        self.relation_agent = Agent(relations)
+
+    async def _resolve_concepts(self, results, doc_id, course_id):
+        return AgentResult(success=True, payload={"concepts": [], "new": 0, "merged": 0})
+
+def test_vision_overlaps_with_parsing():
+    async def ingest():
+        return await asyncio.wait_for(Orchestrator()._ingest_pdf("notes.pdf", "course", "doc"), timeout=2)
+
+    result = asyncio.run(ingest())
+    assert result.success
+    assert {"parse", "vision", "resolve"} <= set(result.payload["timings"])
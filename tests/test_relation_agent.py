@@ -0,0 +1,39 @@
+from services.ingestion.relation_agent import RELATION_TYPES, normalize_relation_type
+import pytest
+
+@pytest.mark.parametrize("value, expected", [
+    ("IsA", "IsA"),
+    ("is a", "IsA"),
+    ("part_of", "PartOf"),
+    ("PREREQUISITE", "Prerequisite"),
+    ("Causes", "RelatedTo"),
+    ("", "RelatedTo"),
+    (None, "RelatedTo"),
+    (3, "RelatedTo"),
+])
+def test_normalize_relation_type(value, expected):
+    assert normalize_relation_type(value) == expected
+
+def test_every_relation_type_maps_to_itself():
+    assert [normalize_relation_type(t) for t in RELATION_TYPES] == list(RELATION_TYPES)
+
+def test_typical_batches_route_to_the_small_model():
+    from services.ingestion.relation_agent import RelationshipMappingAgent
+    from services.orchestrator.config import settings
+    from services.tools.model_router import ModelRouter
+
+    definition = "A measure of how much of a quantity is spread out, as used in the lecture notes. " * 2
+    concepts = [{"name": f"Concept {n}", "definition": definition} for n in range(12)]
+    pairs = [(i, j) for i in range(12) for j in range(i + 1, 12)][:40]
+
+    agent = RelationshipMappingAgent()
+    batches = agent._batches(concepts, pairs)
+    assert [pair for batch in batches for pair in batch] == pairs
+    assert all(len(batch) <= settings.RELATION_BATCH_SIZE for batch in batches)
+
+    small = settings.MODEL_ROUTES["relations"][0]
+    router = ModelRouter()
+    for batch in batches:
+        lines = [agent._pair_line(n, concepts[i], concepts[j]) for n, (i, j) in enumerate(batch)]
+        route = router.select("relations", [{"role": "user", "content": agent._verify_prompt(lines)}])
+        assert route.model == small["model"]
@@ -0,0 +1,65 @@
+from services.ingestion.resolution_agent import EntityResolutionAgent
+from services.orchestrator.config import settings
+from services.tools.graph_store import GraphStore
+import asyncio
+import pytest
+
+class FakeVectorStore:
+    def __init__(self):
+        self.upserted = []
+
+    async def aupsert(self, vectors, namespace=None):
+        await asyncio.sleep(0)  # let concurrent documents interleave
+        self.upserted.extend(concept_id for concept_id, _, _ in vectors)
+
+    async def aupdate_metadata(self, concept_id, metadata, namespace=None):
+        pass
+
+@pytest.fixture
+def agent(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "GRAPH_STORAGE_PATH", str(tmp_path / "graph.json"))
+    monkeypatch.setattr(settings, "CONCEPT_INDEX_DIR", str(tmp_path / "index"))
+    agent = EntityResolutionAgent()
+    agent.vector_store = FakeVectorStore()
+    agent.graph_store = GraphStore()
+    return agent
+
+def concept(concept_id, name, embedding, **extra):
+    return {"concept_id": concept_id, "name": name, "definition": f"about {name}", "embedding": embedding, "page": 1, **extra}
+
+def test_visual_concepts_are_not_merged_by_name(agent):
+    visual = dict(type="visual", name="Visual: diagram (Page 1)")
+    first = concept("v1", embedding=[1.0, 0.0, 0.0], image_id="img1", **visual)
+    second = concept("v2", embedding=[0.0, 1.0, 0.0], image_id="img2", **visual)
+    same_image = concept("v3", embedding=[0.0, 0.0, 1.0], image_id="img1", **visual)
+    result = asyncio.run(agent.run({"concepts": [first, second, same_image], "doc_id": "d1", "course_id": "c"}))
+
+    ids = [c["concept_id"] for c in result.payload["concepts"]]
+    assert ids == ["v1", "v2", "v1"]
+    assert result.payload["new"] == 2
+
+def test_concurrent_documents_share_new_concepts(agent):
+    async def ingest_both():
+        return await asyncio.gather(*[
+            agent.run({"concepts": [concept(f"{doc}-x", "Entropy", [1.0, 0.0])], "doc_id": doc, "course_id": "c"})
+            for doc in ("d1", "d2")
+        ])
+    first, second = asyncio.run(ingest_both())
+
+    assert first.payload["new"] + second.payload["new"] == 1
+    assert agent.vector_store.upserted == ["d1-x"]
+
+def test_only_images_of_stored_visual_nodes_are_referenced(agent, tmp_path):
+    from services.tools.image_store import ImageStore
+    agent.image_store = ImageStore(str(tmp_path / "images"))
+    agent.image_store.register([
+        {"image_id": image_id, "path": f"{image_id}.png", "size": 10} for image_id in ("img1", "img2")
+    ])
+    text = concept("c1", "Entropy", [1.0, 0.0])
+    figure = concept("v1", "Visual: chart (Page 1)", [0.0, 1.0], type="visual", image_id="img1")
+    # Same figure content as the entropy concept: merged into it
+    merged = concept("v2", "Visual: diagram (Page 2)", [1.0, 0.0], type="visual", image_id="img2")
+    asyncio.run(agent.run({"concepts": [text, figure, merged], "doc_id": "d1", "course_id": "c"}))
+
+    assert agent.image_store.blobs["img1"]["refs"] == ["v1"]
+    assert agent.image_store.blobs["img2"]["refs"] == []
@@ -0,0 +1,44 @@
+from services.orchestrator.config import settings
+from services.pedagogy.session_memory import InMemorySessionBackend, SessionMemory
+import asyncio
+
+class SlowLLM:
+    def __init__(self):
+        self.release = asyncio.Event()
+
+    async def generate(self, messages, **kwargs):
+        await self.release.wait()
+        return "summary"
+
+async def fill(memory, session_id, turns):
+    for i in range(turns):
+        await memory.record(session_id, f"q{i}", f"r{i}")
+
+def test_compaction_keeps_turns_recorded_meanwhile():
+    async def scenario():
+        llm = SlowLLM()
+        memory = SessionMemory(llm=llm, backend=InMemorySessionBackend(10))
+        await fill(memory, "s", settings.SESSION_MAX_TURNS + 1)
+        await asyncio.sleep(0)  # compaction has read the state and is summarising
+        await memory.record("s", "late", "answer")
+        llm.release.set()
+        await asyncio.gather(*memory._tasks)
+        return await memory.backend.get("s")
+
+    state = asyncio.run(scenario())
+    assert state["summary"] == "summary"
+    assert state["turns"][-1]["query"] == "late"
+    assert len(state["turns"]) == settings.SESSION_KEEP_TURNS + 1
+
+def test_compaction_does_not_resurrect_cleared_session():
+    async def scenario():
+        llm = SlowLLM()
+        backend = InMemorySessionBackend(10)
+        memory = SessionMemory(llm=llm, backend=backend)
+        await fill(memory, "s", settings.SESSION_MAX_TURNS + 1)
+        backend._sessions.pop("s")  # expired while the summary was being written
+        llm.release.set()
+        await asyncio.gather(*memory._tasks)
+        return await backend.get("s")
+
+    assert asyncio.run(scenario()) is None
@@ -0,0 +1,36 @@
+from services.tools.single_flight import SingleFlight
+import asyncio
+import pytest
+
+def test_do_many_fails_every_waiter_on_short_result():
+    flight = SingleFlight()
+
+    async def fetch(indexes):
+        return ["only one"]
+
+    async def call():
+        return await asyncio.wait_for(flight.do_many(["a", "b"], fetch), timeout=1)
+
+    with pytest.raises(ValueError):
+        asyncio.run(call())
+    assert len(flight) == 0
+
+def test_do_many_shares_in_flight_keys():
+    flight = SingleFlight()
+    calls = []
+
+    async def fetch(keys, indexes):
+        calls.append([keys[i] for i in indexes])
+        await asyncio.sleep(0)
+        return [keys[i].upper() for i in indexes]
+
+    async def both():
+        first = ["a", "b"]
+        second = ["b", "c"]
+        return await asyncio.gather(
+            flight.do_many(first, lambda indexes: fetch(first, indexes)),
+            flight.do_many(second, lambda indexes: fetch(second, indexes))
+        )
+
+    assert asyncio.run(both()) == [["A", "B"], ["B", "C"]]
+    assert calls == [["a", "b"], ["c"]]
@@ -0,0 +1,35 @@
+from services.ingestion.vision_agent import VisionConceptAgent
+from services.orchestrator.config import settings
+from services.tools.llm_clients import VisionBatchTooLarge
+import asyncio
+import json
+
+class FakeLLM:
+    """Rejects batches of more than `limit` images on the first run only"""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.sizes = []
+
+    async def process_vision_batch(self, paths, prompt, route=None):
+        self.sizes.append(len(paths))
+        if self.limit and len(paths) > self.limit:
+            raise VisionBatchTooLarge(len(paths))
+        return json.dumps([{"image": n + 1, "type": "diagram", "concepts": []} for n in range(len(paths))])
+
+def images(count):
+    return [{"path": f"img{n}.png", "page": 1, "index": n, "image_id": f"img{n}"} for n in range(count)]
+
+def test_rejected_batch_size_only_applies_to_the_current_document(monkeypatch):
+    monkeypatch.setattr(settings, "VISION_BATCH_SIZE", 4)
+    agent = VisionConceptAgent()
+    agent.llm = FakeLLM(limit=2)
+    first = asyncio.run(agent.run({"pdf_path": "a.pdf", "images": images(8)}))
+    assert len(first.payload["visual_concepts"]) == 8
+    # The first group is rejected and split; the second starts at the learned size
+    assert agent.llm.sizes == [4, 2, 2, 2, 2]
+
+    agent.llm = FakeLLM(limit=None)
+    second = asyncio.run(agent.run({"pdf_path": "b.pdf", "images": images(8)}))
+    assert len(second.payload["visual_concepts"]) == 8
+    assert agent.llm.sizes == [4, 4]